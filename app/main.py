@@ -1,12 +1,16 @@
 """Main FastAPI application"""
 import logging
 import os
+from contextlib import asynccontextmanager
+
 import uvicorn
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.requests import Request
 
+from app.utils.responses import FastJSONResponse
+
 # Try to load .env file if python-dotenv is available
 try:
     from dotenv import load_dotenv
@@ -23,8 +27,46 @@ logging.basicConfig(
     datefmt='%Y-%m-%d %H:%M:%S'
 )
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Application startup/shutdown hooks"""
+    from app.services.database import DB_PATH
+    from app.services.db_pool import init_pool, close_pool
+    from app.services.archive import close_archive_store
+    from app.services import async_db
+    from app.services import http_client
+    from app.services.response_cache import close_response_cache
+
+    # Initialize database (pooled connections are opened once and reused,
+    # all SQLite work runs on a dedicated executor and writes go through one writer task)
+    init_pool(DB_PATH)
+    async_db.init_executor()
+    await async_db.init_db()
+    await async_db.start_write_queue()
+    await async_db.start_backfills()
+    await async_db.start_maintenance()
+    # One pooled client for PostHog, so repeated fetches reuse connections
+    http_client.init_client()
+    try:
+        yield
+    finally:
+        await http_client.close_client()
+        await async_db.stop_maintenance()
+        await async_db.stop_backfills()
+        await async_db.stop_write_queue()
+        async_db.shutdown_executor()
+        close_archive_store()
+        close_response_cache()
+        close_pool()
+
+
 # Create FastAPI app
-app = FastAPI(title="Shram Eval Tool - LLM Evaluation Dashboard")
+app = FastAPI(
+    title="Shram Eval Tool - LLM Evaluation Dashboard",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse
+)
 
 # Middleware to add no-cache headers for static files (prevents browser caching issues)
 class NoCacheStaticMiddleware(BaseHTTPMiddleware):
@@ -58,10 +100,6 @@ app.include_router(chain.router)
 app.include_router(settings.router)
 app.include_router(api.router)
 
-# Initialize database on startup
-from app.services.database import init_db
-init_db()
-
 
 if __name__ == "__main__":
     uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
@@ -5,6 +5,11 @@ from typing import Optional, Dict, Any, List
 
 class InputData(BaseModel):
     input: str
+    force_refresh: bool = False  # Re-pull event/trace IDs from PostHog, bypassing the DB and response cache
+
+
+class InputsData(BaseModel):
+    inputs: List[str]  # Event IDs are fetched together; trace IDs and JSON one by one
 
 
 class RegenerateRequest(BaseModel):
@@ -35,11 +40,11 @@ class UpdateRatingRequest(BaseModel):
     rating: Optional[Dict[str, Any]] = None  # JSON format: {"overall": 8, "parameters": {...}, "review": "..."}
 
 
-class SaveChainVersionRequest(BaseModel):
+class SaveChainVersionFields(BaseModel):
+    """Everything in a save-chain-version body except chain_events (validated separately, without copying)"""
     version_id: str
     trace_id: str
     chain_name: str
-    chain_events: List[Dict[str, Any]]
     total_tokens_input: int
     total_tokens_output: int
     total_cost: float
@@ -49,6 +54,10 @@ class SaveChainVersionRequest(BaseModel):
     model_config = {"protected_namespaces": ()}
 
 
+class SaveChainVersionRequest(SaveChainVersionFields):
+    chain_events: List[Dict[str, Any]]
+
+
 class RegenerateChainRequest(BaseModel):
     trace_id: str
     prompts: List[Dict[str, Any]]  # Each prompt has: prompt, provider, model, images (optional)
@@ -5,27 +5,31 @@ import uuid
 import logging
 import traceback
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
 import httpx
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
+from pydantic import ValidationError
 
 from app.models.schemas import (
-    InputData, RegenerateRequest, SaveVersionRequest, UpdateRatingRequest,
-    SaveChainVersionRequest, RegenerateChainRequest, UpdateChainStepRatingRequest
-)
-from app.services.input_processor import process_input
-from app.services.database import (
-    save_version, update_rating, get_versions_by_event, get_version_by_id,
-    get_all_events, save_chain_version, get_chain_versions_by_trace,
-    update_chain_rating, update_chain_step_rating, get_all_chains,
-    get_all_settings, set_setting, delete_event, delete_chain
+    InputData, InputsData, RegenerateRequest, SaveVersionRequest, UpdateRatingRequest,
+    SaveChainVersionFields, SaveChainVersionRequest, RegenerateChainRequest, UpdateChainStepRatingRequest
 )
+from app.services.input_processor import process_input, process_inputs
+from app.services import async_db
+from app.services import transfer
+from app.services import serializer
+from app.services import http_client
+from app.services.response_cache import get_cache_stats
+from app.services.db_pool import get_pool_stats
+from app.services.database import LIST_PAGE_SIZE, SEARCH_PAGE_SIZE
 from app.services.llm_providers import generate_response, get_available_models
 from app.services.posthog import extract_conversation_data
 from app.utils.schema_converter import zod_to_json_schema
 from app.utils.cost_calculator import calculate_cost
+from app.utils.responses import FastJSONResponse
+from app.utils.validators import chain_events_error
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -34,16 +38,28 @@ logger = logging.getLogger(__name__)
 @router.post("/api/process-input")
 async def process_input_endpoint(data: InputData):
     """Auto-detect and process input (JSON or Event ID)"""
-    result = await process_input(data.input)
-    return JSONResponse(content=result)
+    result = await process_input(data.input, force_refresh=data.force_refresh)
+    return FastJSONResponse(content=result)
+
+
+# Most inputs accepted by /api/process-inputs in one request
+MAX_BATCH_INPUTS = 500
+
+
+@router.post("/api/process-inputs")
+async def process_inputs_endpoint(data: InputsData):
+    """Process many inputs at once; event IDs are fetched from PostHog in batched HogQL queries"""
+    if len(data.inputs) > MAX_BATCH_INPUTS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_INPUTS} inputs per request")
+    results = await process_inputs(data.inputs)
+    return FastJSONResponse(content={"results": results})
 
 
 @router.get("/api/models")
 async def get_models():
     """Get available models for all providers"""
-    models = get_available_models()
-    print(f"API /api/models called, returning {len(models)} providers")
-    return JSONResponse(content=models)
+    models = await async_db.run_in_db_executor(get_available_models)
+    return FastJSONResponse(content=models)
 
 
 @router.post("/api/regenerate")
@@ -118,7 +134,7 @@ async def regenerate_response(data: RegenerateRequest):
             # Try to get the initial version to preserve event metadata (only if event_id is provided)
             if data.event_id:
                 initial_version_id = f"{data.event_id}_initial"
-                initial_version = get_version_by_id(initial_version_id)
+                initial_version = await async_db.get_version_by_id(initial_version_id)
                 if initial_version and initial_version.get("metadata"):
                     original_metadata = initial_version["metadata"]
                     logger.debug(f"Loaded original metadata from initial version")
@@ -146,7 +162,7 @@ async def regenerate_response(data: RegenerateRequest):
         logger.info(f"Calculated metadata - Latency: {latency}s, Input: {input_tokens}, Output: {output_tokens}, Cost: ${total_cost}")
         logger.debug(f"Full metadata: {new_metadata}")
         
-        return JSONResponse(content={
+        return FastJSONResponse(content={
             "version_id": version_id,
             "assistant_response": assistant_response,
             "metadata": new_metadata
@@ -201,7 +217,7 @@ async def save_version_endpoint(data: SaveVersionRequest):
                    f"input_tokens={metadata.get('input_tokens')}, output_tokens={metadata.get('output_tokens')}, "
                    f"cost=${metadata.get('total_cost_usd')}")
         
-        success = save_version(
+        success = await async_db.save_version(
             version_id=data.version_id,
             event_id=data.event_id,
             model_provider=data.model_provider,
@@ -214,9 +230,9 @@ async def save_version_endpoint(data: SaveVersionRequest):
         )
         
         if success:
-            return JSONResponse(content={"success": True, "message": "Version saved"})
+            return FastJSONResponse(content={"success": True, "message": "Version saved"})
         else:
-            return JSONResponse(content={"success": False, "message": "Version already exists"}, status_code=400)
+            return FastJSONResponse(content={"success": False, "message": "Version already exists"}, status_code=400)
     except Exception as e:
         logger.error(f"Error saving version: {str(e)}")
         logger.error(f"Traceback:\n{traceback.format_exc()}")
@@ -227,12 +243,12 @@ async def save_version_endpoint(data: SaveVersionRequest):
 async def update_rating_endpoint(data: UpdateRatingRequest):
     """Update rating for a version"""
     try:
-        success = update_rating(data.version_id, data.rating)
+        success = await async_db.update_rating(data.version_id, data.rating)
         
         if success:
-            return JSONResponse(content={"success": True, "message": "Rating updated"})
+            return FastJSONResponse(content={"success": True, "message": "Rating updated"})
         else:
-            return JSONResponse(content={"success": False, "message": "Failed to update rating"}, status_code=400)
+            return FastJSONResponse(content={"success": False, "message": "Failed to update rating"}, status_code=400)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error updating rating: {str(e)}")
 
@@ -241,32 +257,130 @@ async def update_rating_endpoint(data: UpdateRatingRequest):
 async def get_versions(event_id: str):
     """Get all versions for an event"""
     try:
-        versions = get_versions_by_event(event_id)
-        return JSONResponse(content={"versions": versions})
+        versions = await async_db.get_versions_by_event(event_id)
+        return FastJSONResponse(content={"versions": versions})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting versions: {str(e)}")
 
 
+@router.get("/api/versions/{event_id}/summary")
+async def get_version_summaries(event_id: str):
+    """Version list for an event (model, rating, metrics) without prompts or responses"""
+    try:
+        versions = await async_db.get_version_summaries_by_event(event_id)
+        return FastJSONResponse(content={"versions": versions})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error getting version summaries: {str(e)}")
+
+
+@router.get("/api/version/{version_id}")
+async def get_version(version_id: str):
+    """Full payload of a single version"""
+    version = await async_db.get_version_by_id(version_id)
+    if not version:
+        raise HTTPException(status_code=404, detail=f"Version {version_id} not found")
+    return FastJSONResponse(content=version)
+
+
 @router.get("/api/events")
-async def get_events():
-    """Get all saved events"""
+async def get_events(
+    limit: int = LIST_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    sort: str = "last_updated",
+    order: str = "desc",
+    model: Optional[str] = None,
+    provider: Optional[str] = None,
+    min_rating: Optional[int] = None,
+    max_rating: Optional[int] = None,
+    unrated_only: bool = False,
+    since: Optional[str] = None,
+    until: Optional[str] = None
+):
+    """Get one page of saved events (pass next_cursor back as cursor for the next page)"""
     try:
-        events = get_all_events()
-        return JSONResponse(content={"events": events})
+        page = await async_db.list_events(
+            limit=limit, after=cursor, sort=sort, order=order, model=model, provider=provider,
+            min_rating=min_rating, max_rating=max_rating, unrated_only=unrated_only,
+            since=since, until=until
+        )
+        return FastJSONResponse(content=page)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting events: {str(e)}")
 
 
 @router.get("/api/chains")
-async def get_chains():
-    """Get all saved chains"""
+async def get_chains(
+    limit: int = LIST_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    sort: str = "last_updated",
+    order: str = "desc",
+    chain_name: Optional[str] = None,
+    model: Optional[str] = None,
+    provider: Optional[str] = None,
+    min_rating: Optional[int] = None,
+    max_rating: Optional[int] = None,
+    unrated_only: bool = False,
+    since: Optional[str] = None,
+    until: Optional[str] = None
+):
+    """Get one page of saved chains (pass next_cursor back as cursor for the next page)"""
     try:
-        chains = get_all_chains()
-        return JSONResponse(content={"chains": chains})
+        page = await async_db.list_chains(
+            limit=limit, after=cursor, sort=sort, order=order, chain_name=chain_name, model=model,
+            provider=provider, min_rating=min_rating, max_rating=max_rating, unrated_only=unrated_only,
+            since=since, until=until
+        )
+        return FastJSONResponse(content=page)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting chains: {str(e)}")
 
 
+@router.get("/api/search")
+async def search_endpoint(
+    q: str,
+    kind: Optional[str] = None,
+    field: Optional[str] = None,
+    limit: int = SEARCH_PAGE_SIZE,
+    cursor: Optional[str] = None
+):
+    """Full-text search over prompts and responses (kind: event/chain, field: prompt/response)"""
+    try:
+        page = await async_db.search(query=q, kind=kind, field=field, limit=limit, after=cursor)
+        return FastJSONResponse(content=page)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error searching: {str(e)}")
+
+
+@router.get("/api/export")
+async def export_endpoint(format: str = "jsonl", kind: Optional[str] = None, include_archived: bool = True):
+    """Stream every saved version as JSONL or a {"versions": [...]} document (kind: event/chain)"""
+    if format not in transfer.FORMATS:
+        raise HTTPException(status_code=400, detail=f"Invalid format: {format}")
+    if kind is not None and kind not in ("event", "chain"):
+        raise HTTPException(status_code=400, detail=f"Invalid kind: {kind}")
+    extension = "jsonl" if format == "jsonl" else "json"
+    return StreamingResponse(
+        async_db.export_versions(format, kind=kind, include_archived=include_archived),
+        media_type="application/x-ndjson" if format == "jsonl" else "application/json",
+        headers={"Content-Disposition": f'attachment; filename="versions.{extension}"'}
+    )
+
+
+@router.get("/api/rating-stats")
+async def get_rating_stats():
+    """Rating count, average and max per model and per chain name"""
+    try:
+        return FastJSONResponse(content=await async_db.get_rating_stats())
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error getting rating stats: {str(e)}")
+
+
 @router.post("/api/regenerate-chain")
 async def regenerate_chain_endpoint(data: RegenerateChainRequest):
     """Regenerate an entire prompt chain"""
@@ -385,7 +499,7 @@ async def regenerate_chain_endpoint(data: RegenerateChainRequest):
         
         logger.info(f"Chain regeneration complete: {len(events)} prompts, total cost: ${total_cost}")
         
-        return JSONResponse(content={
+        return FastJSONResponse(content={
             "events": events,
             "metadata": chain_metadata
         })
@@ -395,9 +509,39 @@ async def regenerate_chain_endpoint(data: RegenerateChainRequest):
         raise HTTPException(status_code=500, detail=f"Error regenerating chain: {str(e)}")
 
 
-@router.post("/api/save-chain-version")
-async def save_chain_version_endpoint(data: SaveChainVersionRequest):
-    """Save a chain version to compare"""
+# Documented body of /api/save-chain-version (the endpoint parses the raw body itself)
+SAVE_CHAIN_VERSION_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {"application/json": {"schema": SaveChainVersionRequest.model_json_schema()}},
+    }
+}
+
+
+@router.post("/api/save-chain-version", openapi_extra=SAVE_CHAIN_VERSION_BODY)
+async def save_chain_version_endpoint(request: Request):
+    """
+    Save a chain version to compare
+
+    The body is decoded once and only the envelope fields go through pydantic;
+    chain_events (hundreds of KB with inline images) is passed on as decoded
+    instead of being validated and copied dict by dict.
+    """
+    try:
+        payload = serializer.loads(await request.body())
+    except serializer.JSONDecodeError as e:
+        raise HTTPException(status_code=422, detail=f"Invalid JSON body: {e}")
+    if not isinstance(payload, dict):
+        raise HTTPException(status_code=422, detail="Body must be a JSON object")
+    chain_events = payload.pop("chain_events", None)
+    error = chain_events_error(chain_events)
+    if error:
+        raise HTTPException(status_code=422, detail=error)
+    try:
+        data = SaveChainVersionFields.model_validate(payload)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False))
+    
     try:
         # Ensure metadata has required fields
         metadata = data.metadata or {}
@@ -409,13 +553,13 @@ async def save_chain_version_endpoint(data: SaveChainVersionRequest):
         if "timestamp" not in metadata:
             metadata["timestamp"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         
-        logger.info(f"Saving chain version {data.version_id} with {len(data.chain_events)} events")
+        logger.info(f"Saving chain version {data.version_id} with {len(chain_events)} events")
         
-        success = save_chain_version(
+        success = await async_db.save_chain_version(
             version_id=data.version_id,
             trace_id=data.trace_id,
             chain_name=data.chain_name,
-            chain_events=data.chain_events,
+            chain_events=chain_events,
             total_tokens_input=data.total_tokens_input,
             total_tokens_output=data.total_tokens_output,
             total_cost=data.total_cost,
@@ -424,9 +568,9 @@ async def save_chain_version_endpoint(data: SaveChainVersionRequest):
         )
         
         if success:
-            return JSONResponse(content={"success": True, "message": "Chain version saved"})
+            return FastJSONResponse(content={"success": True, "message": "Chain version saved"})
         else:
-            return JSONResponse(content={"success": False, "message": "Chain version already exists"}, status_code=400)
+            return FastJSONResponse(content={"success": False, "message": "Chain version already exists"}, status_code=400)
     except Exception as e:
         logger.error(f"Error saving chain version: {str(e)}")
         logger.error(f"Traceback:\n{traceback.format_exc()}")
@@ -434,25 +578,62 @@ async def save_chain_version_endpoint(data: SaveChainVersionRequest):
 
 
 @router.get("/api/chain-versions/{trace_id}")
-async def get_chain_versions_endpoint(trace_id: str):
-    """Get all versions for a chain trace ID"""
+async def get_chain_versions_endpoint(trace_id: str, version_ids: Optional[str] = None):
+    """Get all versions for a chain trace ID (version_ids: comma-separated subset to fetch)"""
     try:
-        versions = get_chain_versions_by_trace(trace_id)
-        return JSONResponse(content={"versions": versions})
+        ids = [v for v in version_ids.split(",") if v] if version_ids else None
+        versions = await async_db.get_chain_versions_by_trace(trace_id, ids)
+        return FastJSONResponse(content={"versions": versions})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching chain versions: {str(e)}")
 
 
+@router.get("/api/chain-versions/{trace_id}/summary")
+async def get_chain_version_summaries_endpoint(trace_id: str):
+    """Version list for a chain (totals, ratings, step ratings) without the step payloads"""
+    try:
+        versions = await async_db.get_chain_version_summaries(trace_id)
+        return FastJSONResponse(content={"versions": versions})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching chain version summaries: {str(e)}")
+
+
+@router.get("/api/chain-version/{version_id}")
+async def get_chain_version_endpoint(version_id: str):
+    """Full payload (all steps) of a single chain version"""
+    version = await async_db.get_chain_version_by_id(version_id)
+    if not version:
+        raise HTTPException(status_code=404, detail=f"Chain version {version_id} not found")
+    return FastJSONResponse(content=version)
+
+
+@router.get("/api/chain-steps")
+async def get_chain_steps_endpoint(
+    trace_id: Optional[str] = None,
+    model: Optional[str] = None,
+    rated_only: bool = False,
+    limit: int = 100
+):
+    """Query individual chain steps (metrics and ratings) across chain versions"""
+    try:
+        steps = await async_db.get_chain_steps(
+            trace_id=trace_id, model=model, rated_only=rated_only, limit=min(max(limit, 1), 1000)
+        )
+        return FastJSONResponse(content={"steps": steps})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching chain steps: {str(e)}")
+
+
 @router.post("/api/update-chain-rating")
 async def update_chain_rating_endpoint(data: UpdateRatingRequest):
     """Update rating for a chain version"""
     try:
-        success = update_chain_rating(data.version_id, data.rating)
+        success = await async_db.update_chain_rating(data.version_id, data.rating)
         
         if success:
-            return JSONResponse(content={"success": True, "message": "Chain rating updated"})
+            return FastJSONResponse(content={"success": True, "message": "Chain rating updated"})
         else:
-            return JSONResponse(content={"success": False, "message": "Chain version not found"}, status_code=404)
+            return FastJSONResponse(content={"success": False, "message": "Chain version not found"}, status_code=404)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error updating chain rating: {str(e)}")
 
@@ -461,12 +642,12 @@ async def update_chain_rating_endpoint(data: UpdateRatingRequest):
 async def update_chain_step_rating_endpoint(data: UpdateChainStepRatingRequest):
     """Update rating for a specific step in a chain version"""
     try:
-        success = update_chain_step_rating(data.version_id, data.step_index, data.rating)
+        success = await async_db.update_chain_step_rating(data.version_id, data.step_index, data.rating)
         
         if success:
-            return JSONResponse(content={"success": True, "message": "Step rating updated"})
+            return FastJSONResponse(content={"success": True, "message": "Step rating updated"})
         else:
-            return JSONResponse(content={"success": False, "message": "Chain version or step not found"}, status_code=404)
+            return FastJSONResponse(content={"success": False, "message": "Chain version or step not found"}, status_code=404)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error updating chain step rating: {str(e)}")
 
@@ -475,7 +656,7 @@ async def update_chain_step_rating_endpoint(data: UpdateChainStepRatingRequest):
 async def delete_event_endpoint(event_id: str):
     """Delete all versions for an event"""
     try:
-        success = delete_event(event_id)
+        success = await async_db.delete_event(event_id)
         if success:
             return {"success": True, "message": f"Event {event_id} deleted successfully"}
         else:
@@ -491,7 +672,7 @@ async def delete_event_endpoint(event_id: str):
 async def delete_chain_endpoint(trace_id: str):
     """Delete all versions for a chain"""
     try:
-        success = delete_chain(trace_id)
+        success = await async_db.delete_chain(trace_id)
         if success:
             return {"success": True, "message": f"Chain {trace_id} deleted successfully"}
         else:
@@ -503,17 +684,49 @@ async def delete_chain_endpoint(trace_id: str):
         raise HTTPException(status_code=500, detail=f"Error deleting chain: {str(e)}")
 
 
+@router.get("/api/blobs/{blob_hash}")
+async def get_blob_endpoint(blob_hash: str):
+    """Serve a stored image by content hash (content-addressed, so cacheable forever)"""
+    blob = await async_db.get_blob(blob_hash)
+    if not blob:
+        raise HTTPException(status_code=404, detail=f"Blob {blob_hash} not found")
+    return Response(
+        content=blob["data"],
+        media_type=blob["mime_type"],
+        headers={"Cache-Control": "public, max-age=31536000, immutable"}
+    )
+
+
 @router.get("/api/health")
 async def health_check():
     """Health check endpoint"""
     return {"status": "healthy", "message": "LLM Evaluation Tool is running"}
 
 
+@router.get("/api/stats")
+async def get_stats():
+    """Runtime statistics for the storage layer"""
+    return {
+        "db_pool": get_pool_stats(),
+        "write_queue": async_db.write_queue.stats(),
+        "storage": await async_db.get_storage_metrics(),
+        "archive": await async_db.get_archive_stats(),
+        "http_client": http_client.get_stats(),
+        "posthog_cache": await async_db.run_in_db_executor(get_cache_stats)
+    }
+
+
+@router.get("/api/migrations")
+async def get_migrations():
+    """Schema version, applied migrations and background backfill progress"""
+    return await async_db.get_migration_status()
+
+
 @router.get("/api/settings")
 async def get_settings():
     """Get all settings (API keys masked for security)"""
     try:
-        settings = get_all_settings()
+        settings = await async_db.get_all_settings()
         
         # Don't mask for now - let the frontend show the saved values
         # User can see what they've saved
@@ -543,7 +756,7 @@ async def save_settings(data: Dict[str, str]):
                 value = data[key].strip()
                 # Only save if value is provided
                 if value:
-                    if set_setting(key, value, description):
+                    if await async_db.set_setting(key, value, description):
                         saved_count += 1
                     else:
                         logger.warning(f"Failed to save setting: {key}")
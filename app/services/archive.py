@@ -0,0 +1,144 @@
+"""Monthly archive databases for cold evaluation history (opened read-only on demand)"""
+import os
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional
+
+# Tables copied into archive files (same definitions as in the main database)
+ARCHIVE_TABLES = ("evaluation_versions", "chain_versions", "chain_steps")
+
+# Whole events/traces whose newest version is older than this are archived
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "180"))
+
+# Events/traces that only have their unrated auto-saved _initial version are archived sooner
+ARCHIVE_INITIAL_AFTER_DAYS = int(os.getenv("ARCHIVE_INITIAL_AFTER_DAYS", "30"))
+
+_MONTH_PATTERN = re.compile(r"^\d{4}-\d{2}$")
+
+
+class ArchiveStore:
+    """
+    One SQLite file per month (archive-YYYY-MM.db) next to the main database
+
+    Readers get a per-thread read-only connection per month, opened the first time a
+    month is needed. Writes (archive job, pruning) use short-lived connections.
+    """
+
+    def __init__(self, archive_dir: str):
+        self.archive_dir = archive_dir
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._readers: List[sqlite3.Connection] = []
+        self._generation = 0
+
+    def path(self, month: str) -> str:
+        if not _MONTH_PATTERN.match(month or ""):
+            raise ValueError(f"Invalid archive month: {month}")
+        return os.path.join(self.archive_dir, f"archive-{month}.db")
+
+    def months(self) -> List[str]:
+        """Months that have an archive file, oldest first"""
+        if not os.path.isdir(self.archive_dir):
+            return []
+        months = []
+        for name in os.listdir(self.archive_dir):
+            if name.startswith("archive-") and name.endswith(".db"):
+                month = name[len("archive-"):-len(".db")]
+                if _MONTH_PATTERN.match(month):
+                    months.append(month)
+        return sorted(months)
+
+    @contextmanager
+    def reader(self, month: str):
+        """This thread's read-only connection to one month's archive"""
+        cache = getattr(self._local, "conns", None)
+        if cache is None or cache[0] != self._generation:
+            cache = self._local.conns = (self._generation, {})
+        conn = cache[1].get(month)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{self.path(month)}?mode=ro", uri=True,
+                                   timeout=10.0, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA query_only=ON")
+            with self._lock:
+                self._readers.append(conn)
+            cache[1][month] = conn
+        yield conn
+
+    @contextmanager
+    def writer(self, month: str, table_sql: Dict[str, str]):
+        """
+        Open one month's archive for writing (creating it with the given CREATE TABLE
+        statements), commit on success
+        """
+        os.makedirs(self.archive_dir, exist_ok=True)
+        conn = sqlite3.connect(self.path(month), timeout=10.0)
+        conn.row_factory = sqlite3.Row
+        try:
+            for table, sql in table_sql.items():
+                conn.execute(sql.replace("CREATE TABLE", "CREATE TABLE IF NOT EXISTS", 1))
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_archive_event ON evaluation_versions(event_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_archive_trace ON chain_versions(trace_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_archive_steps ON chain_steps(version_id)")
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def vacuum(self, month: str):
+        """Reclaim space after rows were removed from a month's archive"""
+        conn = sqlite3.connect(self.path(month), timeout=10.0)
+        try:
+            conn.execute("VACUUM")
+        finally:
+            conn.close()
+
+    def close(self):
+        """Close every reader connection (threads reopen lazily afterwards)"""
+        with self._lock:
+            for conn in self._readers:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+            self._readers = []
+            self._generation += 1
+
+    def stats(self) -> Dict[str, Any]:
+        months = self.months()
+        return {
+            "archive_dir": self.archive_dir,
+            "files": [os.path.basename(self.path(m)) for m in months],
+            "size_bytes": sum(os.path.getsize(self.path(m)) for m in months),
+            "open_readers": len(self._readers),
+        }
+
+
+_store: Optional[ArchiveStore] = None
+_store_lock = threading.Lock()
+
+
+def get_archive_store(db_path: str) -> ArchiveStore:
+    """Archive store for a database (ARCHIVE_DIR, default: an archive/ folder next to it)"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            archive_dir = os.getenv("ARCHIVE_DIR") or os.path.join(
+                os.path.dirname(os.path.abspath(db_path)), "archive"
+            )
+            _store = ArchiveStore(archive_dir)
+        return _store
+
+
+def close_archive_store():
+    """Close archive reader connections (called on shutdown)"""
+    global _store
+    with _store_lock:
+        if _store is not None:
+            _store.close()
+            _store = None
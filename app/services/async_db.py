@@ -0,0 +1,400 @@
+"""Async data-access layer - runs SQLite work on a dedicated executor so the event loop never blocks on disk"""
+import asyncio
+import functools
+import itertools
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Callable, AsyncIterator
+
+from app.services import database
+from app.services import transfer
+from app.services.write_queue import WriteQueue
+
+# Number of threads reserved for SQLite work (each keeps its own pooled reader connection)
+DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", "4"))
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def init_executor() -> ThreadPoolExecutor:
+    """Create the database executor (called on startup; safe to call twice)"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix="sqlite")
+    return _executor
+
+
+def shutdown_executor():
+    """Wait for pending database work and stop the executor (called on shutdown)"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+
+
+async def run_in_db_executor(func: Callable, *args, **kwargs) -> Any:
+    """Run a blocking database function on the database executor"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(init_executor(), functools.partial(func, *args, **kwargs))
+
+
+# All writes from request handlers go through one writer task (group commit)
+write_queue = WriteQueue(run_in_db_executor)
+
+
+async def start_write_queue():
+    """Start the background writer (called on startup)"""
+    write_queue.start()
+
+
+async def stop_write_queue():
+    """Flush pending writes and stop the background writer (called on shutdown)"""
+    await write_queue.stop()
+
+
+async def _run_write(func: Callable, *args, **kwargs) -> Any:
+    """
+    Run a @retry_on_lock write function without blocking the loop
+
+    The single-attempt function (func.__wrapped__) is handed to the write queue, which
+    commits it together with other pending writes and retries whole batches on lock
+    errors. Without a running writer (scripts, tests) it runs on the executor directly
+    and backs off with asyncio.sleep instead of a blocking time.sleep.
+    """
+    attempt_func = getattr(func, "__wrapped__", func)
+    if write_queue.running:
+        try:
+            return await write_queue.submit(attempt_func, *args, **kwargs)
+        except sqlite3.OperationalError as e:
+            print(f"Error in {func.__name__}: {e}")
+            return False
+
+    for attempt in range(database.LOCK_RETRIES):
+        try:
+            return await run_in_db_executor(attempt_func, *args, **kwargs)
+        except sqlite3.OperationalError as e:
+            if database.is_locked_error(e) and attempt < database.LOCK_RETRIES - 1:
+                print(f"Database locked, retrying ({attempt + 1}/{database.LOCK_RETRIES})...")
+                await asyncio.sleep(database.lock_retry_delay(attempt))
+                continue
+            print(f"Error in {func.__name__}: {e}")
+            return False
+    return False
+
+
+# Pause between background backfill batches, so request writes get the writer in between
+BACKFILL_PAUSE = float(os.getenv("BACKFILL_PAUSE", "0.05"))
+
+_backfill_task: Optional[asyncio.Task] = None
+
+
+async def _run_backfills():
+    while True:
+        progress = await run_in_db_executor(database.run_backfill_step)
+        if progress is None:
+            return
+        await asyncio.sleep(BACKFILL_PAUSE)
+
+
+async def start_backfills():
+    """Run pending data backfills in the background (called on startup)"""
+    global _backfill_task
+    if _backfill_task is None or _backfill_task.done():
+        _backfill_task = asyncio.create_task(_run_backfills())
+
+
+async def stop_backfills():
+    """Stop the backfill task; the current batch finishes and the rest resumes on next start"""
+    global _backfill_task
+    if _backfill_task is not None:
+        _backfill_task.cancel()
+        try:
+            await _backfill_task
+        except asyncio.CancelledError:
+            pass
+        _backfill_task = None
+
+
+# Seconds between background maintenance rounds (checkpoints, incremental vacuum, optimize)
+MAINTENANCE_INTERVAL = float(os.getenv("MAINTENANCE_INTERVAL", "60"))
+
+_maintenance_task: Optional[asyncio.Task] = None
+_maintenance_wakeup: Optional[asyncio.Event] = None
+
+
+async def _run_maintenance():
+    while True:
+        try:
+            await asyncio.wait_for(_maintenance_wakeup.wait(), timeout=MAINTENANCE_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        _maintenance_wakeup.clear()
+        try:
+            actions = await run_in_db_executor(database.run_maintenance_step)
+            if actions.get("checkpoint") or actions.get("vacuumed_pages"):
+                print(f"Database maintenance: {actions}")
+        except Exception as e:
+            print(f"Error in database maintenance: {e}")
+
+
+def request_maintenance():
+    """Run the next maintenance round now (e.g. after deletes freed pages)"""
+    if _maintenance_wakeup is not None:
+        _maintenance_wakeup.set()
+
+
+async def start_maintenance():
+    """Start the background maintenance scheduler (called on startup)"""
+    global _maintenance_task, _maintenance_wakeup
+    if _maintenance_task is None or _maintenance_task.done():
+        _maintenance_wakeup = asyncio.Event()
+        _maintenance_task = asyncio.create_task(_run_maintenance())
+
+
+async def stop_maintenance():
+    """Stop the scheduler and refresh planner statistics once more (called on shutdown)"""
+    global _maintenance_task, _maintenance_wakeup
+    if _maintenance_task is not None:
+        _maintenance_task.cancel()
+        try:
+            await _maintenance_task
+        except asyncio.CancelledError:
+            pass
+        _maintenance_task = None
+        _maintenance_wakeup = None
+        await run_in_db_executor(database.optimize_database)
+
+
+async def get_storage_metrics() -> Dict[str, Any]:
+    """Async version of database.get_storage_metrics"""
+    return await run_in_db_executor(database.get_storage_metrics)
+
+
+async def get_migration_status() -> Dict[str, Any]:
+    """Async version of database.get_migration_status"""
+    return await run_in_db_executor(database.get_migration_status)
+
+
+async def get_archive_stats() -> Dict[str, Any]:
+    """Async version of database.get_archive_stats"""
+    return await run_in_db_executor(database.get_archive_stats)
+
+
+async def export_versions(fmt: str, kind: Optional[str] = None, include_archived: bool = True) -> AsyncIterator[str]:
+    """
+    Stream a dump (database.iter_export_versions encoded as fmt)
+
+    Each batch is read and serialized on the executor; the loop only forwards text.
+    """
+    chunks = transfer.encode(database.iter_export_versions(kind=kind, include_archived=include_archived), fmt)
+    while True:
+        batch = await run_in_db_executor(lambda: list(itertools.islice(chunks, database.EXPORT_BATCH_SIZE)))
+        if not batch:
+            break
+        yield "".join(batch)
+
+
+# ============= Evaluation versions =============
+
+async def init_db() -> None:
+    """Async version of database.init_db"""
+    return await run_in_db_executor(database.init_db)
+
+
+async def save_version(*args, **kwargs) -> bool:
+    """Async version of database.save_version"""
+    return await _run_write(database.save_version, *args, **kwargs)
+
+
+async def save_versions(versions: List[Dict[str, Any]]) -> int:
+    """Async version of database.save_versions"""
+    return await _run_write(database.save_versions, versions)
+
+
+async def save_version_once(kind: str, **kwargs) -> str:
+    """
+    Save an auto-saved version ("event" or "chain") unless it is already stored
+
+    The existence check runs on a reader first, so re-opening a known event or trace
+    is one index lookup: no payload is serialized and the write queue is not used.
+    Returns "saved", "exists" (the save was a no-op) or "failed".
+    """
+    if await run_in_db_executor(database.version_exists, kind, kwargs["version_id"]):
+        return "exists"
+    save = database.save_version if kind == "event" else database.save_chain_version
+    if await _run_write(save, **kwargs):
+        return "saved"
+    # Lost a race with another request saving the same version
+    if await run_in_db_executor(database.version_exists, kind, kwargs["version_id"]):
+        return "exists"
+    return "failed"
+
+
+async def update_rating(version_id: str, rating: Any) -> bool:
+    """Async version of database.update_rating"""
+    return await _run_write(database.update_rating, version_id, rating)
+
+
+async def event_exists_in_db(event_id: str) -> bool:
+    """Async version of database.event_exists_in_db"""
+    return await run_in_db_executor(database.event_exists_in_db, event_id)
+
+
+async def get_initial_version_by_event(event_id: str) -> Optional[Dict[str, Any]]:
+    """Async version of database.get_initial_version_by_event"""
+    return await run_in_db_executor(database.get_initial_version_by_event, event_id)
+
+
+async def get_initial_versions_by_events(event_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Async version of database.get_initial_versions_by_events"""
+    return await run_in_db_executor(database.get_initial_versions_by_events, event_ids)
+
+
+async def get_versions_by_event(event_id: str) -> List[Dict[str, Any]]:
+    """Async version of database.get_versions_by_event"""
+    return await run_in_db_executor(database.get_versions_by_event, event_id)
+
+
+async def get_version_summaries_by_event(event_id: str) -> List[Dict[str, Any]]:
+    """Async version of database.get_version_summaries_by_event"""
+    return await run_in_db_executor(database.get_version_summaries_by_event, event_id)
+
+
+async def get_version_by_id(version_id: str) -> Optional[Dict[str, Any]]:
+    """Async version of database.get_version_by_id"""
+    return await run_in_db_executor(database.get_version_by_id, version_id)
+
+
+async def get_all_events() -> List[Dict[str, Any]]:
+    """Async version of database.get_all_events"""
+    return await run_in_db_executor(database.get_all_events)
+
+
+async def list_events(**kwargs) -> Dict[str, Any]:
+    """Async version of database.list_events"""
+    return await run_in_db_executor(database.list_events, **kwargs)
+
+
+async def search(**kwargs) -> Dict[str, Any]:
+    """Async version of database.search"""
+    return await run_in_db_executor(database.search, **kwargs)
+
+
+async def get_rating_stats() -> Dict[str, Any]:
+    """Async version of database.get_rating_stats"""
+    return await run_in_db_executor(database.get_rating_stats)
+
+
+# ============= Chain versions =============
+
+async def save_chain_version(*args, **kwargs) -> bool:
+    """Async version of database.save_chain_version"""
+    return await _run_write(database.save_chain_version, *args, **kwargs)
+
+
+async def get_chain_versions_by_trace(trace_id: str, version_ids: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """Async version of database.get_chain_versions_by_trace"""
+    return await run_in_db_executor(database.get_chain_versions_by_trace, trace_id, version_ids)
+
+
+async def get_chain_version_by_id(version_id: str) -> Optional[Dict[str, Any]]:
+    """Async version of database.get_chain_version_by_id"""
+    return await run_in_db_executor(database.get_chain_version_by_id, version_id)
+
+
+async def get_chain_version_summaries(trace_id: str) -> List[Dict[str, Any]]:
+    """Async version of database.get_chain_version_summaries"""
+    return await run_in_db_executor(database.get_chain_version_summaries, trace_id)
+
+
+async def update_chain_rating(version_id: str, rating: Any) -> bool:
+    """Async version of database.update_chain_rating"""
+    return await _run_write(database.update_chain_rating, version_id, rating)
+
+
+async def update_chain_step_rating(version_id: str, step_index: int, rating: Optional[Dict[str, Any]]) -> bool:
+    """Async version of database.update_chain_step_rating"""
+    return await _run_write(database.update_chain_step_rating, version_id, step_index, rating)
+
+
+async def trace_exists_in_db(trace_id: str) -> bool:
+    """Async version of database.trace_exists_in_db"""
+    return await run_in_db_executor(database.trace_exists_in_db, trace_id)
+
+
+async def get_initial_chain_by_trace(trace_id: str) -> Optional[Dict[str, Any]]:
+    """Async version of database.get_initial_chain_by_trace"""
+    return await run_in_db_executor(database.get_initial_chain_by_trace, trace_id)
+
+
+async def get_all_trace_ids() -> List[str]:
+    """Async version of database.get_all_trace_ids"""
+    return await run_in_db_executor(database.get_all_trace_ids)
+
+
+async def get_all_chains() -> List[Dict[str, Any]]:
+    """Async version of database.get_all_chains"""
+    return await run_in_db_executor(database.get_all_chains)
+
+
+async def list_chains(**kwargs) -> Dict[str, Any]:
+    """Async version of database.list_chains"""
+    return await run_in_db_executor(database.list_chains, **kwargs)
+
+
+async def get_chain_steps(*args, **kwargs) -> List[Dict[str, Any]]:
+    """Async version of database.get_chain_steps"""
+    return await run_in_db_executor(database.get_chain_steps, *args, **kwargs)
+
+
+# ============= Blob store =============
+
+async def get_blob(blob_hash: str) -> Optional[Dict[str, Any]]:
+    """Async version of database.get_blob"""
+    return await run_in_db_executor(database.get_blob, blob_hash)
+
+
+async def rehydrate_image_urls(image_urls: Optional[List[str]]) -> Optional[List[str]]:
+    """Async version of database.rehydrate_image_urls"""
+    return await run_in_db_executor(database.rehydrate_image_urls, image_urls)
+
+
+# ============= Settings =============
+
+async def get_setting(key: str, default: Optional[str] = None) -> Optional[str]:
+    """Async version of database.get_setting"""
+    return await run_in_db_executor(database.get_setting, key, default)
+
+
+async def set_setting(key: str, value: str, description: Optional[str] = None) -> bool:
+    """Async version of database.set_setting"""
+    return await _run_write(database.set_setting, key, value, description)
+
+
+async def get_all_settings() -> Dict[str, Any]:
+    """Async version of database.get_all_settings"""
+    return await run_in_db_executor(database.get_all_settings)
+
+
+async def delete_setting(key: str) -> bool:
+    """Async version of database.delete_setting"""
+    return await _run_write(database.delete_setting, key)
+
+
+# ============= Deletes =============
+
+async def delete_event(event_id: str) -> bool:
+    """Async version of database.delete_event"""
+    deleted = await _run_write(database.delete_event, event_id)
+    if deleted:
+        request_maintenance()
+    return deleted
+
+
+async def delete_chain(trace_id: str) -> bool:
+    """Async version of database.delete_chain"""
+    deleted = await _run_write(database.delete_chain, trace_id)
+    if deleted:
+        request_maintenance()
+    return deleted
@@ -0,0 +1,91 @@
+"""Content-addressed blob store for inline (base64 data URL) images"""
+import base64
+import binascii
+import hashlib
+import re
+from typing import Dict, Any, List, Optional, Tuple
+
+# Stored image references are served by GET /api/blobs/{hash}, so the browser can
+# render (and cache) them directly while the LLM providers get them rehydrated
+BLOB_URL_PREFIX = "/api/blobs/"
+
+_DATA_URL_PATTERN = re.compile(r'^data:([\w.+-]+/[\w.+-]+)?(;[^,]*)?;base64,', re.IGNORECASE)
+_BLOB_URL_PATTERN = re.compile(r'/api/blobs/([0-9a-f]{64})$')
+
+
+def parse_data_url(url: str) -> Optional[Tuple[str, bytes]]:
+    """Decode a base64 data URL into (mime_type, bytes); None if it is not one"""
+    if not isinstance(url, str):
+        return None
+    match = _DATA_URL_PATTERN.match(url)
+    if not match:
+        return None
+    try:
+        data = base64.b64decode(url[match.end():], validate=False)
+    except (binascii.Error, ValueError):
+        return None
+    return (match.group(1) or "application/octet-stream"), data
+
+
+def to_data_url(mime_type: str, data: bytes) -> str:
+    """Encode bytes back into a base64 data URL"""
+    return f"data:{mime_type};base64,{base64.b64encode(data).decode('ascii')}"
+
+
+def blob_url(blob_hash: str) -> str:
+    """Reference stored in place of an inline image"""
+    return f"{BLOB_URL_PREFIX}{blob_hash}"
+
+
+def blob_hash_from_url(url: str) -> Optional[str]:
+    """Extract the blob hash from a reference (relative or absolute URL)"""
+    if not isinstance(url, str):
+        return None
+    match = _BLOB_URL_PATTERN.search(url)
+    return match.group(1) if match else None
+
+
+def store_image_urls(cursor, image_urls: Optional[List[str]]) -> Optional[List[str]]:
+    """
+    Replace inline data URLs with blob references, storing each distinct image once
+
+    Must run on the writer connection (inside the caller's transaction).
+    Non-data URLs (http links, existing references) are kept as they are.
+    """
+    if not image_urls:
+        return image_urls
+
+    stored = []
+    for url in image_urls:
+        parsed = parse_data_url(url)
+        if parsed is None:
+            stored.append(url)
+            continue
+        mime_type, data = parsed
+        blob_hash = hashlib.sha256(data).hexdigest()
+        cursor.execute("""
+            INSERT OR IGNORE INTO blobs (hash, mime_type, data, size)
+            VALUES (?, ?, ?, ?)
+        """, (blob_hash, mime_type, data, len(data)))
+        stored.append(blob_url(blob_hash))
+    return stored
+
+
+def store_event_images(cursor, chain_events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Return chain events with each step's user_images moved into the blob store"""
+    stored_events = []
+    for event in chain_events:
+        if isinstance(event, dict) and event.get("user_images"):
+            event = {**event, "user_images": store_image_urls(cursor, event["user_images"])}
+        stored_events.append(event)
+    return stored_events
+
+
+def load_blobs(cursor, blob_hashes: List[str]) -> Dict[str, Tuple[str, bytes]]:
+    """Load blobs by hash as {hash: (mime_type, bytes)}"""
+    if not blob_hashes:
+        return {}
+    unique = list(dict.fromkeys(blob_hashes))
+    placeholders = ",".join("?" for _ in unique)
+    cursor.execute(f"SELECT hash, mime_type, data FROM blobs WHERE hash IN ({placeholders})", unique)
+    return {row[0]: (row[1], bytes(row[2])) for row in cursor.fetchall()}
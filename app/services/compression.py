@@ -0,0 +1,127 @@
+"""Optional zstd codec (with a dictionary trained on our own data) for large stored text columns"""
+import os
+import threading
+from typing import Dict, Any, List, Optional, Union
+
+try:
+    import zstandard
+except ImportError:  # optional dependency - values are stored as plain text without it
+    zstandard = None
+
+# Set DB_COMPRESSION=off to keep writing plain text (existing compressed rows still decode)
+COMPRESSION_ENABLED = zstandard is not None and os.getenv("DB_COMPRESSION", "zstd").lower() != "off"
+
+# Values shorter than this are not worth a zstd frame
+COMPRESSION_MIN_SIZE = 128
+
+COMPRESSION_LEVEL = 9
+
+# Dictionary size used by train_dictionary (our prompt templates fit comfortably)
+DICT_SIZE = 112 * 1024
+
+# dict_id -> ZstdCompressionDict for every dictionary loaded so far; dictionaries are
+# immutable once stored, so old rows keep decoding after a newer one is trained
+_dicts: Dict[int, Any] = {}
+_active_dict_id: Optional[int] = None
+_local = threading.local()
+
+
+def available() -> bool:
+    """Whether the zstandard module is installed"""
+    return zstandard is not None
+
+
+def register_dict(dict_id: int, data: bytes, active: bool = False):
+    """Make a stored dictionary available to the codec (active = used for new values)"""
+    global _active_dict_id
+    if zstandard is None:
+        return
+    if dict_id not in _dicts:
+        _dicts[dict_id] = zstandard.ZstdCompressionDict(bytes(data))
+    if active:
+        _active_dict_id = dict_id
+
+
+def active_dict_id() -> Optional[int]:
+    """ID of the dictionary new values are compressed with (None = no dictionary)"""
+    return _active_dict_id
+
+
+def train_dict(samples: List[bytes], dict_size: int = DICT_SIZE) -> Optional[Any]:
+    """Train a zstd dictionary from sample values; None if there are not enough samples"""
+    if zstandard is None:
+        print("zstandard is not installed - cannot train a compression dictionary")
+        return None
+    try:
+        return zstandard.train_dictionary(dict_size, samples)
+    except zstandard.ZstdError as e:
+        print(f"Error training compression dictionary ({len(samples)} samples): {e}")
+        return None
+
+
+def _compressor(use_dict: bool = True):
+    """Per-thread compressor for the active dictionary (zstd contexts are not thread-safe)"""
+    key = (_active_dict_id or 0) if use_dict else 0
+    compressors = getattr(_local, "compressors", None)
+    if compressors is None:
+        compressors = _local.compressors = {}
+    if key not in compressors:
+        if key:
+            compressors[key] = zstandard.ZstdCompressor(level=COMPRESSION_LEVEL, dict_data=_dicts[key])
+        else:
+            compressors[key] = zstandard.ZstdCompressor(level=COMPRESSION_LEVEL)
+    return compressors[key]
+
+
+def _decompressor(dict_id: int):
+    decompressors = getattr(_local, "decompressors", None)
+    if decompressors is None:
+        decompressors = _local.decompressors = {}
+    if dict_id not in decompressors:
+        if dict_id:
+            decompressors[dict_id] = zstandard.ZstdDecompressor(dict_data=_dicts[dict_id])
+        else:
+            decompressors[dict_id] = zstandard.ZstdDecompressor()
+    return decompressors[dict_id]
+
+
+def encode_text(text: Optional[str], use_dict: bool = True) -> Optional[Union[str, bytes]]:
+    """
+    Encode a value for storage
+
+    Returns a zstd frame (stored as a BLOB) when compression is enabled and pays off,
+    otherwise the text unchanged. The frame header records the dictionary ID, so the
+    dictionary version never has to be stored separately. use_dict=False is for
+    stores that cannot look dictionaries up again (frames decode without load_dict).
+    """
+    if text is None or not COMPRESSION_ENABLED or len(text) < COMPRESSION_MIN_SIZE:
+        return text
+    raw = text.encode("utf-8")
+    compressed = _compressor(use_dict).compress(raw)
+    return compressed if len(compressed) < len(raw) else text
+
+
+def frame_dict_id(value: bytes) -> int:
+    """Dictionary ID recorded in a stored zstd frame (0 = no dictionary)"""
+    return zstandard.get_frame_parameters(value).dict_id
+
+
+def decode_text(value: Optional[Union[str, bytes]], load_dict=None) -> Optional[str]:
+    """
+    Decode a stored value back to text
+
+    Plain TEXT values are returned as they are. For BLOB values, load_dict(dict_id) is
+    called to fetch a dictionary that has not been registered yet (returns bytes or None).
+    """
+    if value is None or isinstance(value, str):
+        return value
+    if zstandard is None:
+        raise RuntimeError("Value is zstd-compressed but the zstandard module is not installed")
+    value = bytes(value)
+    dict_id = frame_dict_id(value)
+    if dict_id and dict_id not in _dicts:
+        data = load_dict(dict_id) if load_dict else None
+        if data is None:
+            raise RuntimeError(f"Compression dictionary {dict_id} not found")
+        register_dict(dict_id, data)
+    return _decompressor(dict_id).decompress(value).decode("utf-8")
@@ -1,10 +1,25 @@
 """Database module for storing evaluation versions"""
 import sqlite3
-import json
+import base64
+import binascii
+import functools
 from datetime import datetime
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Iterable, Iterator, Callable
 import os
 import time
+import threading
+
+from app.services.db_pool import get_pool
+from app.services.blob_store import (
+    store_image_urls, store_event_images, load_blobs, blob_hash_from_url, to_data_url
+)
+from app.services import compression
+from app.services import serializer
+from app.services import migrations
+from app.services.transfer import record_kind
+from app.services.archive import (
+    get_archive_store, ARCHIVE_TABLES, ARCHIVE_AFTER_DAYS, ARCHIVE_INITIAL_AFTER_DAYS
+)
 
 # Determine default DB path based on environment
 def get_default_db_path():
@@ -37,9 +52,9 @@ def _parse_rating(rating_value):
         return {"overall": rating_value}
     if isinstance(rating_value, str):
         try:
-            parsed = json.loads(rating_value)
+            parsed = serializer.loads(rating_value)
             return parsed if isinstance(parsed, dict) else {"overall": parsed}
-        except (json.JSONDecodeError, TypeError):
+        except (serializer.JSONDecodeError, TypeError):
             # If it's not valid JSON, try to parse as int
             try:
                 return {"overall": int(rating_value)}
@@ -47,41 +62,127 @@ def _parse_rating(rating_value):
                 return None
     return rating_value
 
-def get_connection():
-    """Get a database connection with proper settings"""
-    db_path = DB_PATH
-    
-    # Ensure the directory exists
-    db_dir = os.path.dirname(os.path.abspath(db_path))
-    
-    # Only try to create directory if it doesn't exist and is writable
-    if db_dir and db_dir != '.' and not os.path.exists(db_dir):
-        try:
-            os.makedirs(db_dir, exist_ok=True)
-            print(f"Created database directory: {db_dir}")
-        except (OSError, PermissionError) as e:
-            print(f"Warning: Could not create directory {db_dir}: {e}")
-            # Directory creation failed, but we can still try to connect
-            # SQLite will use the current directory if the path doesn't work
-    
-    try:
-        conn = sqlite3.connect(db_path, timeout=10.0)
-        # Enable WAL mode for better concurrency
-        conn.execute("PRAGMA journal_mode=WAL")
-        return conn
-    except Exception as e:
-        print(f"Error connecting to database at {db_path}: {e}")
-        # Last resort: try current directory
-        fallback_path = "evaluation_history.db"
-        print(f"Falling back to: {fallback_path}")
-        conn = sqlite3.connect(fallback_path, timeout=10.0)
-        conn.execute("PRAGMA journal_mode=WAL")
-        return conn
+def read_connection():
+    """Check out a pooled reader connection (use as a context manager)"""
+    return get_pool(DB_PATH).reader()
+
+def write_connection():
+    """Check out the pooled writer connection; commits on success (use as a context manager)"""
+    return get_pool(DB_PATH).writer()
+
+def after_commit(callback: Callable[[], None]):
+    """Run callback once the current write transaction (including any enclosing batch) commits"""
+    get_pool(DB_PATH).after_commit(callback)
+
+def _load_compression_dict(dict_id: int) -> Optional[bytes]:
+    """Fetch a stored compression dictionary (called by the codec on first use)"""
+    with read_connection() as conn:
+        row = conn.execute("SELECT data FROM compression_dicts WHERE dict_id = ?", (dict_id,)).fetchone()
+    return bytes(row[0]) if row else None
+
+def _decode_text(value) -> Optional[str]:
+    """Decode a possibly compressed text column"""
+    return compression.decode_text(value, _load_compression_dict)
+
+def _decode_json(value, default=None):
+    """Decode a possibly compressed JSON column"""
+    text = _decode_text(value)
+    return serializer.loads(text) if text else default
+
+def _encode_json(value) -> Optional[Any]:
+    """Serialize a JSON column for storage (compressed when enabled)"""
+    return compression.encode_text(serializer.dumps(value))
+
+# Retry settings for "database is locked" (another process holding the write lock)
+LOCK_RETRIES = 3
+LOCK_RETRY_DELAY = 0.1
+
+def is_locked_error(error: Exception) -> bool:
+    """Check if an exception is SQLite's "database is locked" error"""
+    return isinstance(error, sqlite3.OperationalError) and "database is locked" in str(error).lower()
+
+def lock_retry_delay(attempt: int) -> float:
+    """Exponential backoff delay (seconds) before retry number attempt + 1"""
+    return LOCK_RETRY_DELAY * (2 ** attempt)
+
+def retry_on_lock(func):
+    """
+    Retry a single-attempt write function while the database is locked
+
+    The wrapped function must re-raise lock errors and handle everything else.
+    This wrapper backs off with time.sleep, so it is for synchronous callers only;
+    async callers use app.services.async_db, which retries func.__wrapped__ with asyncio.sleep.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        for attempt in range(LOCK_RETRIES):
+            try:
+                return func(*args, **kwargs)
+            except sqlite3.OperationalError as e:
+                if is_locked_error(e) and attempt < LOCK_RETRIES - 1:
+                    print(f"Database locked, retrying ({attempt + 1}/{LOCK_RETRIES})...")
+                    time.sleep(lock_retry_delay(attempt))
+                    continue
+                print(f"Error in {func.__name__}: {e}")
+                return False
+        return False
+    return wrapper
+
+def run_write_batch(calls: List[tuple]) -> List[tuple]:
+    """
+    Run several single-attempt write functions in one transaction (group commit)
+
+    calls: list of (func, args, kwargs). Each call runs in its own savepoint, so one
+    failing write does not affect the others. Returns (ok, result_or_exception) per call.
+    Lock errors abort the whole batch and are raised so the caller can retry it.
+    """
+    results = []
+    with write_connection():
+        for func, args, kwargs in calls:
+            try:
+                results.append((True, func(*args, **kwargs)))
+            except sqlite3.OperationalError as e:
+                if is_locked_error(e):
+                    raise
+                results.append((False, e))
+            except Exception as e:
+                results.append((False, e))
+    return results
+
+# The overall rating of a rating column. Handles JSON objects ({"overall": n})
+# and bare numbers; anything else (or a non-numeric overall) is NULL
+RATING_OVERALL_EXPR = """
+    CASE
+        WHEN rating IS NULL OR NOT json_valid(rating) THEN NULL
+        WHEN json_type(rating) IN ('integer', 'real') THEN CAST(rating AS REAL)
+        WHEN json_type(rating, '$.overall') IN ('integer', 'real') THEN json_extract(rating, '$.overall')
+    END
+"""
+
+# Generated column definition for rating_overall
+RATING_OVERALL_SQL = f"GENERATED ALWAYS AS ({RATING_OVERALL_EXPR}) VIRTUAL"
+
+VERSION_METRIC_COLUMNS = (
+    ("tokens_input", "INTEGER"),
+    ("tokens_output", "INTEGER"),
+    ("cost", "REAL"),
+    ("latency", "REAL"),
+)
+
+def _version_metrics(metadata: Optional[Dict[str, Any]]) -> tuple:
+    """(tokens_input, tokens_output, cost, latency) from a version's metadata"""
+    metadata = metadata or {}
+    cost = metadata.get("total_cost_usd")
+    return (
+        metadata.get("input_tokens"),
+        metadata.get("output_tokens"),
+        cost if isinstance(cost, (int, float)) else None,
+        _parse_latency(metadata.get("latency"))
+    )
 
 def init_db():
     """Initialize the database with required tables"""
-    conn = get_connection()
-    try:
+    with write_connection() as conn:
         cursor = conn.cursor()
         
         cursor.execute("""
@@ -140,7 +241,34 @@ def init_db():
         cursor.execute("""
             CREATE INDEX IF NOT EXISTS idx_chain_version_id ON chain_versions(version_id)
         """)
-        
+
+        # One row per chain step, so a step rating is a single-row update
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS chain_steps (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                version_id TEXT NOT NULL,
+                trace_id TEXT NOT NULL,
+                step_index INTEGER NOT NULL,
+                name TEXT,
+                model TEXT,
+                latency REAL,
+                tokens_input INTEGER,
+                tokens_output INTEGER,
+                cost REAL,
+                rating TEXT,
+                event TEXT NOT NULL,
+                UNIQUE(version_id, step_index)
+            )
+        """)
+
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_chain_steps_trace_id ON chain_steps(trace_id)
+        """)
+
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_chain_steps_model ON chain_steps(model)
+        """)
+
         # Create settings table for API keys and configuration
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS settings (
@@ -156,27 +284,1182 @@ def init_db():
         cursor.execute("""
             CREATE INDEX IF NOT EXISTS idx_settings_key ON settings(key)
         """)
+
+        # Bumped by every settings write so other processes can tell their cache is stale
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS settings_version (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                version INTEGER NOT NULL
+            )
+        """)
+        cursor.execute("INSERT OR IGNORE INTO settings_version (id, version) VALUES (1, 0)")
         
-        conn.commit()
-    finally:
-        conn.close()
-    
-    # Verify database file was created
+        # Content-addressed store for inline images (versions keep /api/blobs/<hash> references)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS blobs (
+                hash TEXT PRIMARY KEY,
+                mime_type TEXT NOT NULL,
+                data BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+
+        # Trained zstd dictionaries; rows reference theirs by the ID in the zstd frame header
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS compression_dicts (
+                dict_id INTEGER PRIMARY KEY,
+                data BLOB NOT NULL,
+                sample_count INTEGER,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+
+        # Model/provider filters probe the versions (or steps) of each listed event or chain
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_event_model ON evaluation_versions(event_id, model_provider, model_name)
+        """)
+
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_chain_steps_trace_model ON chain_steps(trace_id, model)
+        """)
+
+        # Everything added after the original schema (columns, derived tables, backfills)
+        migrations.apply_migrations(cursor, SCHEMA_MIGRATIONS)
+
+        # The newest dictionary is used for new values
+        cursor.execute("SELECT dict_id, data FROM compression_dicts ORDER BY created_at DESC, rowid DESC LIMIT 1")
+        row = cursor.fetchone()
+        if row:
+            compression.register_dict(row[0], row[1], active=True)
+
+    # Settings are served from memory from here on
+    _invalidate_settings_cache()
+    load_settings_cache()
+
+    # Verify database file was created (the pool may have fallen back to the current directory)
+    db_path = get_pool(DB_PATH).db_path
     try:
-        if os.path.exists(DB_PATH):
-            file_size = os.path.getsize(DB_PATH)
-            print(f"✅ Database initialized at {DB_PATH} (size: {file_size} bytes)")
+        if os.path.exists(db_path):
+            file_size = os.path.getsize(db_path)
+            print(f"✅ Database initialized at {db_path} (size: {file_size} bytes)")
         else:
-            # Check if it was created in current directory as fallback
-            if os.path.exists("evaluation_history.db"):
-                file_size = os.path.getsize("evaluation_history.db")
-                print(f"✅ Database initialized at evaluation_history.db (size: {file_size} bytes)")
-            else:
-                print(f"⚠️  Warning: Database file not found after initialization")
+            print(f"⚠️  Warning: Database file not found after initialization")
     except Exception as e:
         print(f"Note: Could not verify database file: {e}")
 
-def save_version(
+# ============= Schema migrations =============
+# Numbered changes on top of the original schema. Each one is idempotent (databases from
+# before schema_version replay all of them) and only does fast DDL; row rewrites are
+# scheduled as backfills, which run in small batches in the background (see
+# run_backfill_step) while the app keeps serving.
+
+# Rows per backfill batch (one short write transaction each)
+BACKFILL_BATCH_SIZE = int(os.getenv("BACKFILL_BATCH_SIZE", "200"))
+
+def _columns(cursor, table: str) -> List[str]:
+    cursor.execute(f"PRAGMA table_xinfo({table})")
+    return [col[1] for col in cursor.fetchall()]
+
+def _table_exists(cursor, name: str) -> bool:
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (name,))
+    return cursor.fetchone() is not None
+
+def _max_id(cursor, table: str) -> int:
+    """Highest row ID so far - rows written after a migration are already in the new format"""
+    cursor.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}")
+    return cursor.fetchone()[0]
+
+def _schedule_backfill(cursor, name: str, count_sql: str, state: Optional[Dict[str, Any]] = None):
+    """Schedule a backfill unless count_sql finds nothing to do"""
+    cursor.execute(count_sql)
+    total = cursor.fetchone()[0]
+    if total:
+        migrations.schedule_backfill(cursor, name, state, total)
+
+def _migrate_chain_step_count(cursor):
+    # step_count is set for chains stored in chain_steps; legacy rows (NULL) keep
+    # their steps in the chain_events JSON until the chain_steps backfill moves them
+    if "step_count" not in _columns(cursor, "chain_versions"):
+        cursor.execute("ALTER TABLE chain_versions ADD COLUMN step_count INTEGER")
+    _schedule_backfill(cursor, "chain_steps", "SELECT COUNT(*) FROM chain_versions WHERE step_count IS NULL")
+
+def _migrate_rating_overall(cursor):
+    # rating_overall: the overall rating extracted by SQLite (JSON1), so rating
+    # aggregates and filters never parse JSON in Python
+    for table, key_column in (("evaluation_versions", "event_id"), ("chain_versions", "trace_id")):
+        if "rating_overall" not in _columns(cursor, table):
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN rating_overall REAL {RATING_OVERALL_SQL}")
+            _schedule_backfill(cursor, f"{table}.legacy_ratings", f"SELECT COUNT(*) FROM {table}",
+                               {"last_id": 0, "max_id": _max_id(cursor, table)})
+        cursor.execute(f"""
+            CREATE INDEX IF NOT EXISTS idx_{table}_rating ON {table}({key_column}, rating_overall)
+        """)
+        cursor.execute(f"""
+            CREATE INDEX IF NOT EXISTS idx_{table}_rating_overall ON {table}(rating_overall)
+        """)
+
+    # Covering index for per-model rating stats
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_event_model_rating
+        ON evaluation_versions(model_provider, model_name, rating_overall)
+    """)
+
+def _migrate_summary_tables(cursor):
+    # Per-event / per-chain listing rows for the home page, kept up to date by every
+    # save, rating update and delete (in the same transaction)
+    summaries_missing = not _table_exists(cursor, "event_summary")
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS event_summary (
+            event_id TEXT PRIMARY KEY,
+            version_count INTEGER NOT NULL,
+            last_updated TIMESTAMP,
+            max_rating INTEGER
+        )
+    """)
+
+    # Keyset pagination indexes: one per sort order, with the ID as tie-breaker
+    cursor.execute("DROP INDEX IF EXISTS idx_event_summary_last_updated")
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_event_summary_updated ON event_summary(last_updated DESC, event_id DESC)
+    """)
+
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_event_summary_rating ON event_summary(COALESCE(max_rating, 0) DESC, event_id DESC)
+    """)
+
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_event_summary_versions ON event_summary(version_count DESC, event_id DESC)
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS chain_summary (
+            trace_id TEXT PRIMARY KEY,
+            chain_name TEXT,
+            version_count INTEGER NOT NULL,
+            last_updated TIMESTAMP,
+            max_rating INTEGER
+        )
+    """)
+
+    cursor.execute("DROP INDEX IF EXISTS idx_chain_summary_last_updated")
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_chain_summary_updated ON chain_summary(last_updated DESC, trace_id DESC)
+    """)
+
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_chain_summary_rating ON chain_summary(COALESCE(max_rating, 0) DESC, trace_id DESC)
+    """)
+
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_chain_summary_versions ON chain_summary(version_count DESC, trace_id DESC)
+    """)
+
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_chain_summary_name ON chain_summary(chain_name, last_updated DESC, trace_id DESC)
+    """)
+
+    # Filled per event/trace in the background; listings aggregate the version tables until then
+    if summaries_missing:
+        _schedule_backfill(
+            cursor, "summaries",
+            "SELECT (SELECT COUNT(DISTINCT event_id) FROM evaluation_versions)"
+            " + (SELECT COUNT(DISTINCT trace_id) FROM chain_versions)",
+            {"phase": "events", "last_key": ""}
+        )
+
+def _migrate_version_metrics(cursor):
+    # Metrics copied out of metadata so version summaries never decode the payload columns
+    if "tokens_input" not in _columns(cursor, "evaluation_versions"):
+        for column, column_type in VERSION_METRIC_COLUMNS:
+            cursor.execute(f"ALTER TABLE evaluation_versions ADD COLUMN {column} {column_type}")
+        _schedule_backfill(cursor, "version_metrics",
+                           "SELECT COUNT(*) FROM evaluation_versions WHERE metadata IS NOT NULL",
+                           {"last_id": 0, "max_id": _max_id(cursor, "evaluation_versions")})
+
+def _migrate_search_index(cursor):
+    # Full-text index over prompts and responses. Source columns may be compressed, so
+    # it is filled by the write path rather than triggers. rowid is evaluation_versions.id
+    # for event versions and -chain_steps.id for chain steps.
+    if _table_exists(cursor, "search_index"):
+        return
+    cursor.execute("""
+        CREATE VIRTUAL TABLE search_index USING fts5(
+            prompt,
+            response,
+            kind UNINDEXED,
+            tokenize = 'unicode61 remove_diacritics 2'
+        )
+    """)
+    # Rows written from now on are indexed by the write path; the backfill covers the rest
+    _schedule_backfill(
+        cursor, "search_index",
+        "SELECT (SELECT COUNT(*) FROM evaluation_versions) + (SELECT COUNT(*) FROM chain_steps)",
+        {"phase": "events", "last_id": 0,
+         "max_event_id": _max_id(cursor, "evaluation_versions"), "max_step_id": _max_id(cursor, "chain_steps")}
+    )
+
+def _migrate_archive_index(cursor):
+    # Where each archived version lives (see archive_old_versions), with the columns
+    # hot-side listings and stats need so they never open the archive files
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS archive_index (
+            version_id TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            key TEXT NOT NULL,
+            month TEXT NOT NULL,
+            created_at TIMESTAMP,
+            rating_overall REAL,
+            model_provider TEXT,
+            model_name TEXT,
+            chain_name TEXT
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_archive_index_key ON archive_index(kind, key)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_archive_index_month ON archive_index(month)")
+
+# Per-chain aggregates stored with each version (see _chain_aggregates)
+CHAIN_AGGREGATE_COLUMNS = {"total_latency": "REAL", "providers": "TEXT", "models": "TEXT"}
+
+def _migrate_chain_aggregates(cursor):
+    # Total latency and the providers/models of a chain, computed once at save time so
+    # loading a trace never walks its steps. step_count doubles as the event count.
+    for column, column_type in CHAIN_AGGREGATE_COLUMNS.items():
+        if column not in _columns(cursor, "chain_versions"):
+            cursor.execute(f"ALTER TABLE chain_versions ADD COLUMN {column} {column_type}")
+    # Archive files keep the hot schema; their rows are computed on read
+    store = _archive_store()
+    for month in store.months():
+        with store.writer(month, {}) as archive:
+            archive_cursor = archive.cursor()
+            if _table_exists(archive_cursor, "chain_versions"):
+                for column, column_type in CHAIN_AGGREGATE_COLUMNS.items():
+                    if column not in _columns(archive_cursor, "chain_versions"):
+                        archive_cursor.execute(f"ALTER TABLE chain_versions ADD COLUMN {column} {column_type}")
+    _schedule_backfill(cursor, "chain_aggregates",
+                       "SELECT COUNT(*) FROM chain_versions WHERE total_latency IS NULL",
+                       {"last_id": 0, "max_id": _max_id(cursor, "chain_versions")})
+
+def _migrate_step_rating_summary(cursor):
+    # Best step rating and rated step count per chain, so the chain listing shows (and
+    # sorts by) step ratings without reading chain_steps. archive_index keeps the same
+    # per archived version, since the steps themselves move to the archive files.
+    if "rating_overall" not in _columns(cursor, "chain_steps"):
+        cursor.execute(f"ALTER TABLE chain_steps ADD COLUMN rating_overall REAL {RATING_OVERALL_SQL}")
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_chain_steps_trace_rating ON chain_steps(trace_id, rating_overall)
+    """)
+    for table in ("chain_summary", "archive_index"):
+        for column in ("max_step_rating", "rated_steps"):
+            if column not in _columns(cursor, table):
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} INTEGER")
+    cursor.execute(f"""
+        CREATE INDEX IF NOT EXISTS idx_chain_summary_best_rating ON chain_summary({CHAIN_RATING_SQL} DESC, trace_id DESC)
+    """)
+    _schedule_backfill(
+        cursor, "chain_step_ratings",
+        "SELECT (SELECT COUNT(*) FROM archive_index WHERE kind = 'chain') + (SELECT COUNT(*) FROM chain_summary)",
+        {"phase": "archive", "last_key": ""}
+    )
+
+SCHEMA_MIGRATIONS = [
+    (1, "chain_versions.step_count", _migrate_chain_step_count),
+    (2, "rating_overall generated columns", _migrate_rating_overall),
+    (3, "event/chain summary tables", _migrate_summary_tables),
+    (4, "evaluation_versions metric columns", _migrate_version_metrics),
+    (5, "full-text search index", _migrate_search_index),
+    (6, "archive index", _migrate_archive_index),
+    (7, "chain_versions aggregate columns", _migrate_chain_aggregates),
+    (8, "chain step rating summary", _migrate_step_rating_summary),
+]
+
+def _backfill_chain_steps(cursor, state: Dict[str, Any], batch_size: int) -> tuple:
+    """Move legacy chain_events JSON into chain_steps"""
+    cursor.execute("""
+        SELECT id, version_id FROM chain_versions
+        WHERE id > ? AND step_count IS NULL
+        ORDER BY id LIMIT ?
+    """, (state.get("last_id", 0), batch_size))
+    rows = cursor.fetchall()
+    trace_ids = set()
+    for _, version_id in rows:
+        if _normalize_chain_version(cursor, version_id):
+            cursor.execute("SELECT trace_id FROM chain_versions WHERE version_id = ?", (version_id,))
+            trace_ids.add(cursor.fetchone()[0])
+    # Their step ratings only count once the steps are in chain_steps
+    _refresh_chain_step_ratings(cursor, sorted(trace_ids))
+    if rows:
+        state["last_id"] = rows[-1][0]
+    return state, len(rows), len(rows) < batch_size
+
+def _backfill_legacy_ratings(cursor, state: Dict[str, Any], batch_size: int, table: str) -> tuple:
+    """Rewrite legacy integer ratings into the {"overall": n} JSON format"""
+    cursor.execute(f"""
+        SELECT id FROM {table} WHERE id > ? AND id <= ? ORDER BY id LIMIT ?
+    """, (state["last_id"], state["max_id"], batch_size))
+    ids = [row[0] for row in cursor.fetchall()]
+    if ids:
+        cursor.execute(f"""
+            UPDATE {table}
+            SET rating = json_object('overall', CAST(rating AS INTEGER))
+            WHERE id BETWEEN ? AND ?
+              AND rating IS NOT NULL
+              AND (typeof(rating) IN ('integer', 'real')
+                   OR (json_valid(rating) AND json_type(rating) IN ('integer', 'real')))
+        """, (ids[0], ids[-1]))
+        state["last_id"] = ids[-1]
+    return state, len(ids), len(ids) < batch_size
+
+def _backfill_version_metrics(cursor, state: Dict[str, Any], batch_size: int) -> tuple:
+    """Copy token/cost/latency metrics out of existing metadata"""
+    cursor.execute("""
+        SELECT id, metadata FROM evaluation_versions
+        WHERE id > ? AND id <= ? AND metadata IS NOT NULL
+        ORDER BY id LIMIT ?
+    """, (state["last_id"], state["max_id"], batch_size))
+    rows = cursor.fetchall()
+    cursor.executemany("""
+        UPDATE evaluation_versions
+        SET tokens_input = ?, tokens_output = ?, cost = ?, latency = ?
+        WHERE id = ?
+    """, [(*_version_metrics(_decode_json(row[1], {})), row[0]) for row in rows])
+    if rows:
+        state["last_id"] = rows[-1][0]
+    return state, len(rows), len(rows) < batch_size
+
+def _backfill_search_index(cursor, state: Dict[str, Any], batch_size: int) -> tuple:
+    """Index the versions and chain steps that existed when search_index was created"""
+    last_id = state["last_id"]
+    if state["phase"] == "events":
+        cursor.execute("""
+            SELECT id, user_prompt, assistant_response FROM evaluation_versions
+            WHERE id > ? AND id <= ? ORDER BY id LIMIT ?
+        """, (last_id, state["max_event_id"], batch_size))
+        rows = [(row[0], _decode_text(row[1]) or "", _flatten_text(_decode_json(row[2])))
+                for row in cursor.fetchall()]
+        kind = "event"
+    else:
+        cursor.execute("""
+            SELECT id, event FROM chain_steps
+            WHERE id > ? AND id <= ? ORDER BY id LIMIT ?
+        """, (last_id, state["max_step_id"], batch_size))
+        rows = []
+        for step_id, event in cursor.fetchall():
+            event = _decode_json(event, {})
+            rows.append((-step_id, _flatten_text(event.get("user_prompt")),
+                         _flatten_text(event.get("assistant_response"))))
+        kind = "chain"
+
+    cursor.executemany(f"""
+        INSERT OR REPLACE INTO search_index (rowid, prompt, response, kind) VALUES (?, ?, ?, '{kind}')
+    """, rows)
+    if rows:
+        state["last_id"] = abs(rows[-1][0])
+    if len(rows) < batch_size:
+        if state["phase"] == "events":
+            state.update({"phase": "steps", "last_id": 0})
+            return state, len(rows), False
+        cursor.execute("INSERT INTO search_index (search_index) VALUES ('optimize')")
+        return state, len(rows), True
+    return state, len(rows), False
+
+def _backfill_chain_aggregates(cursor, state: Dict[str, Any], batch_size: int) -> tuple:
+    """Compute total_latency/providers/models from the chain_steps columns (legacy rows get them when normalized)"""
+    cursor.execute("""
+        SELECT id, version_id FROM chain_versions
+        WHERE id > ? AND id <= ? AND total_latency IS NULL AND step_count IS NOT NULL
+        ORDER BY id LIMIT ?
+    """, (state["last_id"], state["max_id"], batch_size))
+    rows = cursor.fetchall()
+    if rows:
+        version_ids = [row[1] for row in rows]
+        placeholders = ",".join("?" for _ in version_ids)
+        cursor.execute(f"""
+            SELECT version_id, model, latency FROM chain_steps
+            WHERE version_id IN ({placeholders})
+            ORDER BY version_id, step_index
+        """, version_ids)
+        steps = {version_id: [] for version_id in version_ids}
+        for version_id, model, latency in cursor.fetchall():
+            steps[version_id].append({"model": model, "metrics": {"latency": latency}})
+        cursor.executemany("""
+            UPDATE chain_versions SET total_latency = ?, providers = ?, models = ? WHERE id = ?
+        """, [(*_chain_aggregates(steps[version_id]), row_id) for row_id, version_id in rows])
+        state["last_id"] = rows[-1][0]
+    return state, len(rows), len(rows) < batch_size
+
+def _backfill_summaries(cursor, state: Dict[str, Any], batch_size: int) -> tuple:
+    """Summary rows for the events, then the traces, that existed when the tables were created"""
+    if state["phase"] == "events":
+        table, key_column, refresh = "evaluation_versions", "event_id", _refresh_event_summary
+    else:
+        table, key_column, refresh = "chain_versions", "trace_id", _refresh_chain_summary
+    cursor.execute(f"""
+        SELECT DISTINCT {key_column} FROM {table}
+        WHERE {key_column} > ? ORDER BY {key_column} LIMIT ?
+    """, (state["last_key"], batch_size))
+    keys = [row[0] for row in cursor.fetchall()]
+    for key in keys:
+        refresh(cursor, key)
+    if keys:
+        state["last_key"] = keys[-1]
+    if len(keys) < batch_size:
+        if state["phase"] == "events":
+            state.update({"phase": "chains", "last_key": ""})
+            return state, len(keys), False
+        return state, len(keys), True
+    return state, len(keys), False
+
+def _backfill_chain_step_ratings(cursor, state: Dict[str, Any], batch_size: int) -> tuple:
+    """Step rating aggregates for archived chain versions, then for every chain_summary row"""
+    if state["phase"] == "archive":
+        cursor.execute("""
+            SELECT version_id, month FROM archive_index
+            WHERE kind = 'chain' AND version_id > ? ORDER BY version_id LIMIT ?
+        """, (state["last_key"], batch_size))
+        rows = cursor.fetchall()
+        by_month = {}
+        for version_id, month in rows:
+            by_month.setdefault(month, []).append(version_id)
+        updates = []
+        for month, version_ids in by_month.items():
+            placeholders = ",".join("?" for _ in version_ids)
+            # Archive files created before migration 8 have no rating_overall on chain_steps
+            with _archive_store().reader(month) as archive:
+                found = {row[0]: (row[1], row[2]) for row in archive.execute(f"""
+                    SELECT version_id, CAST(MAX(NULLIF(overall, 0)) AS INTEGER), COUNT(NULLIF(overall, 0))
+                    FROM (SELECT version_id, {RATING_OVERALL_EXPR} AS overall FROM chain_steps
+                          WHERE version_id IN ({placeholders}))
+                    GROUP BY version_id
+                """, version_ids).fetchall()}
+            updates += [(*found.get(version_id, (None, 0)), version_id) for version_id in version_ids]
+        cursor.executemany("UPDATE archive_index SET max_step_rating = ?, rated_steps = ? WHERE version_id = ?",
+                           updates)
+        if rows:
+            state["last_key"] = rows[-1][0]
+        if len(rows) < batch_size:
+            state.update({"phase": "chains", "last_key": ""})
+        return state, len(rows), False
+    
+    cursor.execute("SELECT trace_id FROM chain_summary WHERE trace_id > ? ORDER BY trace_id LIMIT ?",
+                   (state["last_key"], batch_size))
+    trace_ids = [row[0] for row in cursor.fetchall()]
+    _refresh_chain_step_ratings(cursor, trace_ids)
+    if trace_ids:
+        state["last_key"] = trace_ids[-1]
+    return state, len(trace_ids), len(trace_ids) < batch_size
+
+BACKFILLS = {
+    "chain_steps": _backfill_chain_steps,
+    "evaluation_versions.legacy_ratings": functools.partial(_backfill_legacy_ratings, table="evaluation_versions"),
+    "chain_versions.legacy_ratings": functools.partial(_backfill_legacy_ratings, table="chain_versions"),
+    "version_metrics": _backfill_version_metrics,
+    "search_index": _backfill_search_index,
+    "chain_aggregates": _backfill_chain_aggregates,
+    "summaries": _backfill_summaries,
+    "chain_step_ratings": _backfill_chain_step_ratings,
+}
+
+def run_backfill_step(batch_size: int = BACKFILL_BATCH_SIZE) -> Optional[Dict[str, Any]]:
+    """
+    Run one batch of the oldest unfinished backfill
+
+    Returns the backfill's progress, or None when nothing is left to do. A batch that
+    fails marks its backfill as failed (retry with retry_failed_backfills); a lock
+    timeout just leaves it for the next call.
+    """
+    with read_connection() as conn:
+        name = migrations.next_backfill(conn.cursor())
+    if name is None:
+        return None
+    batch = BACKFILLS.get(name)
+    try:
+        if batch is None:
+            raise ValueError(f"Unknown backfill: {name}")
+        with write_connection() as conn:
+            progress = migrations.run_backfill_batch(conn.cursor(), name, batch, batch_size)
+        if progress["done"]:
+            print(f"✅ Backfill {name} done ({progress['processed']} rows)")
+        return progress
+    except sqlite3.OperationalError as e:
+        if is_locked_error(e):
+            return {"name": name, "processed": None, "done": False}
+        error = e
+    except Exception as e:
+        error = e
+    print(f"Error in backfill {name}: {error}")
+    with write_connection() as conn:
+        migrations.mark_backfill_failed(conn.cursor(), name, str(error))
+    return {"name": name, "processed": None, "done": False, "error": str(error)}
+
+def run_backfills(batch_size: int = BACKFILL_BATCH_SIZE, retry_failed: bool = False) -> int:
+    """Run every pending backfill to completion in the foreground; returns the number of batches"""
+    if retry_failed:
+        with write_connection() as conn:
+            migrations.retry_failed_backfills(conn.cursor())
+    batches = 0
+    while True:
+        progress = run_backfill_step(batch_size)
+        if progress is None:
+            return batches
+        batches += 1
+        if progress["processed"] is not None and batches % 50 == 0:
+            print(f"Backfill {progress['name']}: {progress['processed']} rows...")
+
+def get_migration_status() -> Dict[str, Any]:
+    """Schema version, applied migrations and backfill progress"""
+    try:
+        with read_connection() as conn:
+            return migrations.get_status(conn.cursor())
+    except Exception as e:
+        print(f"Error getting migration status: {e}")
+        return {"schema_version": None, "migrations": [], "backfills": []}
+
+# ============= Summary tables =============
+
+# Highest non-zero overall rating as an integer (0 counts as unrated)
+MAX_RATING_SQL = "CAST(MAX(NULLIF(rating_overall, 0)) AS INTEGER)"
+
+# A chain's best rating: the chain-level rating or its best rated step (0 = unrated)
+CHAIN_RATING_SQL = "MAX(COALESCE(max_rating, 0), COALESCE(max_step_rating, 0))"
+
+# The aggregates the summary tables hold, computed from the versions (hot and archived)
+SUMMARY_SOURCES = {
+    "event_summary": f"""
+        SELECT event_id, COUNT(*) AS version_count, MAX(created_at) AS last_updated,
+               {MAX_RATING_SQL} AS max_rating
+        FROM (SELECT event_id, created_at, rating_overall FROM evaluation_versions
+              UNION ALL
+              SELECT key, created_at, rating_overall FROM archive_index WHERE kind = 'event')
+        GROUP BY event_id
+    """,
+    "chain_summary": f"""
+        SELECT trace_id,
+               COALESCE((SELECT chain_name FROM chain_versions latest
+                         WHERE latest.trace_id = versions.trace_id
+                         ORDER BY created_at DESC, id DESC LIMIT 1),
+                        (SELECT chain_name FROM archive_index a
+                         WHERE a.kind = 'chain' AND a.key = versions.trace_id
+                         ORDER BY created_at DESC LIMIT 1)) AS chain_name,
+               COUNT(*) AS version_count, MAX(created_at) AS last_updated,
+               {MAX_RATING_SQL} AS max_rating,
+               CAST(MAX(step_rating) AS INTEGER) AS max_step_rating,
+               COALESCE(SUM(rated_steps), 0) AS rated_steps
+        FROM (SELECT v.trace_id, v.created_at, v.rating_overall,
+                     (SELECT MAX(NULLIF(s.rating_overall, 0)) FROM chain_steps s
+                      WHERE s.version_id = v.version_id) AS step_rating,
+                     (SELECT COUNT(NULLIF(s.rating_overall, 0)) FROM chain_steps s
+                      WHERE s.version_id = v.version_id) AS rated_steps
+              FROM chain_versions v
+              UNION ALL
+              SELECT key, created_at, rating_overall, max_step_rating, rated_steps
+              FROM archive_index WHERE kind = 'chain') versions
+        GROUP BY trace_id
+    """,
+}
+
+# Set once the summaries backfill is seen finished (it is only scheduled by migration 3)
+_summaries_ready = False
+
+def _summary_source(cursor, table: str) -> str:
+    """The summary table, or while the summaries backfill runs, the aggregate it is built from"""
+    global _summaries_ready
+    if not _summaries_ready:
+        cursor.execute("SELECT status FROM backfills WHERE name = 'summaries'")
+        row = cursor.fetchone()
+        _summaries_ready = row is None or row[0] == "done"
+        if not _summaries_ready:
+            return f"({SUMMARY_SOURCES[table]}) AS {table}"
+    return table
+
+def _refresh_event_summary(cursor, event_id: str):
+    """Recompute one event's summary row from its versions (runs inside the caller's write)"""
+    cursor.execute(f"""
+        SELECT COUNT(*), MAX(created_at), {MAX_RATING_SQL}
+        FROM evaluation_versions WHERE event_id = ?
+    """, (event_id,))
+    version_count, last_updated, max_rating = cursor.fetchone()
+    if not version_count:
+        cursor.execute("DELETE FROM event_summary WHERE event_id = ?", (event_id,))
+        return
+    
+    cursor.execute("""
+        INSERT INTO event_summary (event_id, version_count, last_updated, max_rating)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(event_id) DO UPDATE SET
+            version_count = excluded.version_count,
+            last_updated = excluded.last_updated,
+            max_rating = excluded.max_rating
+    """, (event_id, version_count, last_updated, max_rating))
+
+def _refresh_chain_summary(cursor, trace_id: str):
+    """Recompute one chain's summary row from its versions (runs inside the caller's write)"""
+    cursor.execute(f"""
+        SELECT COUNT(*), MAX(created_at), {MAX_RATING_SQL}
+        FROM chain_versions WHERE trace_id = ?
+    """, (trace_id,))
+    version_count, last_updated, max_rating = cursor.fetchone()
+    if not version_count:
+        cursor.execute("DELETE FROM chain_summary WHERE trace_id = ?", (trace_id,))
+        return
+    
+    cursor.execute("""
+        SELECT chain_name FROM chain_versions WHERE trace_id = ?
+        ORDER BY created_at DESC, id DESC LIMIT 1
+    """, (trace_id,))
+    chain_name = cursor.fetchone()[0]
+    cursor.execute("""
+        INSERT INTO chain_summary (trace_id, chain_name, version_count, last_updated, max_rating)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(trace_id) DO UPDATE SET
+            chain_name = excluded.chain_name,
+            version_count = excluded.version_count,
+            last_updated = excluded.last_updated,
+            max_rating = excluded.max_rating
+    """, (trace_id, chain_name, version_count, last_updated, max_rating))
+    _refresh_chain_step_ratings(cursor, [trace_id])
+
+def _refresh_chain_step_ratings(cursor, trace_ids: List[str]):
+    """Recompute the step rating columns of chain_summary rows (hot steps plus archived versions)"""
+    if not trace_ids:
+        return
+    placeholders = ",".join("?" for _ in trace_ids)
+    cursor.execute(f"""
+        UPDATE chain_summary SET
+            max_step_rating = (
+                SELECT CAST(MAX(step_rating) AS INTEGER) FROM (
+                    SELECT NULLIF(rating_overall, 0) AS step_rating FROM chain_steps s
+                    WHERE s.trace_id = chain_summary.trace_id
+                    UNION ALL
+                    SELECT max_step_rating FROM archive_index a
+                    WHERE a.kind = 'chain' AND a.key = chain_summary.trace_id
+                )
+            ),
+            rated_steps = (
+                SELECT COUNT(NULLIF(rating_overall, 0)) FROM chain_steps s
+                WHERE s.trace_id = chain_summary.trace_id
+            ) + (
+                SELECT COALESCE(SUM(rated_steps), 0) FROM archive_index a
+                WHERE a.kind = 'chain' AND a.key = chain_summary.trace_id
+            )
+        WHERE trace_id IN ({placeholders})
+    """, trace_ids)
+
+def _rebuild_summaries(cursor):
+    """Recompute every summary row (first start after upgrading, or manage.py rebuild-summaries)"""
+    cursor.execute("DELETE FROM event_summary")
+    cursor.execute("DELETE FROM chain_summary")
+    cursor.execute(f"""
+        INSERT INTO event_summary (event_id, version_count, last_updated, max_rating)
+        SELECT event_id, version_count, last_updated, max_rating
+        FROM ({SUMMARY_SOURCES["event_summary"]})
+    """)
+    cursor.execute(f"""
+        INSERT INTO chain_summary
+        (trace_id, chain_name, version_count, last_updated, max_rating, max_step_rating, rated_steps)
+        SELECT trace_id, chain_name, version_count, last_updated, max_rating, max_step_rating, rated_steps
+        FROM ({SUMMARY_SOURCES["chain_summary"]})
+    """)
+
+def rebuild_summaries() -> bool:
+    """Rebuild event_summary and chain_summary from the version tables"""
+    try:
+        with write_connection() as conn:
+            _rebuild_summaries(conn.cursor())
+        print("✅ Rebuilt event and chain summaries")
+        return True
+    except Exception as e:
+        print(f"Error rebuilding summaries: {e}")
+        return False
+
+# ============= Listing (keyset pagination) =============
+
+# Default and maximum page size for /api/events and /api/chains
+LIST_PAGE_SIZE = 50
+LIST_MAX_PAGE_SIZE = 500
+
+# Sort keys for the listings; each has a matching (expression, id) index on the summary tables
+LIST_SORTS = {
+    "last_updated": "last_updated",
+    "max_rating": "COALESCE(max_rating, 0)",
+    "version_count": "version_count",
+}
+
+# The chain listing ranks by the best of the chain and step ratings
+CHAIN_LIST_SORTS = {**LIST_SORTS, "max_rating": CHAIN_RATING_SQL}
+
+# Chain steps only record the model, so provider filters match on the model name
+# (same rules as the provider detection when a chain is loaded)
+PROVIDER_MODEL_PATTERNS = {
+    "openai": "%gpt%",
+    "anthropic": "%claude%",
+    "gemini": "%gemini%",
+}
+
+def encode_page_cursor(sort_value: Any, key: Any) -> str:
+    """Opaque cursor for the row after which the next page starts"""
+    return base64.urlsafe_b64encode(serializer.dumps_bytes([sort_value, key])).decode("ascii")
+
+def decode_page_cursor(cursor: str) -> tuple:
+    """Decode a page cursor; raises ValueError if it is malformed"""
+    try:
+        sort_value, key = serializer.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return sort_value, key
+    except (binascii.Error, UnicodeError, ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+def _normalize_timestamp(value: str, end_of_day: bool = False) -> str:
+    """Make an ISO date/datetime comparable with SQLite's CURRENT_TIMESTAMP format"""
+    value = value.replace("T", " ").rstrip("Z")
+    if end_of_day and len(value) == 10:
+        # A bare date as upper bound includes the whole day
+        value += " 23:59:59"
+    return value
+
+def _list_page(
+    table: str,
+    key_column: str,
+    columns: List[str],
+    conditions: List[str],
+    params: List[Any],
+    sort: str,
+    order: str,
+    after: Optional[str],
+    limit: int,
+    sorts: Dict[str, str] = LIST_SORTS
+) -> tuple:
+    """
+    Read one page of a summary table ordered by (sort key, id)
+
+    Returns (rows, next_cursor). The cursor is a keyset position, so every page is an
+    index range scan no matter how deep into the listing it is.
+    """
+    sort_expr = sorts[sort]
+    descending = order == "desc"
+    conditions = list(conditions)
+    params = list(params)
+    if after:
+        sort_value, key = decode_page_cursor(after)
+        conditions.append(f"({sort_expr}, {key_column}) {'<' if descending else '>'} (?, ?)")
+        params.extend([sort_value, key])
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    direction = "DESC" if descending else "ASC"
+
+    with read_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT {", ".join(columns)}, {sort_expr} AS sort_value
+            FROM {_summary_source(cursor, table)}
+            {where}
+            ORDER BY {sort_expr} {direction}, {key_column} {direction}
+            LIMIT ?
+        """, (*params, limit + 1))
+        rows = cursor.fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_page_cursor(rows[-1]["sort_value"], rows[-1][key_column])
+    return rows, next_cursor
+
+def list_events(
+    limit: int = LIST_PAGE_SIZE,
+    after: Optional[str] = None,
+    sort: str = "last_updated",
+    order: str = "desc",
+    model: Optional[str] = None,
+    provider: Optional[str] = None,
+    min_rating: Optional[int] = None,
+    max_rating: Optional[int] = None,
+    unrated_only: bool = False,
+    since: Optional[str] = None,
+    until: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    One page of saved events: {"events": [...], "next_cursor": str or None}
+
+    model / provider match events with at least one version using them. Raises
+    ValueError for an unknown sort/order or a malformed cursor.
+    """
+    if sort not in LIST_SORTS or order not in ("asc", "desc"):
+        raise ValueError(f"Invalid sort: {sort} {order}")
+    if after:
+        decode_page_cursor(after)
+    limit = min(max(limit, 1), LIST_MAX_PAGE_SIZE)
+
+    conditions = []
+    params = []
+    if model:
+        conditions.append("""(EXISTS (SELECT 1 FROM evaluation_versions v
+                                      WHERE v.event_id = event_summary.event_id AND v.model_name = ?)
+                              OR EXISTS (SELECT 1 FROM archive_index a
+                                         WHERE a.kind = 'event' AND a.key = event_summary.event_id
+                                           AND a.model_name = ?))""")
+        params.extend([model, model])
+    if provider:
+        conditions.append("""(EXISTS (SELECT 1 FROM evaluation_versions v
+                                      WHERE v.event_id = event_summary.event_id AND v.model_provider = ?)
+                              OR EXISTS (SELECT 1 FROM archive_index a
+                                         WHERE a.kind = 'event' AND a.key = event_summary.event_id
+                                           AND a.model_provider = ?))""")
+        params.extend([provider, provider])
+    if min_rating is not None:
+        conditions.append("max_rating >= ?")
+        params.append(min_rating)
+    if max_rating is not None:
+        conditions.append("max_rating <= ?")
+        params.append(max_rating)
+    if unrated_only:
+        conditions.append("max_rating IS NULL")
+    if since:
+        conditions.append("last_updated >= ?")
+        params.append(_normalize_timestamp(since))
+    if until:
+        conditions.append("last_updated <= ?")
+        params.append(_normalize_timestamp(until, end_of_day=True))
+
+    try:
+        rows, next_cursor = _list_page(
+            "event_summary", "event_id", ["event_id", "last_updated", "version_count", "max_rating"],
+            conditions, params, sort, order, after, limit
+        )
+        events = [{
+            "event_id": row["event_id"],
+            "last_updated": row["last_updated"],
+            "version_count": row["version_count"],
+            "max_rating": row["max_rating"]
+        } for row in rows]
+        return {"events": events, "next_cursor": next_cursor}
+    except Exception as e:
+        print(f"Error listing events: {e}")
+        return {"events": [], "next_cursor": None}
+
+# Steps in a listed chain's latest version (NULL for legacy chain_events rows until backfilled)
+CHAIN_STEP_COUNT_SQL = """(SELECT step_count FROM chain_versions latest
+                           WHERE latest.trace_id = chain_summary.trace_id
+                           ORDER BY created_at DESC, id DESC LIMIT 1) AS step_count"""
+
+def list_chains(
+    limit: int = LIST_PAGE_SIZE,
+    after: Optional[str] = None,
+    sort: str = "last_updated",
+    order: str = "desc",
+    chain_name: Optional[str] = None,
+    model: Optional[str] = None,
+    provider: Optional[str] = None,
+    min_rating: Optional[int] = None,
+    max_rating: Optional[int] = None,
+    unrated_only: bool = False,
+    since: Optional[str] = None,
+    until: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    One page of saved chains: {"chains": [...], "next_cursor": str or None}
+
+    model / provider match chains with at least one step using them (chains still in
+    the legacy chain_events format need manage.py migrate-chain-steps to match, and
+    archived chains only match again once restored).
+    Raises ValueError for an unknown sort/order/provider or a malformed cursor.
+    """
+    if sort not in LIST_SORTS or order not in ("asc", "desc"):
+        raise ValueError(f"Invalid sort: {sort} {order}")
+    if provider and provider not in PROVIDER_MODEL_PATTERNS:
+        raise ValueError(f"Invalid provider: {provider}")
+    if after:
+        decode_page_cursor(after)
+    limit = min(max(limit, 1), LIST_MAX_PAGE_SIZE)
+
+    conditions = []
+    params = []
+    if chain_name:
+        conditions.append("chain_name = ?")
+        params.append(chain_name)
+    if model:
+        conditions.append("""EXISTS (SELECT 1 FROM chain_steps s
+                                     WHERE s.trace_id = chain_summary.trace_id AND s.model = ?)""")
+        params.append(model)
+    if provider:
+        conditions.append("""EXISTS (SELECT 1 FROM chain_steps s
+                                     WHERE s.trace_id = chain_summary.trace_id AND s.model LIKE ?)""")
+        params.append(PROVIDER_MODEL_PATTERNS[provider])
+    # Chain and step ratings both count
+    if min_rating is not None:
+        conditions.append(f"{CHAIN_RATING_SQL} >= ?")
+        params.append(min_rating)
+    if max_rating is not None:
+        conditions.append(f"NULLIF({CHAIN_RATING_SQL}, 0) <= ?")
+        params.append(max_rating)
+    if unrated_only:
+        conditions.append(f"{CHAIN_RATING_SQL} = 0")
+    if since:
+        conditions.append("last_updated >= ?")
+        params.append(_normalize_timestamp(since))
+    if until:
+        conditions.append("last_updated <= ?")
+        params.append(_normalize_timestamp(until, end_of_day=True))
+
+    try:
+        rows, next_cursor = _list_page(
+            "chain_summary", "trace_id",
+            ["trace_id", "chain_name", "version_count", "max_rating", "max_step_rating", "rated_steps",
+             "last_updated", CHAIN_STEP_COUNT_SQL],
+            conditions, params, sort, order, after, limit, CHAIN_LIST_SORTS
+        )
+        chains = [{
+            "trace_id": row["trace_id"],
+            "chain_name": row["chain_name"],
+            "step_count": row["step_count"],
+            "version_count": row["version_count"],
+            "max_rating": row["max_rating"],
+            "max_step_rating": row["max_step_rating"],
+            "rated_steps": row["rated_steps"] or 0,
+            "last_updated": row["last_updated"]
+        } for row in rows]
+        return {"chains": chains, "next_cursor": next_cursor}
+    except Exception as e:
+        print(f"Error listing chains: {e}")
+        return {"chains": [], "next_cursor": None}
+
+# ============= Full-text search =============
+
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 100
+
+SEARCH_KINDS = ("event", "chain")
+SEARCH_FIELDS = ("prompt", "response")
+
+# Snippet highlight markers (plain text, safe to render unescaped)
+SEARCH_HIGHLIGHT = ("**", "**")
+SEARCH_SNIPPET_TOKENS = 16
+
+def _flatten_text(value: Any) -> str:
+    """All string (and scalar) values of a response, one per line, for indexing"""
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, dict):
+        value = list(value.values())
+    if isinstance(value, list):
+        return "\n".join(text for text in (_flatten_text(item) for item in value) if text)
+    return str(value)
+
+def _index_version(cursor, row_id: int, user_prompt: Optional[str], assistant_response: Any):
+    """Add an evaluation version to the search index"""
+    cursor.execute("""
+        INSERT INTO search_index (rowid, prompt, response, kind) VALUES (?, ?, ?, 'event')
+    """, (row_id, user_prompt or "", _flatten_text(assistant_response)))
+
+def _index_chain_steps(cursor, version_id: str, chain_events: List[Dict[str, Any]]):
+    """Add the steps of a chain version (already in chain_steps) to the search index"""
+    cursor.execute("SELECT id, step_index FROM chain_steps WHERE version_id = ?", (version_id,))
+    rows = []
+    for step_id, step_index in cursor.fetchall():
+        event = chain_events[step_index]
+        rows.append((-step_id, _flatten_text(event.get("user_prompt")),
+                     _flatten_text(event.get("assistant_response"))))
+    cursor.executemany("""
+        INSERT INTO search_index (rowid, prompt, response, kind) VALUES (?, ?, ?, 'chain')
+    """, rows)
+
+def _build_search_index(cursor, batch_size: int = 500):
+    """(Re)index every stored version and chain step"""
+    # Legacy chain versions are moved into chain_steps first, so every step has a row ID
+    cursor.execute("SELECT version_id FROM chain_versions WHERE step_count IS NULL")
+    for (version_id,) in cursor.fetchall():
+        _normalize_chain_version(cursor, version_id)
+
+    cursor.execute("DELETE FROM search_index")
+    read = cursor.connection.cursor()
+    indexed = 0
+    read.execute("SELECT id, user_prompt, assistant_response FROM evaluation_versions")
+    while True:
+        rows = read.fetchmany(batch_size)
+        if not rows:
+            break
+        cursor.executemany("""
+            INSERT INTO search_index (rowid, prompt, response, kind) VALUES (?, ?, ?, 'event')
+        """, [(row[0], _decode_text(row[1]) or "", _flatten_text(_decode_json(row[2])))
+              for row in rows])
+        indexed += len(rows)
+    read.execute("SELECT id, event FROM chain_steps")
+    while True:
+        rows = read.fetchmany(batch_size)
+        if not rows:
+            break
+        steps = [(row[0], _decode_json(row[1], {})) for row in rows]
+        cursor.executemany("""
+            INSERT INTO search_index (rowid, prompt, response, kind) VALUES (?, ?, ?, 'chain')
+        """, [(-step_id, _flatten_text(event.get("user_prompt")), _flatten_text(event.get("assistant_response")))
+              for step_id, event in steps])
+        indexed += len(rows)
+    cursor.execute("INSERT INTO search_index (search_index) VALUES ('optimize')")
+    if indexed:
+        print(f"Indexed {indexed} versions and chain steps for search")
+
+def rebuild_search_index() -> bool:
+    """Rebuild the full-text search index from scratch"""
+    try:
+        with write_connection() as conn:
+            _build_search_index(conn.cursor())
+        return True
+    except Exception as e:
+        print(f"Error rebuilding search index: {e}")
+        return False
+
+def _fts_query(query: str, field: Optional[str] = None) -> str:
+    """
+    Turn user input into an FTS5 expression: every word must match (as typed, so FTS5
+    operators are not interpreted); a trailing * on a word makes it a prefix match
+    """
+    terms = []
+    for word in query.split():
+        prefix = word.endswith("*") and len(word) > 1
+        word = word.rstrip("*")
+        if word:
+            terms.append('"' + word.replace('"', '""') + '"' + ("*" if prefix else ""))
+    if not terms:
+        raise ValueError("Search query is empty")
+    expression = " ".join(terms)
+    return f"{field} : ({expression})" if field else expression
+
+def search(
+    query: str,
+    kind: Optional[str] = None,
+    field: Optional[str] = None,
+    limit: int = SEARCH_PAGE_SIZE,
+    after: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Ranked full-text search over event version and chain step prompts/responses
+
+    kind limits results to "event" or "chain", field to "prompt" or "response". Results
+    are ordered by bm25 relevance; after is the next_cursor of the previous page.
+    Raises ValueError for invalid arguments.
+    """
+    if kind is not None and kind not in SEARCH_KINDS:
+        raise ValueError(f"Invalid kind: {kind}")
+    if field is not None and field not in SEARCH_FIELDS:
+        raise ValueError(f"Invalid field: {field}")
+    match = _fts_query(query, field)
+    limit = min(max(limit, 1), SEARCH_MAX_PAGE_SIZE)
+    # A cursor is only valid for the query, kind and field it was issued for
+    scope = [query, kind, field]
+    offset = 0
+    if after:
+        offset, cursor_scope = decode_page_cursor(after)
+        if cursor_scope != scope or not isinstance(offset, int) or offset < 0:
+            raise ValueError(f"Invalid cursor: {after}")
+
+    conditions = ["search_index MATCH ?"]
+    params: List[Any] = [match]
+    if kind:
+        conditions.append("kind = ?")
+        params.append(kind)
+    start, end = SEARCH_HIGHLIGHT
+
+    try:
+        with read_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT rowid, kind, rank AS score,
+                       snippet(search_index, 0, ?, ?, '…', ?) AS prompt_snippet,
+                       snippet(search_index, 1, ?, ?, '…', ?) AS response_snippet
+                FROM search_index
+                WHERE {" AND ".join(conditions)}
+                ORDER BY rank
+                LIMIT ? OFFSET ?
+            """, (start, end, SEARCH_SNIPPET_TOKENS, start, end, SEARCH_SNIPPET_TOKENS,
+                  *params, limit + 1, offset))
+            hits = cursor.fetchall()
+
+            next_cursor = None
+            if len(hits) > limit:
+                hits = hits[:limit]
+                next_cursor = encode_page_cursor(offset + limit, scope)
+
+            # Version details for this page only
+            event_ids = [hit["rowid"] for hit in hits if hit["kind"] == "event"]
+            step_ids = [-hit["rowid"] for hit in hits if hit["kind"] == "chain"]
+            events = {}
+            if event_ids:
+                cursor.execute(f"""
+                    SELECT id, version_id, event_id, model_provider, model_name, rating, created_at
+                    FROM evaluation_versions
+                    WHERE id IN ({",".join("?" for _ in event_ids)})
+                """, event_ids)
+                events = {row["id"]: row for row in cursor.fetchall()}
+            steps = {}
+            if step_ids:
+                cursor.execute(f"""
+                    SELECT s.id, s.version_id, s.trace_id, s.step_index, s.model, s.rating,
+                           c.chain_name, c.created_at
+                    FROM chain_steps s
+                    JOIN chain_versions c ON c.version_id = s.version_id
+                    WHERE s.id IN ({",".join("?" for _ in step_ids)})
+                """, step_ids)
+                steps = {row["id"]: row for row in cursor.fetchall()}
+    except sqlite3.OperationalError as e:
+        print(f"Error searching for {query!r}: {e}")
+        return {"results": [], "next_cursor": None}
+
+    results = []
+    for hit in hits:
+        result = {
+            "kind": hit["kind"],
+            "score": hit["score"],
+            "prompt_snippet": hit["prompt_snippet"],
+            "response_snippet": hit["response_snippet"],
+        }
+        if hit["kind"] == "event":
+            row = events.get(hit["rowid"])
+            if row is None:
+                continue
+            result.update({
+                "version_id": row["version_id"],
+                "event_id": row["event_id"],
+                "model_provider": row["model_provider"],
+                "model_name": row["model_name"],
+                "rating": _parse_rating(row["rating"]),
+                "created_at": row["created_at"]
+            })
+        else:
+            row = steps.get(-hit["rowid"])
+            if row is None:
+                continue
+            result.update({
+                "version_id": row["version_id"],
+                "trace_id": row["trace_id"],
+                "chain_name": row["chain_name"],
+                "step_index": row["step_index"],
+                "model_name": row["model"],
+                "rating": serializer.loads(row["rating"]) if row["rating"] else None,
+                "created_at": row["created_at"]
+            })
+        results.append(result)
+    return {"results": results, "next_cursor": next_cursor}
+
+def _version_exists(cursor, kind: str, version_id: str) -> bool:
+    """Whether a version is stored, hot or archived (unique index lookups only)"""
+    table, _ = ARCHIVE_KINDS[kind]
+    cursor.execute(f"SELECT 1 FROM {table} WHERE version_id = ?", (version_id,))
+    if cursor.fetchone():
+        return True
+    cursor.execute("SELECT 1 FROM archive_index WHERE version_id = ?", (version_id,))
+    return cursor.fetchone() is not None
+
+def version_exists(kind: str, version_id: str) -> bool:
+    """Whether an event ("event") or chain ("chain") version is already stored"""
+    try:
+        with read_connection() as conn:
+            return _version_exists(conn.cursor(), kind, version_id)
+    except Exception as e:
+        print(f"Error checking version {version_id}: {e}")
+        return False
+
+def _insert_version(
+    cursor,
     version_id: str,
     event_id: str,
     model_provider: str,
@@ -184,301 +1467,271 @@ def save_version(
     user_prompt: str,
     image_urls: List[str],
     assistant_response: Dict[str, Any],
-    rating: Optional[Any] = None,  # Can be int (legacy) or dict (new JSON format)
+    rating: Optional[Any] = None,
     metadata: Optional[Dict[str, Any]] = None
 ) -> bool:
-    """Save a new evaluation version with retry logic for locked database"""
-    max_retries = 3
-    retry_delay = 0.1
-    
-    for attempt in range(max_retries):
-        conn = None
-        try:
-            conn = get_connection()
-            cursor = conn.cursor()
-            
-            # Convert rating to JSON if it's a dict, or keep as is if None
-            rating_json = None
-            if rating is not None:
-                if isinstance(rating, dict):
-                    rating_json = json.dumps(rating)
-                elif isinstance(rating, int):
-                    # Legacy: convert int to JSON format
-                    rating_json = json.dumps({"overall": rating})
-                else:
-                    rating_json = json.dumps(rating) if not isinstance(rating, str) else rating
-            
-            cursor.execute("""
-                INSERT INTO evaluation_versions 
-                (version_id, event_id, model_provider, model_name, user_prompt, 
-                 image_urls, assistant_response, rating, metadata)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                version_id,
-                event_id,
-                model_provider,
-                model_name,
-                user_prompt,
-                json.dumps(image_urls) if image_urls else None,
-                json.dumps(assistant_response),
-                rating_json,
-                json.dumps(metadata) if metadata else None
-            ))
-            
-            conn.commit()
-            print(f"Saved version {version_id} for event {event_id}")
-            return True
-        except sqlite3.IntegrityError:
-            if conn:
-                conn.close()
-            print(f"Version {version_id} already exists")
-            return False
-        except sqlite3.OperationalError as e:
-            if conn:
-                conn.close()
-            if "database is locked" in str(e).lower() and attempt < max_retries - 1:
-                print(f"Database locked, retrying ({attempt + 1}/{max_retries})...")
-                time.sleep(retry_delay * (attempt + 1))
-                continue
-            else:
-                print(f"Error saving version: {e}")
-                return False
-        except Exception as e:
-            if conn:
-                conn.close()
-            print(f"Error saving version: {e}")
-            return False
-        finally:
-            if conn:
-                conn.close()
-    
-    return False
-
-def update_rating(version_id: str, rating: Any) -> bool:
-    """Update the rating for a version with retry logic. Rating can be int (legacy) or dict (JSON format)"""
-    max_retries = 3
-    retry_delay = 0.1
+    """Insert one evaluation version inside the caller's write; False if it already exists"""
+    # Checked before anything is serialized or restored from the archive
+    if _version_exists(cursor, "event", version_id):
+        print(f"Version {version_id} already exists")
+        return False
     
-    # Convert rating to JSON format
+    # Convert rating to JSON if it's a dict, or keep as is if None
     rating_json = None
     if rating is not None:
         if isinstance(rating, dict):
-            rating_json = json.dumps(rating)
+            rating_json = serializer.dumps(rating)
         elif isinstance(rating, int):
             # Legacy: convert int to JSON format
-            rating_json = json.dumps({"overall": rating})
+            rating_json = serializer.dumps({"overall": rating})
         else:
-            rating_json = json.dumps(rating) if not isinstance(rating, str) else rating
+            rating_json = serializer.dumps(rating) if not isinstance(rating, str) else rating
     
-    for attempt in range(max_retries):
-        conn = None
-        try:
-            conn = get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                UPDATE evaluation_versions 
-                SET rating = ?
-                WHERE version_id = ?
-            """, (rating_json, version_id))
-            
-            conn.commit()
-            print(f"Updated rating for version {version_id} to {rating}")
-            return True
-        except sqlite3.OperationalError as e:
-            if conn:
-                conn.close()
-            if "database is locked" in str(e).lower() and attempt < max_retries - 1:
-                print(f"Database locked, retrying ({attempt + 1}/{max_retries})...")
-                time.sleep(retry_delay * (attempt + 1))
-                continue
-            else:
-                print(f"Error updating rating: {e}")
-                return False
-        except Exception as e:
-            if conn:
-                conn.close()
-            print(f"Error updating rating: {e}")
-            return False
-        finally:
-            if conn:
-                conn.close()
+    # New versions of an archived event bring the rest of it back
+    _restore_archived(cursor, "event", event_id)
     
-    return False
+    # Store each distinct image once; the version keeps references only
+    image_urls = store_image_urls(cursor, image_urls)
+    
+    cursor.execute("""
+        INSERT INTO evaluation_versions 
+        (version_id, event_id, model_provider, model_name, user_prompt, 
+         image_urls, assistant_response, rating, metadata,
+         tokens_input, tokens_output, cost, latency)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, (
+        version_id,
+        event_id,
+        model_provider,
+        model_name,
+        compression.encode_text(user_prompt),
+        serializer.dumps(image_urls) if image_urls else None,
+        _encode_json(assistant_response),
+        rating_json,
+        _encode_json(metadata) if metadata else None,
+        *_version_metrics(metadata)
+    ))
+    _index_version(cursor, cursor.lastrowid, user_prompt, assistant_response)
+    _refresh_event_summary(cursor, event_id)
+    print(f"Saved version {version_id} for event {event_id}")
+    return True
 
-def event_exists_in_db(event_id: str) -> bool:
-    """Check if an event exists in the database"""
-    conn = None
-    try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT COUNT(*) FROM evaluation_versions 
-            WHERE event_id = ?
-        """, (event_id,))
+@retry_on_lock
+def save_version(
+    version_id: str,
+    event_id: str,
+    model_provider: str,
+    model_name: str,
+    user_prompt: str,
+    image_urls: List[str],
+    assistant_response: Dict[str, Any],
+    rating: Optional[Any] = None,  # Can be int (legacy) or dict (new JSON format)
+    metadata: Optional[Dict[str, Any]] = None
+) -> bool:
+    """Save a new evaluation version"""
+    try:
+        with write_connection() as conn:
+            return _insert_version(conn.cursor(), version_id, event_id, model_provider, model_name,
+                                   user_prompt, image_urls, assistant_response, rating, metadata)
+    except sqlite3.IntegrityError:
+        print(f"Version {version_id} already exists")
+        return False
+    except sqlite3.OperationalError as e:
+        if is_locked_error(e):
+            raise
+        print(f"Error saving version: {e}")
+        return False
+    except Exception as e:
+        print(f"Error saving version: {e}")
+        return False
+
+@retry_on_lock
+def update_rating(version_id: str, rating: Any) -> bool:
+    """Update the rating for a version. Rating can be int (legacy) or dict (JSON format)"""
+    # Convert rating to JSON format
+    rating_json = None
+    if rating is not None:
+        if isinstance(rating, dict):
+            rating_json = serializer.dumps(rating)
+        elif isinstance(rating, int):
+            # Legacy: convert int to JSON format
+            rating_json = serializer.dumps({"overall": rating})
+        else:
+            rating_json = serializer.dumps(rating) if not isinstance(rating, str) else rating
+    
+    try:
+        with write_connection() as conn:
+            cursor = conn.cursor()
+            _restore_archived_version(cursor, "event", version_id)
+            
+            cursor.execute("""
+                UPDATE evaluation_versions 
+                SET rating = ?
+                WHERE version_id = ?
+            """, (rating_json, version_id))
+            
+            cursor.execute("SELECT event_id FROM evaluation_versions WHERE version_id = ?", (version_id,))
+            row = cursor.fetchone()
+            if row:
+                _refresh_event_summary(cursor, row[0])
         
-        count = cursor.fetchone()[0]
-        return count > 0
+        print(f"Updated rating for version {version_id} to {rating}")
+        return True
+    except sqlite3.OperationalError as e:
+        if is_locked_error(e):
+            raise
+        print(f"Error updating rating: {e}")
+        return False
+    except Exception as e:
+        print(f"Error updating rating: {e}")
+        return False
+
+def event_exists_in_db(event_id: str) -> bool:
+    """Check if an event exists in the database (hot or archived)"""
+    try:
+        with read_connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute("""
+                SELECT EXISTS (SELECT 1 FROM evaluation_versions WHERE event_id = ?)
+                    OR EXISTS (SELECT 1 FROM archive_index WHERE kind = 'event' AND key = ?)
+            """, (event_id, event_id))
+            
+            return bool(cursor.fetchone()[0])
     except Exception as e:
         print(f"Error checking if event exists: {e}")
         return False
-    finally:
-        if conn:
-            conn.close()
+
+@retry_on_lock
+def save_versions(versions: List[Dict[str, Any]]) -> int:
+    """Save several evaluation versions (save_version arguments) in one transaction; returns how many were new"""
+    try:
+        with write_connection() as conn:
+            cursor = conn.cursor()
+            return sum(1 for version in versions if _insert_version(cursor, **version))
+    except sqlite3.OperationalError as e:
+        if is_locked_error(e):
+            raise
+        print(f"Error saving versions: {e}")
+        return 0
+    except Exception as e:
+        print(f"Error saving versions: {e}")
+        return 0
 
 def get_initial_version_by_event(event_id: str) -> Optional[Dict[str, Any]]:
     """Get the initial version for an event (if it exists)"""
-    conn = None
+    return get_version_by_id(f"{event_id}_initial")
+
+def get_initial_versions_by_events(event_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Initial versions of several events (archived ones included), keyed by event ID"""
+    if not event_ids:
+        return {}
+    version_ids = tuple(f"{event_id}_initial" for event_id in event_ids)
+    placeholders = ",".join("?" for _ in version_ids)
+    where = f"version_id IN ({placeholders})"
     try:
-        conn = get_connection()
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        initial_version_id = f"{event_id}_initial"
-        cursor.execute("""
-            SELECT * FROM evaluation_versions 
-            WHERE version_id = ?
-        """, (initial_version_id,))
-        
-        row = cursor.fetchone()
-        
-        if row:
-            return {
-                "id": row["id"],
-                "version_id": row["version_id"],
-                "event_id": row["event_id"],
-                "model_provider": row["model_provider"],
-                "model_name": row["model_name"],
-                "user_prompt": row["user_prompt"],
-                "image_urls": json.loads(row["image_urls"]) if row["image_urls"] else [],
-                "assistant_response": json.loads(row["assistant_response"]) if row["assistant_response"] else {},
-                "rating": _parse_rating(row["rating"]),
-                "metadata": json.loads(row["metadata"]) if row["metadata"] else {},
-                "created_at": row["created_at"]
-            }
-        return None
+        with read_connection() as conn:
+            cursor = conn.cursor()
+            versions = _fetch_versions(cursor, where, version_ids)
+            versions += _read_archived(cursor, "event", where, version_ids, _fetch_versions)
+        return {version["event_id"]: version for version in versions}
     except Exception as e:
-        print(f"Error getting initial version: {e}")
-        return None
-    finally:
-        if conn:
-            conn.close()
+        print(f"Error getting initial versions: {e}")
+        return {}
+
+def _fetch_versions(cursor, where: str, params: tuple) -> List[Dict[str, Any]]:
+    """Full event versions matching a WHERE clause, newest first"""
+    cursor.execute(f"""
+        SELECT * FROM evaluation_versions 
+        WHERE {where}
+        ORDER BY created_at DESC
+    """, params)
+    
+    return [{
+        "id": row["id"],
+        "version_id": row["version_id"],
+        "event_id": row["event_id"],
+        "model_provider": row["model_provider"],
+        "model_name": row["model_name"],
+        "user_prompt": _decode_text(row["user_prompt"]),
+        "image_urls": serializer.loads(row["image_urls"]) if row["image_urls"] else [],
+        "assistant_response": _decode_json(row["assistant_response"]),
+        "rating": _parse_rating(row["rating"]),
+        "metadata": _decode_json(row["metadata"], {}),
+        "created_at": row["created_at"]
+    } for row in cursor.fetchall()]
+
+def _fetch_version_summaries(cursor, where: str, params: tuple) -> List[Dict[str, Any]]:
+    """Event versions matching a WHERE clause without the payload columns, newest first"""
+    cursor.execute(f"""
+        SELECT id, version_id, event_id, model_provider, model_name, rating,
+               tokens_input, tokens_output, cost, latency, created_at
+        FROM evaluation_versions 
+        WHERE {where}
+        ORDER BY created_at DESC
+    """, params)
+    
+    return [{
+        "id": row["id"],
+        "version_id": row["version_id"],
+        "event_id": row["event_id"],
+        "model_provider": row["model_provider"],
+        "model_name": row["model_name"],
+        "rating": _parse_rating(row["rating"]),
+        "tokens_input": row["tokens_input"],
+        "tokens_output": row["tokens_output"],
+        "cost": row["cost"],
+        "latency": row["latency"],
+        "created_at": row["created_at"]
+    } for row in cursor.fetchall()]
 
 def get_versions_by_event(event_id: str) -> List[Dict[str, Any]]:
-    """Get all versions for a specific event"""
-    conn = None
+    """Get all versions for a specific event (archived ones included)"""
     try:
-        conn = get_connection()
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT * FROM evaluation_versions 
-            WHERE event_id = ?
-            ORDER BY created_at DESC
-        """, (event_id,))
-        
-        rows = cursor.fetchall()
-        
-        versions = []
-        for row in rows:
-            versions.append({
-                "id": row["id"],
-                "version_id": row["version_id"],
-                "event_id": row["event_id"],
-                "model_provider": row["model_provider"],
-                "model_name": row["model_name"],
-                "user_prompt": row["user_prompt"],
-                "image_urls": json.loads(row["image_urls"]) if row["image_urls"] else [],
-                "assistant_response": json.loads(row["assistant_response"]),
-                "rating": _parse_rating(row["rating"]),
-                "metadata": json.loads(row["metadata"]) if row["metadata"] else {},
-                "created_at": row["created_at"]
-            })
-        
-        return versions
+        with read_connection() as conn:
+            cursor = conn.cursor()
+            versions = _fetch_versions(cursor, "event_id = ?", (event_id,))
+            archived = _read_archived(cursor, "event", "key = ?", (event_id,), _fetch_versions)
+        return _merge_archived(versions, archived)
     except Exception as e:
         print(f"Error getting versions: {e}")
         return []
-    finally:
-        if conn:
-            conn.close()
+
+def get_version_summaries_by_event(event_id: str) -> List[Dict[str, Any]]:
+    """Version list for an event without prompts, images, responses or metadata"""
+    try:
+        with read_connection() as conn:
+            cursor = conn.cursor()
+            versions = _fetch_version_summaries(cursor, "event_id = ?", (event_id,))
+            archived = _read_archived(cursor, "event", "key = ?", (event_id,), _fetch_version_summaries)
+        return _merge_archived(versions, archived)
+    except Exception as e:
+        print(f"Error getting version summaries: {e}")
+        return []
 
 def get_version_by_id(version_id: str) -> Optional[Dict[str, Any]]:
     """Get a specific version by ID"""
-    conn = None
     try:
-        conn = get_connection()
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT * FROM evaluation_versions 
-            WHERE version_id = ?
-        """, (version_id,))
-        
-        row = cursor.fetchone()
-        
-        if row:
-            return {
-                "id": row["id"],
-                "version_id": row["version_id"],
-                "event_id": row["event_id"],
-                "model_provider": row["model_provider"],
-                "model_name": row["model_name"],
-                "user_prompt": row["user_prompt"],
-                "image_urls": json.loads(row["image_urls"]) if row["image_urls"] else [],
-                "assistant_response": json.loads(row["assistant_response"]),
-                "rating": _parse_rating(row["rating"]),
-                "metadata": json.loads(row["metadata"]) if row["metadata"] else {},
-                "created_at": row["created_at"]
-            }
-        return None
+        with read_connection() as conn:
+            cursor = conn.cursor()
+            versions = (_fetch_versions(cursor, "version_id = ?", (version_id,))
+                        or _read_archived(cursor, "event", "version_id = ?", (version_id,), _fetch_versions))
+        return versions[0] if versions else None
     except Exception as e:
         print(f"Error getting version: {e}")
         return None
-    finally:
-        if conn:
-            conn.close()
 
 def get_all_events() -> List[Dict[str, Any]]:
-    """Get all unique events with their latest version info"""
-    conn = None
+    """Get all unique events with their latest version info (from event_summary)"""
     try:
-        conn = get_connection()
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        # Get all ratings for each event to calculate max (handles JSON format)
-        cursor.execute("""
-            SELECT event_id, rating
-            FROM evaluation_versions
-            WHERE rating IS NOT NULL
-        """)
-        
-        all_ratings = cursor.fetchall()
-        event_max_ratings = {}
-        for event_id, rating_json in all_ratings:
-            rating = _parse_rating(rating_json)
-            if rating:
-                overall = rating.get('overall') if isinstance(rating, dict) else rating
-                if overall and isinstance(overall, (int, float)):
-                    if event_id not in event_max_ratings or overall > event_max_ratings[event_id]:
-                        event_max_ratings[event_id] = int(overall)
-        
-        # Get event summaries
-        cursor.execute("""
-            SELECT 
-                event_id,
-                MAX(created_at) as last_updated,
-                COUNT(*) as version_count
-            FROM evaluation_versions
-            GROUP BY event_id
-            ORDER BY last_updated DESC
-        """)
-        
-        rows = cursor.fetchall()
+        with read_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT event_id, last_updated, version_count, max_rating
+                FROM {_summary_source(cursor, "event_summary")}
+                ORDER BY last_updated DESC
+            """)
+            rows = cursor.fetchall()
         
         events = []
         for row in rows:
@@ -486,19 +1739,167 @@ def get_all_events() -> List[Dict[str, Any]]:
                 "event_id": row["event_id"],
                 "last_updated": row["last_updated"],
                 "version_count": row["version_count"],
-                "max_rating": event_max_ratings.get(row["event_id"])
+                "max_rating": row["max_rating"]
             })
         
         return events
     except Exception as e:
         print(f"Error getting all events: {e}")
         return []
-    finally:
-        if conn:
-            conn.close()
+
+def get_rating_stats() -> Dict[str, Any]:
+    """Rating count, average and max per model (versions) and per chain name, computed in SQLite"""
+    try:
+        with read_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT model_provider, model_name, COUNT(*), COUNT(rating_overall),
+                       AVG(rating_overall), MAX(rating_overall)
+                FROM (SELECT model_provider, model_name, rating_overall FROM evaluation_versions
+                      UNION ALL
+                      SELECT model_provider, model_name, rating_overall FROM archive_index WHERE kind = 'event')
+                GROUP BY model_provider, model_name
+                ORDER BY COUNT(*) DESC
+            """)
+            models = [{
+                "model_provider": row[0],
+                "model_name": row[1],
+                "version_count": row[2],
+                "rated_count": row[3],
+                "avg_rating": round(row[4], 2) if row[4] is not None else None,
+                "max_rating": row[5]
+            } for row in cursor.fetchall()]
+            
+            cursor.execute("""
+                SELECT chain_name, COUNT(*), COUNT(rating_overall),
+                       AVG(rating_overall), MAX(rating_overall)
+                FROM (SELECT chain_name, rating_overall FROM chain_versions
+                      UNION ALL
+                      SELECT chain_name, rating_overall FROM archive_index WHERE kind = 'chain')
+                GROUP BY chain_name
+                ORDER BY COUNT(*) DESC
+            """)
+            chains = [{
+                "chain_name": row[0],
+                "version_count": row[1],
+                "rated_count": row[2],
+                "avg_rating": round(row[3], 2) if row[3] is not None else None,
+                "max_rating": row[4]
+            } for row in cursor.fetchall()]
+        
+        return {"models": models, "chains": chains}
+    except Exception as e:
+        print(f"Error getting rating stats: {e}")
+        return {"models": [], "chains": []}
 
 # ============= Chain-specific functions =============
 
+def _parse_latency(latency) -> Optional[float]:
+    """Parse a step latency ("1.23s", "1.23" or a number) into seconds"""
+    if latency is None:
+        return None
+    try:
+        if isinstance(latency, str):
+            return float(latency.replace('s', ''))
+        return float(latency)
+    except (ValueError, TypeError):
+        return None
+
+def _provider_for_model(model: str) -> Optional[str]:
+    """Provider implied by a model name"""
+    model = model.lower()
+    if "gpt" in model:
+        return "openai"
+    if "claude" in model:
+        return "anthropic"
+    if "gemini" in model:
+        return "gemini"
+    return None
+
+def _chain_aggregates(chain_events: List[Dict[str, Any]]) -> tuple:
+    """(total_latency, providers JSON, models JSON) of a chain, stored in its chain_versions row"""
+    total_latency = 0.0
+    providers = []
+    models = []
+    for event in chain_events:
+        model = event.get("model")
+        if model:
+            if model not in models:
+                models.append(model)
+            provider = _provider_for_model(model)
+            if provider and provider not in providers:
+                providers.append(provider)
+        latency = _parse_latency((event.get("metrics") or {}).get("latency"))
+        if latency:
+            total_latency += latency
+    return total_latency, serializer.dumps(providers), serializer.dumps(models)
+
+def _insert_chain_steps(cursor, version_id: str, trace_id: str, chain_events: List[Dict[str, Any]]):
+    """Store each chain event as its own chain_steps row (rating and metrics in columns)"""
+    rows = []
+    for step_index, event in enumerate(chain_events):
+        event = dict(event)
+        rating = event.pop("rating", None)
+        metrics = event.get("metrics") or {}
+        tokens = metrics.get("tokens") or {}
+        rows.append((
+            version_id,
+            trace_id,
+            step_index,
+            event.get("name"),
+            event.get("model"),
+            _parse_latency(metrics.get("latency")),
+            tokens.get("input"),
+            tokens.get("output"),
+            metrics.get("cost"),
+            serializer.dumps(rating) if rating is not None else None,
+            _encode_json(event)
+        ))
+    cursor.executemany("""
+        INSERT INTO chain_steps
+        (version_id, trace_id, step_index, name, model, latency,
+         tokens_input, tokens_output, cost, rating, event)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, rows)
+    _index_chain_steps(cursor, version_id, chain_events)
+
+def _normalize_chain_version(cursor, version_id: str) -> bool:
+    """Move a legacy chain version's chain_events JSON into chain_steps; False if there is nothing to move"""
+    cursor.execute("""
+        SELECT trace_id, chain_events FROM chain_versions
+        WHERE version_id = ? AND step_count IS NULL
+    """, (version_id,))
+    row = cursor.fetchone()
+    if not row:
+        return False
+    chain_events = store_event_images(cursor, _decode_json(row[1], []))
+    _insert_chain_steps(cursor, version_id, row[0], chain_events)
+    cursor.execute("""
+        UPDATE chain_versions
+        SET chain_events = '[]', step_count = ?, total_latency = ?, providers = ?, models = ?
+        WHERE version_id = ?
+    """, (len(chain_events), *_chain_aggregates(chain_events), version_id))
+    return True
+
+def _load_chain_steps(cursor, version_ids: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+    """Rebuild the chain_events list of each version from chain_steps"""
+    steps = {version_id: [] for version_id in version_ids}
+    if not version_ids:
+        return steps
+    placeholders = ",".join("?" for _ in version_ids)
+    cursor.execute(f"""
+        SELECT version_id, rating, event FROM chain_steps
+        WHERE version_id IN ({placeholders})
+        ORDER BY version_id, step_index
+    """, version_ids)
+    for row in cursor.fetchall():
+        event = _decode_json(row[2], {})
+        if row[1] is not None:
+            event["rating"] = serializer.loads(row[1])
+        steps[row[0]].append(event)
+    return steps
+
+@retry_on_lock
 def save_chain_version(
     version_id: str,
     trace_id: str,
@@ -511,371 +1912,1514 @@ def save_chain_version(
     metadata: Optional[Dict[str, Any]] = None
 ) -> bool:
     """Save a chain version"""
-    for i in range(3):
-        conn = None
-        try:
-            conn = get_connection()
+    try:
+        with write_connection() as conn:
             cursor = conn.cursor()
             
+            # Checked before anything is serialized or restored from the archive
+            if _version_exists(cursor, "chain", version_id):
+                print(f"Chain version {version_id} already exists")
+                return False
+            
             # Convert rating to JSON if it's a dict, or keep as is if None
             rating_json = None
             if rating is not None:
                 if isinstance(rating, dict):
-                    rating_json = json.dumps(rating)
+                    rating_json = serializer.dumps(rating)
                 elif isinstance(rating, int):
                     # Legacy: convert int to JSON format
-                    rating_json = json.dumps({"overall": rating})
+                    rating_json = serializer.dumps({"overall": rating})
                 else:
-                    rating_json = json.dumps(rating) if not isinstance(rating, str) else rating
+                    rating_json = serializer.dumps(rating) if not isinstance(rating, str) else rating
             
+            _restore_archived(cursor, "chain", trace_id)
+            
+            # Store each distinct step image once; the steps keep references only
+            chain_events = store_event_images(cursor, chain_events)
+            
+            # Steps live in chain_steps; chain_events is kept empty for these rows
             cursor.execute("""
                 INSERT INTO chain_versions 
-                (version_id, trace_id, chain_name, chain_events, 
-                 total_tokens_input, total_tokens_output, total_cost, rating, metadata)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                (version_id, trace_id, chain_name, chain_events, step_count,
+                 total_tokens_input, total_tokens_output, total_cost, rating, metadata,
+                 total_latency, providers, models)
+                VALUES (?, ?, ?, '[]', ?, ?, ?, ?, ?, ?, ?, ?, ?)
             """, (
                 version_id,
                 trace_id,
                 chain_name,
-                json.dumps(chain_events),
+                len(chain_events),
                 total_tokens_input,
                 total_tokens_output,
                 total_cost,
                 rating_json,
-                json.dumps(metadata) if metadata else None
+                _encode_json(metadata) if metadata else None,
+                *_chain_aggregates(chain_events)
             ))
-            
-            conn.commit()
-            print(f"Saved chain version {version_id} for trace {trace_id}")
-            return True
-        except sqlite3.IntegrityError:
-            print(f"Chain version {version_id} already exists")
-            return False
-        except sqlite3.OperationalError as e:
-            if "database is locked" in str(e) and i < 2:
-                print(f"Database locked, retrying... ({i+1}/3)")
-                time.sleep(2 ** i)
-            else:
-                print(f"Error saving chain version: {e}")
-                return False
-        except Exception as e:
-            print(f"Error saving chain version: {e}")
-            return False
-        finally:
-            if conn:
-                conn.close()
-    return False
+            _insert_chain_steps(cursor, version_id, trace_id, chain_events)
+            _refresh_chain_summary(cursor, trace_id)
+        
+        print(f"Saved chain version {version_id} for trace {trace_id}")
+        return True
+    except sqlite3.IntegrityError:
+        print(f"Chain version {version_id} already exists")
+        return False
+    except sqlite3.OperationalError as e:
+        if is_locked_error(e):
+            raise
+        print(f"Error saving chain version: {e}")
+        return False
+    except Exception as e:
+        print(f"Error saving chain version: {e}")
+        return False
 
-def get_chain_versions_by_trace(trace_id: str) -> List[Dict[str, Any]]:
-    """Get all chain versions for a trace ID"""
-    conn = None
+def _fetch_chain_versions(cursor, where: str, params: tuple) -> List[Dict[str, Any]]:
+    """Full chain versions (steps, metadata) matching a WHERE clause, newest first"""
+    cursor.execute(f"""
+        SELECT version_id, trace_id, chain_name, chain_events,
+               total_tokens_input, total_tokens_output, total_cost,
+               rating, metadata, created_at, step_count,
+               total_latency, providers, models
+        FROM chain_versions
+        WHERE {where}
+        ORDER BY created_at DESC
+    """, params)
+    
+    rows = cursor.fetchall()
+    steps = _load_chain_steps(cursor, [row[0] for row in rows if row[10] is not None])
+    
+    versions = []
+    for row in rows:
+        chain_events = steps[row[0]] if row[10] is not None else _decode_json(row[3])
+        # Rows not reached by the chain_aggregates backfill yet (or archived before it)
+        aggregates = row[11:14] if row[11] is not None else _chain_aggregates(chain_events)
+        versions.append({
+            "version_id": row[0],
+            "trace_id": row[1],
+            "chain_name": row[2],
+            "chain_events": chain_events,
+            "total_tokens_input": row[4],
+            "total_tokens_output": row[5],
+            "total_cost": row[6],
+            "rating": _parse_rating(row[7]),
+            "metadata": _decode_json(row[8], {}),
+            "created_at": row[9],
+            "event_count": len(chain_events),
+            "total_latency": aggregates[0],
+            "providers": serializer.loads(aggregates[1]),
+            "models": serializer.loads(aggregates[2])
+        })
+    return versions
+
+def get_chain_versions_by_trace(trace_id: str, version_ids: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """Get all chain versions for a trace ID (or only the given version IDs of it), archived ones included"""
+    where, params = "trace_id = ?", (trace_id,)
+    archive_where, archive_params = "key = ?", (trace_id,)
+    if version_ids:
+        placeholders = ",".join("?" for _ in version_ids)
+        where, params = f"{where} AND version_id IN ({placeholders})", (*params, *version_ids)
+        archive_where, archive_params = f"{archive_where} AND version_id IN ({placeholders})", (*archive_params, *version_ids)
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT version_id, trace_id, chain_name, chain_events,
-                   total_tokens_input, total_tokens_output, total_cost,
-                   rating, metadata, created_at
-            FROM chain_versions
-            WHERE trace_id = ?
-            ORDER BY created_at DESC
-        """, (trace_id,))
-        
-        rows = cursor.fetchall()
-        versions = []
-        for row in rows:
-            versions.append({
-                "version_id": row[0],
-                "trace_id": row[1],
-                "chain_name": row[2],
-                "chain_events": json.loads(row[3]),
-                "total_tokens_input": row[4],
-                "total_tokens_output": row[5],
-                "total_cost": row[6],
-                "rating": _parse_rating(row[7]),
-                "metadata": json.loads(row[8]) if row[8] else {},
-                "created_at": row[9]
-            })
-        return versions
+        with read_connection() as conn:
+            cursor = conn.cursor()
+            versions = _fetch_chain_versions(cursor, where, params)
+            archived = _read_archived(cursor, "chain", archive_where, archive_params, _fetch_chain_versions)
+        return _merge_archived(versions, archived)
     except Exception as e:
         print(f"Error getting chain versions: {e}")
         return []
-    finally:
-        if conn:
-            conn.close()
 
+def get_chain_version_by_id(version_id: str) -> Optional[Dict[str, Any]]:
+    """Get a specific chain version (full payload) by ID"""
+    try:
+        with read_connection() as conn:
+            cursor = conn.cursor()
+            versions = (_fetch_chain_versions(cursor, "version_id = ?", (version_id,))
+                        or _read_archived(cursor, "chain", "version_id = ?", (version_id,), _fetch_chain_versions))
+        return versions[0] if versions else None
+    except Exception as e:
+        print(f"Error getting chain version: {e}")
+        return None
+
+def _fetch_chain_version_summaries(cursor, where: str, params: tuple) -> List[Dict[str, Any]]:
+    """
+    Chain versions matching a WHERE clause without the step payloads or metadata
+
+    Step ratings come from the small chain_steps.rating column; only legacy rows that
+    were never moved into chain_steps need their chain_events decoded.
+    """
+    cursor.execute(f"""
+        SELECT version_id, trace_id, chain_name, step_count,
+               total_tokens_input, total_tokens_output, total_cost,
+               rating, created_at
+        FROM chain_versions
+        WHERE {where}
+        ORDER BY created_at DESC
+    """, params)
+    rows = cursor.fetchall()
+    
+    step_ratings = {}
+    version_ids = [row[0] for row in rows if row[3] is not None]
+    if version_ids:
+        placeholders = ",".join("?" for _ in version_ids)
+        cursor.execute(f"""
+            SELECT version_id, step_index, rating FROM chain_steps
+            WHERE version_id IN ({placeholders}) AND rating IS NOT NULL
+            ORDER BY version_id, step_index
+        """, version_ids)
+        for row in cursor.fetchall():
+            step_ratings.setdefault(row[0], []).append({"step_index": row[1], "rating": serializer.loads(row[2])})
+    
+    legacy = {}
+    for row in rows:
+        if row[3] is None:
+            cursor.execute("SELECT chain_events FROM chain_versions WHERE version_id = ?", (row[0],))
+            legacy[row[0]] = _decode_json(cursor.fetchone()[0], [])
+    
+    versions = []
+    for row in rows:
+        if row[0] in legacy:
+            events = legacy[row[0]]
+            step_count = len(events)
+            ratings = [{"step_index": index, "rating": event["rating"]}
+                       for index, event in enumerate(events) if event.get("rating")]
+        else:
+            step_count = row[3]
+            ratings = step_ratings.get(row[0], [])
+        versions.append({
+            "version_id": row[0],
+            "trace_id": row[1],
+            "chain_name": row[2],
+            "step_count": step_count,
+            "step_ratings": ratings,
+            "total_tokens_input": row[4],
+            "total_tokens_output": row[5],
+            "total_cost": row[6],
+            "rating": _parse_rating(row[7]),
+            "created_at": row[8]
+        })
+    return versions
+
+def get_chain_version_summaries(trace_id: str) -> List[Dict[str, Any]]:
+    """Version list for a trace without the step payloads or metadata (archived ones included)"""
+    try:
+        with read_connection() as conn:
+            cursor = conn.cursor()
+            versions = _fetch_chain_version_summaries(cursor, "trace_id = ?", (trace_id,))
+            archived = _read_archived(cursor, "chain", "key = ?", (trace_id,), _fetch_chain_version_summaries)
+        return _merge_archived(versions, archived)
+    except Exception as e:
+        print(f"Error getting chain version summaries: {e}")
+        return []
+
+@retry_on_lock
 def update_chain_rating(version_id: str, rating: Any) -> bool:
     """Update rating for a chain version. Rating can be int (legacy) or dict (JSON format)"""
     # Convert rating to JSON format
     rating_json = None
     if rating is not None:
         if isinstance(rating, dict):
-            rating_json = json.dumps(rating)
+            rating_json = serializer.dumps(rating)
         elif isinstance(rating, int):
             # Legacy: convert int to JSON format
-            rating_json = json.dumps({"overall": rating})
+            rating_json = serializer.dumps({"overall": rating})
         else:
-            rating_json = json.dumps(rating) if not isinstance(rating, str) else rating
+            rating_json = serializer.dumps(rating) if not isinstance(rating, str) else rating
     
-    for i in range(3):
-        conn = None
-        try:
-            conn = get_connection()
+    try:
+        with write_connection() as conn:
             cursor = conn.cursor()
+            _restore_archived_version(cursor, "chain", version_id)
             
             cursor.execute("""
                 UPDATE chain_versions
                 SET rating = ?
                 WHERE version_id = ?
             """, (rating_json, version_id))
+            updated = cursor.rowcount > 0
             
-            conn.commit()
-            return cursor.rowcount > 0
-        except sqlite3.OperationalError as e:
-            if "database is locked" in str(e) and i < 2:
-                print(f"Database locked, retrying... ({i+1}/3)")
-                time.sleep(2 ** i)
-            else:
-                print(f"Error updating chain rating: {e}")
-                return False
-        except Exception as e:
-            print(f"Error updating chain rating: {e}")
-            return False
-        finally:
-            if conn:
-                conn.close()
-    return False
+            cursor.execute("SELECT trace_id FROM chain_versions WHERE version_id = ?", (version_id,))
+            row = cursor.fetchone()
+            if row:
+                _refresh_chain_summary(cursor, row[0])
+        
+        return updated
+    except sqlite3.OperationalError as e:
+        if is_locked_error(e):
+            raise
+        print(f"Error updating chain rating: {e}")
+        return False
+    except Exception as e:
+        print(f"Error updating chain rating: {e}")
+        return False
 
+@retry_on_lock
 def update_chain_step_rating(version_id: str, step_index: int, rating: Optional[Dict[str, Any]]) -> bool:
-    """Update rating for a specific step in a chain version"""
-    for i in range(3):
-        conn = None
-        try:
-            conn = get_connection()
+    """Update rating for a specific step in a chain version (a single chain_steps row)"""
+    try:
+        with write_connection() as conn:
             cursor = conn.cursor()
+            _restore_archived_version(cursor, "chain", version_id)
             
-            # Get current chain_events
-            cursor.execute("SELECT chain_events FROM chain_versions WHERE version_id = ?", (version_id,))
-            row = cursor.fetchone()
-            if not row:
-                return False
-            
-            chain_events = json.loads(row[0])
-            
-            # Validate step_index
-            if step_index < 0 or step_index >= len(chain_events):
-                return False
-            
-            # Update the rating for the specific step
-            if rating is not None:
-                chain_events[step_index]['rating'] = rating
-            else:
-                # Remove rating if None
-                if 'rating' in chain_events[step_index]:
-                    del chain_events[step_index]['rating']
-            
-            # Update the database
+            rating_json = serializer.dumps(rating) if rating is not None else None
             cursor.execute("""
-                UPDATE chain_versions
-                SET chain_events = ?
-                WHERE version_id = ?
-            """, (json.dumps(chain_events), version_id))
+                UPDATE chain_steps
+                SET rating = ?
+                WHERE version_id = ? AND step_index = ?
+            """, (rating_json, version_id, step_index))
+            updated = cursor.rowcount > 0
             
-            conn.commit()
-            return cursor.rowcount > 0
-        except sqlite3.OperationalError as e:
-            if "database is locked" in str(e) and i < 2:
-                print(f"Database locked, retrying... ({i+1}/3)")
-                time.sleep(2 ** i)
-            else:
-                print(f"Error updating chain step rating: {e}")
-                return False
-        except Exception as e:
-            print(f"Error updating chain step rating: {e}")
-            return False
-        finally:
-            if conn:
-                conn.close()
-    return False
+            # Legacy row with its steps still in chain_events: move them into chain_steps first
+            if not updated and _normalize_chain_version(cursor, version_id):
+                cursor.execute("""
+                    UPDATE chain_steps
+                    SET rating = ?
+                    WHERE version_id = ? AND step_index = ?
+                """, (rating_json, version_id, step_index))
+                updated = cursor.rowcount > 0
+            
+            if updated:
+                cursor.execute("SELECT trace_id FROM chain_versions WHERE version_id = ?", (version_id,))
+                _refresh_chain_step_ratings(cursor, [cursor.fetchone()[0]])
+        
+        return updated
+    except sqlite3.OperationalError as e:
+        if is_locked_error(e):
+            raise
+        print(f"Error updating chain step rating: {e}")
+        return False
+    except Exception as e:
+        print(f"Error updating chain step rating: {e}")
+        return False
 
 def trace_exists_in_db(trace_id: str) -> bool:
-    """Check if a trace ID exists in the database"""
-    conn = None
+    """Check if a trace ID exists in the database (hot or archived)"""
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT 1 FROM chain_versions WHERE trace_id = ? LIMIT 1", (trace_id,))
-        return cursor.fetchone() is not None
+        with read_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT EXISTS (SELECT 1 FROM chain_versions WHERE trace_id = ?)
+                    OR EXISTS (SELECT 1 FROM archive_index WHERE kind = 'chain' AND key = ?)
+            """, (trace_id, trace_id))
+            return bool(cursor.fetchone()[0])
     except Exception as e:
         print(f"Error checking trace existence: {e}")
         return False
-    finally:
-        if conn:
-            conn.close()
 
 def get_initial_chain_by_trace(trace_id: str) -> Optional[Dict[str, Any]]:
     """Get the initial chain version for a trace ID"""
-    conn = None
-    try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        
-        version_id = f"{trace_id}_initial"
-        cursor.execute("""
-            SELECT version_id, trace_id, chain_name, chain_events,
-                   total_tokens_input, total_tokens_output, total_cost,
-                   rating, metadata, created_at
-            FROM chain_versions
-            WHERE version_id = ?
-        """, (version_id,))
-        
-        row = cursor.fetchone()
-        if row:
-            return {
-                "version_id": row[0],
-                "trace_id": row[1],
-                "chain_name": row[2],
-                "chain_events": json.loads(row[3]),
-                "total_tokens_input": row[4],
-                "total_tokens_output": row[5],
-                "total_cost": row[6],
-                "rating": _parse_rating(row[7]),
-                "metadata": json.loads(row[8]) if row[8] else {},
-                "created_at": row[9]
-            }
-        return None
-    except Exception as e:
-        print(f"Error getting initial chain: {e}")
-        return None
-    finally:
-        if conn:
-            conn.close()
+    return get_chain_version_by_id(f"{trace_id}_initial")
 
 def get_all_trace_ids() -> List[str]:
     """Get all unique trace IDs from the database"""
-    conn = None
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT DISTINCT trace_id FROM chain_versions ORDER BY trace_id")
-        return [row[0] for row in cursor.fetchall()]
+        with read_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT trace_id FROM chain_versions
+                UNION
+                SELECT key FROM archive_index WHERE kind = 'chain'
+                ORDER BY 1
+            """)
+            return [row[0] for row in cursor.fetchall()]
     except Exception as e:
         print(f"Error getting trace IDs: {e}")
         return []
-    finally:
-        if conn:
-            conn.close()
 
 def get_all_chains():
-    """Get all chains with their stats"""
-    conn = None
+    """Get all chains with their stats (from chain_summary)"""
     try:
-        conn = sqlite3.connect(DB_PATH, timeout=10.0)
-        conn.execute("PRAGMA journal_mode=WAL")
-        cursor = conn.cursor()
-        
-        # Get all chain ratings to calculate max
-        cursor.execute("""
-            SELECT trace_id, rating
-            FROM chain_versions
-            WHERE rating IS NOT NULL
-        """)
-        
-        all_ratings = cursor.fetchall()
-        chain_max_ratings = {}
-        for trace_id, rating_json in all_ratings:
-            rating = _parse_rating(rating_json)
-            if rating:
-                overall = rating.get('overall') if isinstance(rating, dict) else rating
-                if overall and isinstance(overall, (int, float)):
-                    if trace_id not in chain_max_ratings or overall > chain_max_ratings[trace_id]:
-                        chain_max_ratings[trace_id] = int(overall)
-        
-        # Get chain summaries
-        cursor.execute("""
-            SELECT 
-                trace_id,
-                chain_name,
-                COUNT(*) as version_count,
-                MAX(created_at) as last_updated
-            FROM chain_versions 
-            GROUP BY trace_id, chain_name
-            ORDER BY last_updated DESC
-        """)
+        with read_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT trace_id, chain_name, version_count, max_rating, last_updated,
+                       max_step_rating, rated_steps
+                FROM {_summary_source(cursor, "chain_summary")}
+                ORDER BY last_updated DESC
+            """)
+            rows = cursor.fetchall()
         
         chains = []
-        for row in cursor.fetchall():
+        for row in rows:
             chains.append({
                 "trace_id": row[0],
                 "chain_name": row[1],
                 "version_count": row[2],
-                "max_rating": chain_max_ratings.get(row[0]),
-                "last_updated": row[3]
+                "max_rating": row[3],
+                "last_updated": row[4],
+                "max_step_rating": row[5],
+                "rated_steps": row[6] or 0
             })
         
         return chains
     except Exception as e:
         print(f"Error getting chains: {e}")
         return []
-    finally:
-        if conn:
+
+def get_chain_steps(
+    trace_id: Optional[str] = None,
+    model: Optional[str] = None,
+    rated_only: bool = False,
+    limit: int = 100
+) -> List[Dict[str, Any]]:
+    """Step-level query over chain_steps (metrics and rating only, without the step payload)"""
+    conditions = []
+    params = []
+    if trace_id:
+        conditions.append("trace_id = ?")
+        params.append(trace_id)
+    if model:
+        conditions.append("model = ?")
+        params.append(model)
+    if rated_only:
+        conditions.append("rating IS NOT NULL")
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    try:
+        with read_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT version_id, trace_id, step_index, name, model, latency,
+                       tokens_input, tokens_output, cost, rating
+                FROM chain_steps
+                {where}
+                ORDER BY id DESC
+                LIMIT ?
+            """, (*params, limit))
+            rows = cursor.fetchall()
+
+        return [{
+            "version_id": row[0],
+            "trace_id": row[1],
+            "step_index": row[2],
+            "name": row[3],
+            "model": row[4],
+            "latency": row[5],
+            "tokens_input": row[6],
+            "tokens_output": row[7],
+            "cost": row[8],
+            "rating": serializer.loads(row[9]) if row[9] else None
+        } for row in rows]
+    except Exception as e:
+        print(f"Error getting chain steps: {e}")
+        return []
+
+def migrate_chain_steps(batch_size: int = 100) -> int:
+    """
+    Move the steps of legacy chain versions (chain_events JSON) into chain_steps
+
+    Runs in batches (one transaction per batch) and is safe to re-run. Legacy rows are
+    also converted one at a time when one of their steps is rated.
+    """
+    migrated = 0
+    while True:
+        with write_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT version_id FROM chain_versions
+                WHERE step_count IS NULL
+                ORDER BY id LIMIT ?
+            """, (batch_size,))
+            version_ids = [row[0] for row in cursor.fetchall()]
+            for version_id in version_ids:
+                _normalize_chain_version(cursor, version_id)
+        if not version_ids:
+            break
+        migrated += len(version_ids)
+        print(f"Moved steps of {migrated} chain versions into chain_steps...")
+    return migrated
+
+# ============= Archive (cold tier) =============
+# Whole events/traces that have gone quiet are moved out of the hot tables into monthly
+# archive files (see app/services/archive.py). archive_index (hot) records where each
+# archived version lives, so reads fall through to the right files, and the summary
+# rows stay in place so archived events keep showing up in listings. Writing to an
+# archived event or trace (new version, rating) moves it back into the hot tables first.
+
+# Kind -> (versions table, key column)
+ARCHIVE_KINDS = {
+    "event": ("evaluation_versions", "event_id"),
+    "chain": ("chain_versions", "trace_id"),
+}
+
+def _archive_store():
+    return get_archive_store(get_pool(DB_PATH).db_path)
+
+def _stored_columns(cursor, table: str) -> List[str]:
+    """Columns with stored values (generated columns are recomputed on insert)"""
+    cursor.execute(f"PRAGMA table_xinfo({table})")
+    return [col[1] for col in cursor.fetchall() if col[6] == 0]
+
+def _archive_table_sql(cursor) -> Dict[str, str]:
+    """CREATE TABLE statements of the archived tables, so archive files match the hot schema"""
+    placeholders = ",".join("?" for _ in ARCHIVE_TABLES)
+    cursor.execute(f"SELECT name, sql FROM sqlite_master WHERE type = 'table' AND name IN ({placeholders})",
+                   ARCHIVE_TABLES)
+    return {row[0]: row[1] for row in cursor.fetchall()}
+
+def _read_archived(cursor, kind: str, where: str, params: tuple, fetch) -> List[Dict[str, Any]]:
+    """
+    Run fetch(archive_cursor, where, params) in every month holding archived versions
+    that match an archive_index WHERE clause
+    """
+    cursor.execute(f"SELECT month, version_id FROM archive_index WHERE kind = ? AND {where}", (kind, *params))
+    by_month = {}
+    for row in cursor.fetchall():
+        by_month.setdefault(row[0], []).append(row[1])
+    
+    results = []
+    for month, version_ids in sorted(by_month.items()):
+        placeholders = ",".join("?" for _ in version_ids)
+        try:
+            with _archive_store().reader(month) as conn:
+                results.extend(fetch(conn.cursor(), f"version_id IN ({placeholders})", tuple(version_ids)))
+        except sqlite3.Error as e:
+            print(f"Error reading archive {month}: {e}")
+    return results
+
+def _merge_archived(versions: List[Dict[str, Any]], archived: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Hot versions plus archived ones not also in the hot tables, newest first"""
+    if not archived:
+        return versions
+    hot_ids = {version["version_id"] for version in versions}
+    merged = versions + [version for version in archived if version["version_id"] not in hot_ids]
+    return sorted(merged, key=lambda version: version["created_at"] or "", reverse=True)
+
+def _archive_value(table: str, column: str, value: Any) -> Any:
+    """Stored value for an archive row (payload columns compressed even if the hot row is not)"""
+    if isinstance(value, str) and column in COMPRESSED_COLUMNS.get(table, []):
+        return compression.encode_text(value)
+    return value
+
+def _copy_rows(cursor, table: str, columns: List[str], rows: List[Any], verb: str = "INSERT OR REPLACE"):
+    if not rows:
+        return
+    cursor.executemany(f"""
+        {verb} INTO {table} ({", ".join(columns)})
+        VALUES ({",".join("?" for _ in columns)})
+    """, [tuple(row[column] for column in columns) for row in rows])
+
+def _archive_keys(cursor, kind: str, keys: List[str]) -> int:
+    """Move every version of the given events/traces into the monthly archives (inside the caller's write)"""
+    table, key_column = ARCHIVE_KINDS[kind]
+    placeholders = ",".join("?" for _ in keys)
+    columns = _stored_columns(cursor, table)
+    cursor.execute(f"""
+        SELECT {", ".join(columns)},
+               COALESCE(strftime('%Y-%m', created_at), '1970-01') AS archive_month,
+               rating_overall
+        FROM {table} WHERE {key_column} IN ({placeholders})
+    """, keys)
+    rows = cursor.fetchall()
+    if not rows:
+        return 0
+    
+    by_month = {}
+    for row in rows:
+        by_month.setdefault(row["archive_month"], []).append(row)
+    
+    step_columns = _stored_columns(cursor, "chain_steps")
+    table_sql = _archive_table_sql(cursor)
+    # (best step rating, rated steps) per chain version, kept in archive_index for the summaries
+    step_ratings = {}
+    if kind == "chain":
+        cursor.execute(f"""
+            SELECT version_id, {MAX_RATING_SQL}, COUNT(NULLIF(rating_overall, 0)) FROM chain_steps
+            WHERE trace_id IN ({placeholders}) GROUP BY version_id
+        """, keys)
+        step_ratings = {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+    for month, month_rows in sorted(by_month.items()):
+        archive_rows = [{column: _archive_value(table, column, row[column]) for column in columns}
+                        for row in month_rows]
+        with _archive_store().writer(month, table_sql) as archive:
+            archive_cursor = archive.cursor()
+            _copy_rows(archive_cursor, table, columns, archive_rows)
+            if kind == "chain":
+                version_ids = [row["version_id"] for row in month_rows]
+                version_placeholders = ",".join("?" for _ in version_ids)
+                cursor.execute(f"""
+                    SELECT {", ".join(step_columns)} FROM chain_steps
+                    WHERE version_id IN ({version_placeholders})
+                """, version_ids)
+                steps = [{column: _archive_value("chain_steps", column, row[column]) for column in step_columns}
+                         for row in cursor.fetchall()]
+                # Drop steps left behind by an earlier archive of the same versions
+                archive_cursor.execute(f"DELETE FROM chain_steps WHERE version_id IN ({version_placeholders})",
+                                       version_ids)
+                _copy_rows(archive_cursor, "chain_steps", step_columns, steps)
+    
+    cursor.executemany("""
+        INSERT OR REPLACE INTO archive_index
+        (version_id, kind, key, month, created_at, rating_overall, model_provider, model_name, chain_name,
+         max_step_rating, rated_steps)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, [(
+        row["version_id"],
+        kind,
+        row[key_column],
+        row["archive_month"],
+        row["created_at"],
+        row["rating_overall"],
+        row["model_provider"] if kind == "event" else None,
+        row["model_name"] if kind == "event" else None,
+        row["chain_name"] if kind == "chain" else None,
+        *(step_ratings.get(row["version_id"], (None, 0)) if kind == "chain" else (None, None))
+    ) for row in rows])
+    
+    # Only the hot tables are searchable
+    if kind == "event":
+        cursor.execute(f"""
+            DELETE FROM search_index
+            WHERE rowid IN (SELECT id FROM evaluation_versions WHERE event_id IN ({placeholders}))
+        """, keys)
+    else:
+        cursor.execute(f"""
+            DELETE FROM search_index
+            WHERE rowid IN (SELECT -id FROM chain_steps WHERE trace_id IN ({placeholders}))
+        """, keys)
+        cursor.execute(f"DELETE FROM chain_steps WHERE trace_id IN ({placeholders})", keys)
+    cursor.execute(f"DELETE FROM {table} WHERE {key_column} IN ({placeholders})", keys)
+    return len(rows)
+
+def _restore_archived(cursor, kind: str, key: str) -> int:
+    """Move an archived event/trace back into the hot tables (inside the caller's write)"""
+    table, _ = ARCHIVE_KINDS[kind]
+    cursor.execute("SELECT month, version_id FROM archive_index WHERE kind = ? AND key = ?", (kind, key))
+    by_month = {}
+    for row in cursor.fetchall():
+        by_month.setdefault(row[0], []).append(row[1])
+    if not by_month:
+        return 0
+    
+    columns = _stored_columns(cursor, table)
+    step_columns = _stored_columns(cursor, "chain_steps")
+    restored = 0
+    for month, version_ids in sorted(by_month.items()):
+        placeholders = ",".join("?" for _ in version_ids)
+        with _archive_store().reader(month) as archive:
+            archive_cursor = archive.cursor()
+            archive_cursor.execute(f"SELECT * FROM {table} WHERE version_id IN ({placeholders})", version_ids)
+            rows = archive_cursor.fetchall()
+            steps = []
+            if kind == "chain":
+                archive_cursor.execute(f"SELECT * FROM chain_steps WHERE version_id IN ({placeholders})", version_ids)
+                steps = archive_cursor.fetchall()
+        if not rows:
+            continue
+        
+        # Columns added to the hot schema after the month was archived stay NULL
+        _copy_rows(cursor, table, [c for c in columns if c in rows[0].keys()], rows, "INSERT OR IGNORE")
+        if kind == "event":
+            cursor.executemany("""
+                INSERT OR REPLACE INTO search_index (rowid, prompt, response, kind)
+                VALUES (?, ?, ?, 'event')
+            """, [(
+                row["id"],
+                _flatten_text(_decode_text(row["user_prompt"])),
+                _flatten_text(_decode_json(row["assistant_response"]))
+            ) for row in rows])
+        elif steps:
+            _copy_rows(cursor, "chain_steps", [c for c in step_columns if c in steps[0].keys()], steps,
+                       "INSERT OR IGNORE")
+            cursor.executemany("""
+                INSERT OR REPLACE INTO search_index (rowid, prompt, response, kind)
+                VALUES (?, ?, ?, 'chain')
+            """, [(
+                -row["id"],
+                _flatten_text(event.get("user_prompt")),
+                _flatten_text(event.get("assistant_response"))
+            ) for row, event in ((row, _decode_json(row["event"], {})) for row in steps)])
+        restored += len(rows)
+    
+    # The archive copies become garbage for prune_archives
+    cursor.execute("DELETE FROM archive_index WHERE kind = ? AND key = ?", (kind, key))
+    return restored
+
+def _restore_archived_version(cursor, kind: str, version_id: str) -> int:
+    """Restore the event/trace an archived version belongs to (no-op for hot versions)"""
+    cursor.execute("SELECT key FROM archive_index WHERE kind = ? AND version_id = ?", (kind, version_id))
+    row = cursor.fetchone()
+    return _restore_archived(cursor, kind, row[0]) if row else 0
+
+def _archive_candidates(cursor, kind: str, older_than_days: int, initial_older_than_days: int,
+                        limit: int) -> List[str]:
+    """
+    Events/traces with hot versions that are due for archiving: nothing saved for
+    older_than_days, or only the unrated auto-saved _initial version, never revisited
+    for initial_older_than_days
+    """
+    table, key_column = ARCHIVE_KINDS[kind]
+    summary = "event_summary" if kind == "event" else "chain_summary"
+    cursor.execute(f"""
+        SELECT s.{key_column} FROM {summary} s
+        WHERE (s.last_updated < datetime('now', ?)
+               OR (s.last_updated < datetime('now', ?)
+                   AND s.version_count = 1
+                   AND EXISTS (SELECT 1 FROM {table} v
+                               WHERE v.version_id = s.{key_column} || '_initial' AND v.rating IS NULL)))
+          AND EXISTS (SELECT 1 FROM {table} v WHERE v.{key_column} = s.{key_column})
+        ORDER BY s.last_updated
+        LIMIT ?
+    """, (f"-{int(older_than_days)} days", f"-{int(initial_older_than_days)} days", limit))
+    return [row[0] for row in cursor.fetchall()]
+
+def archive_old_versions(
+    older_than_days: int = ARCHIVE_AFTER_DAYS,
+    initial_older_than_days: int = ARCHIVE_INITIAL_AFTER_DAYS,
+    batch_size: int = 50
+) -> Dict[str, int]:
+    """
+    Move cold events/traces into the monthly archive files
+
+    Runs one short write transaction per batch of events/traces, then prunes archive
+    rows that were restored or deleted since they were archived.
+    """
+    counts = {"events": 0, "chains": 0, "versions": 0}
+    for kind in ARCHIVE_KINDS:
+        while True:
+            with write_connection() as conn:
+                cursor = conn.cursor()
+                keys = _archive_candidates(cursor, kind, older_than_days, initial_older_than_days, batch_size)
+                if keys:
+                    counts["versions"] += _archive_keys(cursor, kind, keys)
+            if not keys:
+                break
+            counts[f"{kind}s"] += len(keys)
+            print(f"Archived {counts[f'{kind}s']} {kind}s...")
+    counts["pruned"] = prune_archives()
+    return counts
+
+def prune_archives() -> int:
+    """Delete archive rows no longer listed in archive_index (restored or deleted since); returns rows removed"""
+    store = _archive_store()
+    removed = 0
+    for month in store.months():
+        with read_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT version_id FROM archive_index WHERE month = ?", (month,))
+            keep = [(row[0],) for row in cursor.fetchall()]
+            table_sql = _archive_table_sql(cursor)
+        
+        month_removed = 0
+        with store.writer(month, table_sql) as archive:
+            archive.execute("CREATE TEMP TABLE keep (version_id TEXT PRIMARY KEY)")
+            archive.executemany("INSERT OR IGNORE INTO keep VALUES (?)", keep)
+            for table in ARCHIVE_TABLES:
+                cursor = archive.execute(f"DELETE FROM {table} WHERE version_id NOT IN (SELECT version_id FROM keep)")
+                month_removed += cursor.rowcount
+        
+        # Files are rewritten in place rather than deleted, so cached readers stay valid
+        if month_removed:
+            store.vacuum(month)
+        removed += month_removed
+    return removed
+
+def get_archive_stats() -> Dict[str, Any]:
+    """Archived events/traces/versions per month plus the archive files"""
+    try:
+        with read_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT month, kind, COUNT(DISTINCT key), COUNT(*)
+                FROM archive_index GROUP BY month, kind ORDER BY month
+            """)
+            months = [{"month": row[0], "kind": row[1], "keys": row[2], "versions": row[3]}
+                      for row in cursor.fetchall()]
+        return {"months": months, **_archive_store().stats()}
+    except Exception as e:
+        print(f"Error getting archive stats: {e}")
+        return {"months": []}
+
+# ============= Import / export =============
+# Dumps are streams of version records in the API's format (event versions carry
+# event_id, chain versions trace_id and chain_events), written by iter_export_versions
+# and read back by import_versions. Both work in fixed-size batches, so memory stays
+# flat however large the dump is.
+
+EXPORT_BATCH_SIZE = 200
+IMPORT_BATCH_SIZE = 200
+IMPORT_MODES = ("skip", "upsert")
+
+def _encode_rating(rating: Any) -> Optional[str]:
+    """Rating column value: int (legacy) or dict ratings become JSON, strings are kept"""
+    if rating is None:
+        return None
+    if isinstance(rating, int):
+        return serializer.dumps({"overall": rating})
+    return rating if isinstance(rating, str) else serializer.dumps(rating)
+
+def _inline_images(cursor, versions: List[Dict[str, Any]]):
+    """Replace blob references with data URLs so a dump does not depend on this database's blobs"""
+    hashes = []
+    for version in versions:
+        hashes.extend(blob_hash_from_url(url) for url in version.get("image_urls") or [])
+        for event in version.get("chain_events") or []:
+            if isinstance(event, dict):
+                hashes.extend(blob_hash_from_url(url) for url in event.get("user_images") or [])
+    blobs = load_blobs(cursor, [h for h in hashes if h])
+    if not blobs:
+        return
+    
+    def inline(urls):
+        return [to_data_url(*blobs[blob_hash_from_url(url)]) if blob_hash_from_url(url) in blobs else url
+                for url in urls]
+    
+    for version in versions:
+        if version.get("image_urls"):
+            version["image_urls"] = inline(version["image_urls"])
+        if version.get("chain_events"):
+            version["chain_events"] = [
+                {**event, "user_images": inline(event["user_images"])}
+                if isinstance(event, dict) and event.get("user_images") else event
+                for event in version["chain_events"]
+            ]
+
+def _export_batch(cursor, kind: str, last_id: int, batch_size: int,
+                  keep: Optional[set] = None) -> tuple:
+    """Next batch of versions after last_id in ID order: (versions, last_id or None when done)"""
+    table, _ = ARCHIVE_KINDS[kind]
+    cursor.execute(f"SELECT id, version_id FROM {table} WHERE id > ? ORDER BY id LIMIT ?", (last_id, batch_size))
+    rows = cursor.fetchall()
+    if not rows:
+        return [], None
+    
+    version_ids = [row[1] for row in rows if keep is None or row[1] in keep]
+    versions = []
+    if version_ids:
+        placeholders = ",".join("?" for _ in version_ids)
+        fetch = _fetch_versions if kind == "event" else _fetch_chain_versions
+        by_id = {version["version_id"]: version
+                 for version in fetch(cursor, f"version_id IN ({placeholders})", tuple(version_ids))}
+        versions = [by_id[version_id] for version_id in version_ids if version_id in by_id]
+        for version in versions:
+            version.pop("id", None)
+            if kind == "chain":
+                # Derived from the steps again on import
+                for column in ("event_count", *CHAIN_AGGREGATE_COLUMNS):
+                    version.pop(column, None)
+    return versions, rows[-1][0]
+
+def iter_export_versions(
+    kind: Optional[str] = None,
+    batch_size: int = EXPORT_BATCH_SIZE,
+    include_archived: bool = True,
+    inline_images: bool = True
+) -> Iterator[Dict[str, Any]]:
+    """
+    Yield every event version, then every chain version (or only one kind), archived ones included
+
+    Each batch is read with its own short read (keyset on id), so no connection or
+    transaction stays open between yields.
+    """
+    if kind is not None and kind not in ARCHIVE_KINDS:
+        raise ValueError(f"Invalid kind: {kind}")
+    store = _archive_store()
+    for kind in ([kind] if kind else list(ARCHIVE_KINDS)):
+        last_id = 0
+        while last_id is not None:
+            with read_connection() as conn:
+                cursor = conn.cursor()
+                versions, last_id = _export_batch(cursor, kind, last_id, batch_size)
+                if inline_images:
+                    _inline_images(cursor, versions)
+            yield from versions
+        
+        if not include_archived:
+            continue
+        for month in store.months():
+            with read_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT version_id FROM archive_index WHERE kind = ? AND month = ?", (kind, month))
+                keep = {row[0] for row in cursor.fetchall()}
+            last_id = 0
+            while keep and last_id is not None:
+                with store.reader(month) as archive:
+                    versions, last_id = _export_batch(archive.cursor(), kind, last_id, batch_size, keep)
+                if inline_images and versions:
+                    with read_connection() as conn:
+                        _inline_images(conn.cursor(), versions)
+                yield from versions
+
+def _insert_event_versions(cursor, records: List[Dict[str, Any]]):
+    """Batch insert of imported event versions (keeps their created_at)"""
+    rows = []
+    for record in records:
+        metadata = record.get("metadata")
+        image_urls = store_image_urls(cursor, record.get("image_urls"))
+        rows.append((
+            record["version_id"],
+            record["event_id"],
+            record.get("model_provider") or "",
+            record.get("model_name") or "",
+            compression.encode_text(record.get("user_prompt") or ""),
+            serializer.dumps(image_urls) if image_urls else None,
+            _encode_json(record.get("assistant_response", {})),
+            _encode_rating(record.get("rating")),
+            _encode_json(metadata) if metadata else None,
+            *_version_metrics(metadata),
+            record.get("created_at")
+        ))
+    cursor.executemany("""
+        INSERT INTO evaluation_versions 
+        (version_id, event_id, model_provider, model_name, user_prompt, 
+         image_urls, assistant_response, rating, metadata,
+         tokens_input, tokens_output, cost, latency, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+    """, rows)
+    
+    placeholders = ",".join("?" for _ in records)
+    cursor.execute(f"SELECT version_id, id FROM evaluation_versions WHERE version_id IN ({placeholders})",
+                   [record["version_id"] for record in records])
+    row_ids = dict(cursor.fetchall())
+    for record in records:
+        _index_version(cursor, row_ids[record["version_id"]], record.get("user_prompt"),
+                       record.get("assistant_response"))
+
+def _insert_chain_versions(cursor, records: List[Dict[str, Any]]):
+    """Batch insert of imported chain versions and their steps (keeps their created_at)"""
+    steps = []
+    rows = []
+    for record in records:
+        chain_events = store_event_images(cursor, record.get("chain_events") or [])
+        steps.append(chain_events)
+        metadata = record.get("metadata")
+        rows.append((
+            record["version_id"],
+            record["trace_id"],
+            record.get("chain_name"),
+            len(chain_events),
+            record.get("total_tokens_input"),
+            record.get("total_tokens_output"),
+            record.get("total_cost"),
+            _encode_rating(record.get("rating")),
+            _encode_json(metadata) if metadata else None,
+            *_chain_aggregates(chain_events),
+            record.get("created_at")
+        ))
+    cursor.executemany("""
+        INSERT INTO chain_versions 
+        (version_id, trace_id, chain_name, chain_events, step_count,
+         total_tokens_input, total_tokens_output, total_cost, rating, metadata,
+         total_latency, providers, models, created_at)
+        VALUES (?, ?, ?, '[]', ?, ?, ?, ?, ?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+    """, rows)
+    for record, chain_events in zip(records, steps):
+        _insert_chain_steps(cursor, record["version_id"], record["trace_id"], chain_events)
+
+def _delete_versions(cursor, kind: str, version_ids: List[str]):
+    """Delete versions (and their steps and search rows) that an import replaces"""
+    placeholders = ",".join("?" for _ in version_ids)
+    if kind == "event":
+        cursor.execute(f"""
+            DELETE FROM search_index
+            WHERE rowid IN (SELECT id FROM evaluation_versions WHERE version_id IN ({placeholders}))
+        """, version_ids)
+        cursor.execute(f"DELETE FROM evaluation_versions WHERE version_id IN ({placeholders})", version_ids)
+        return
+    cursor.execute(f"""
+        DELETE FROM search_index
+        WHERE rowid IN (SELECT -id FROM chain_steps WHERE version_id IN ({placeholders}))
+    """, version_ids)
+    cursor.execute(f"DELETE FROM chain_steps WHERE version_id IN ({placeholders})", version_ids)
+    cursor.execute(f"DELETE FROM chain_versions WHERE version_id IN ({placeholders})", version_ids)
+
+@retry_on_lock
+def _import_batch(records: List[Dict[str, Any]], mode: str) -> Dict[str, int]:
+    """Write one batch of dump records in a single transaction; returns its counts"""
+    counts = {"events": 0, "chains": 0, "updated": 0, "skipped": 0, "invalid": 0}
+    by_kind = {"event": {}, "chain": {}}
+    for record in records:
+        kind = record_kind(record)
+        if kind is None or not record.get("version_id"):
+            counts["invalid"] += 1
+            continue
+        # Repeated version IDs within a batch: the last one wins for upsert, the first otherwise
+        if record["version_id"] in by_kind[kind] and mode == "skip":
+            counts["skipped"] += 1
+            continue
+        by_kind[kind][record["version_id"]] = record
+    
+    with write_connection() as conn:
+        cursor = conn.cursor()
+        for kind, batch in by_kind.items():
+            if not batch:
+                continue
+            table, key_column = ARCHIVE_KINDS[kind]
+            version_ids = list(batch)
+            placeholders = ",".join("?" for _ in version_ids)
+            cursor.execute(f"""
+                SELECT version_id, {key_column} FROM {table} WHERE version_id IN ({placeholders})
+                UNION ALL
+                SELECT version_id, key FROM archive_index WHERE kind = ? AND version_id IN ({placeholders})
+            """, (*version_ids, kind, *version_ids))
+            existing = dict(cursor.fetchall())
+            
+            if mode == "skip":
+                counts["skipped"] += len(existing)
+                batch = {version_id: record for version_id, record in batch.items() if version_id not in existing}
+                existing = {}
+                if not batch:
+                    continue
+            keys = {record[key_column] for record in batch.values()} | set(existing.values())
+            # Versions join their event/trace in the hot tables (like save_version)
+            for key in keys:
+                _restore_archived(cursor, kind, key)
+            if existing:
+                _delete_versions(cursor, kind, list(existing))
+                counts["updated"] += len(existing)
+            
+            if kind == "event":
+                _insert_event_versions(cursor, list(batch.values()))
+            else:
+                _insert_chain_versions(cursor, list(batch.values()))
+            counts[f"{kind}s"] += len(batch) - len(existing)
+            for key in keys:
+                if kind == "event":
+                    _refresh_event_summary(cursor, key)
+                else:
+                    _refresh_chain_summary(cursor, key)
+    return counts
+
+def import_versions(
+    records: Iterable[Dict[str, Any]],
+    mode: str = "skip",
+    batch_size: int = IMPORT_BATCH_SIZE,
+    progress: Optional[Callable[[Dict[str, int]], None]] = None
+) -> Dict[str, int]:
+    """
+    Import dump records in batches (one transaction each)
+
+    mode "skip" keeps versions that already exist, "upsert" replaces them. progress is
+    called with the running counts after every batch. Raises ValueError for an unknown mode.
+    """
+    if mode not in IMPORT_MODES:
+        raise ValueError(f"Invalid import mode: {mode}")
+    counts = {"events": 0, "chains": 0, "updated": 0, "skipped": 0, "invalid": 0}
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) < batch_size:
+            continue
+        for name, count in _import_batch(batch, mode).items():
+            counts[name] += count
+        batch = []
+        if progress:
+            progress(dict(counts))
+    if batch:
+        for name, count in _import_batch(batch, mode).items():
+            counts[name] += count
+        if progress:
+            progress(dict(counts))
+    return counts
+
+# ============= Blob store =============
+
+def get_blob(blob_hash: str) -> Optional[Dict[str, Any]]:
+    """Get a stored image by content hash"""
+    try:
+        with read_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT mime_type, data FROM blobs WHERE hash = ?", (blob_hash,))
+            row = cursor.fetchone()
+        if row:
+            return {"mime_type": row[0], "data": bytes(row[1])}
+        return None
+    except Exception as e:
+        print(f"Error getting blob {blob_hash}: {e}")
+        return None
+
+def rehydrate_image_urls(image_urls: Optional[List[str]]) -> Optional[List[str]]:
+    """Turn blob references back into data URLs (for the LLM providers)"""
+    if not image_urls:
+        return image_urls
+    
+    hashes = [h for h in (blob_hash_from_url(url) for url in image_urls) if h]
+    if not hashes:
+        return image_urls
+    
+    with read_connection() as conn:
+        blobs = load_blobs(conn.cursor(), hashes)
+    
+    rehydrated = []
+    for url in image_urls:
+        blob_hash = blob_hash_from_url(url)
+        if blob_hash and blob_hash in blobs:
+            rehydrated.append(to_data_url(*blobs[blob_hash]))
+        else:
+            if blob_hash:
+                print(f"Warning: blob {blob_hash} not found, passing reference through")
+            rehydrated.append(url)
+    return rehydrated
+
+def migrate_inline_images(batch_size: int = 200) -> Dict[str, int]:
+    """
+    Move inline data URL images of existing rows into the blob store
+
+    Runs in batches (one transaction per batch) and is safe to re-run:
+    rows without inline images are skipped by the LIKE filter.
+    """
+    counts = {"evaluation_versions": 0, "chain_versions": 0}
+    
+    last_id = 0
+    while True:
+        with write_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT id, image_urls FROM evaluation_versions
+                WHERE id > ? AND image_urls LIKE '%data:%'
+                ORDER BY id LIMIT ?
+            """, (last_id, batch_size))
+            rows = cursor.fetchall()
+            for row in rows:
+                image_urls = store_image_urls(cursor, serializer.loads(row[1]))
+                cursor.execute("UPDATE evaluation_versions SET image_urls = ? WHERE id = ?",
+                               (serializer.dumps(image_urls), row[0]))
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        counts["evaluation_versions"] += len(rows)
+        print(f"Migrated images for {counts['evaluation_versions']} evaluation versions...")
+    
+    last_id = 0
+    while True:
+        with write_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT id, chain_events FROM chain_versions
+                WHERE id > ? AND chain_events LIKE '%data:%' AND typeof(chain_events) = 'text'
+                ORDER BY id LIMIT ?
+            """, (last_id, batch_size))
+            rows = cursor.fetchall()
+            for row in rows:
+                chain_events = store_event_images(cursor, serializer.loads(row[1]))
+                cursor.execute("UPDATE chain_versions SET chain_events = ? WHERE id = ?",
+                               (_encode_json(chain_events), row[0]))
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        counts["chain_versions"] += len(rows)
+        print(f"Migrated images for {counts['chain_versions']} chain versions...")
+    
+    return counts
+
+def _collect_blob_refs(cursor, referenced: set, after_ids: Optional[Dict[str, int]] = None):
+    """
+    Add the blob hashes referenced by the version tables behind cursor (hot or archive)
+
+    after_ids: only look at rows with a higher id than {table: id} (rows written since then)
+    """
+    after_ids = after_ids or {}
+    cursor.execute("""
+        SELECT image_urls FROM evaluation_versions WHERE image_urls LIKE '%/api/blobs/%' AND id > ?
+    """, (after_ids.get("evaluation_versions", 0),))
+    for row in cursor.fetchall():
+        referenced.update(h for h in (blob_hash_from_url(u) for u in serializer.loads(row[0])) if h)
+    # Compressed rows cannot be filtered with LIKE, so they are always decoded
+    cursor.execute("""
+        SELECT chain_events FROM chain_versions
+        WHERE (typeof(chain_events) = 'blob' OR chain_events LIKE '%/api/blobs/%') AND id > ?
+    """, (after_ids.get("chain_versions", 0),))
+    for row in cursor.fetchall():
+        for event in _decode_json(row[0], []):
+            if isinstance(event, dict):
+                referenced.update(h for h in (blob_hash_from_url(u) for u in event.get("user_images") or []) if h)
+    cursor.execute("""
+        SELECT event FROM chain_steps
+        WHERE (typeof(event) = 'blob' OR event LIKE '%/api/blobs/%') AND id > ?
+    """, (after_ids.get("chain_steps", 0),))
+    for row in cursor.fetchall():
+        event = _decode_json(row[0], {})
+        referenced.update(h for h in (blob_hash_from_url(u) for u in event.get("user_images") or []) if h)
+
+def delete_orphan_blobs() -> int:
+    """Delete blobs no longer referenced by any version, hot or archived (e.g. after deletes)"""
+    referenced = set()
+    with read_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT hash FROM blobs")
+        hashes = [row[0] for row in cursor.fetchall()]
+        scanned_ids = {table: _max_id(cursor, table)
+                       for table in ("evaluation_versions", "chain_versions", "chain_steps")}
+        _collect_blob_refs(cursor, referenced)
+    # Archives after the hot tables: rows archived in between are then still seen
+    store = _archive_store()
+    for month in store.months():
+        with store.reader(month) as archive:
+            _collect_blob_refs(archive.cursor(), referenced)
+    orphans = [h for h in hashes if h not in referenced]
+    
+    if orphans:
+        with write_connection() as conn:
+            cursor = conn.cursor()
+            # A save since the scan may have reused an orphan (its blobs row is INSERT OR
+            # IGNOREd, so nothing marks it): check the rows written since, under the write lock
+            _collect_blob_refs(cursor, referenced, scanned_ids)
+            orphans = [h for h in orphans if h not in referenced]
+            cursor.executemany("DELETE FROM blobs WHERE hash = ?", [(h,) for h in orphans])
+    print(f"Deleted {len(orphans)} orphaned blobs")
+    return len(orphans)
+
+# ============= Compression =============
+
+# Columns stored through the compression codec (rating and image_urls stay plain JSON)
+COMPRESSED_COLUMNS = {
+    "evaluation_versions": ["user_prompt", "assistant_response", "metadata"],
+    "chain_versions": ["chain_events", "metadata"],
+    "chain_steps": ["event"],
+}
+
+def train_compression_dict(sample_limit: int = 2000, dict_size: int = compression.DICT_SIZE) -> Optional[int]:
+    """
+    Train a zstd dictionary on the most recent stored values and make it the active one
+
+    Older dictionaries are kept, so rows compressed with them still decode.
+    Returns the new dictionary ID (None if training was not possible).
+    """
+    samples = []
+    with read_connection() as conn:
+        cursor = conn.cursor()
+        for table, columns in COMPRESSED_COLUMNS.items():
+            for column in columns:
+                cursor.execute(f"""
+                    SELECT {column} FROM {table}
+                    WHERE {column} IS NOT NULL
+                    ORDER BY id DESC LIMIT ?
+                """, (sample_limit,))
+                for row in cursor.fetchall():
+                    text = _decode_text(row[0])
+                    if text and len(text) >= compression.COMPRESSION_MIN_SIZE:
+                        samples.append(text.encode("utf-8"))
+
+    trained = compression.train_dict(samples, dict_size)
+    if trained is None:
+        return None
+
+    dict_id = trained.dict_id()
+    with write_connection() as conn:
+        conn.execute("""
+            INSERT OR IGNORE INTO compression_dicts (dict_id, data, sample_count)
+            VALUES (?, ?, ?)
+        """, (dict_id, trained.as_bytes(), len(samples)))
+    compression.register_dict(dict_id, trained.as_bytes(), active=True)
+    print(f"Trained compression dictionary {dict_id} from {len(samples)} samples")
+    return dict_id
+
+def backfill_compression(batch_size: int = 200, recompress: bool = False, decompress: bool = False) -> Dict[str, int]:
+    """
+    Re-encode stored values with the current codec settings, in batches
+
+    By default only plain text values are compressed. recompress=True also re-encodes
+    values compressed with an older dictionary; decompress=True turns everything back
+    into plain text (e.g. before uninstalling zstandard). Safe to re-run.
+    """
+    if not decompress and not compression.COMPRESSION_ENABLED:
+        print("Compression is disabled (zstandard not installed or DB_COMPRESSION=off)")
+        return {}
+
+    active_dict_id = compression.active_dict_id() or 0
+    counts = {}
+    for table, columns in COMPRESSED_COLUMNS.items():
+        counts[table] = 0
+        last_id = 0
+        while True:
+            with write_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(f"""
+                    SELECT id, {", ".join(columns)} FROM {table}
+                    WHERE id > ? ORDER BY id LIMIT ?
+                """, (last_id, batch_size))
+                rows = cursor.fetchall()
+                for row in rows:
+                    for column in columns:
+                        value = row[column]
+                        if value is None:
+                            continue
+                        if decompress:
+                            if isinstance(value, str):
+                                continue
+                            new_value = _decode_text(value)
+                        elif isinstance(value, str):
+                            new_value = compression.encode_text(value)
+                            if new_value is value:
+                                continue
+                        elif recompress and compression.frame_dict_id(bytes(value)) != active_dict_id:
+                            new_value = compression.encode_text(_decode_text(value))
+                        else:
+                            continue
+                        cursor.execute(f"UPDATE {table} SET {column} = ? WHERE id = ?", (new_value, row["id"]))
+                        counts[table] += 1
+            if not rows:
+                break
+            last_id = rows[-1]["id"]
+            print(f"Processed {table} up to id {last_id} ({counts[table]} values re-encoded)...")
+
+    return counts
+
+def get_compression_stats() -> Dict[str, Any]:
+    """Stored size of each compressed column, split into compressed and plain values"""
+    stats = {"available": compression.available(), "enabled": compression.COMPRESSION_ENABLED,
+             "active_dict_id": compression.active_dict_id(), "columns": {}}
+    try:
+        with read_connection() as conn:
+            cursor = conn.cursor()
+            for table, columns in COMPRESSED_COLUMNS.items():
+                for column in columns:
+                    cursor.execute(f"""
+                        SELECT typeof({column}) AS kind, COUNT(*), SUM(length(CAST({column} AS BLOB)))
+                        FROM {table} WHERE {column} IS NOT NULL
+                        GROUP BY kind
+                    """)
+                    stats["columns"][f"{table}.{column}"] = {
+                        ("compressed" if row[0] == "blob" else "plain"): {"values": row[1], "bytes": row[2] or 0}
+                        for row in cursor.fetchall()
+                    }
+        return stats
+    except Exception as e:
+        print(f"Error getting compression stats: {e}")
+        return stats
+
+def vacuum_database() -> bool:
+    """Rebuild the database file so pages freed by deletes/compression go back to the filesystem"""
+    db_path = get_pool(DB_PATH).db_path
+    try:
+        print(f"Running VACUUM on {db_path}...")
+        before = os.path.getsize(db_path)
+        # VACUUM cannot run inside a transaction, so it gets its own autocommit connection.
+        # It also switches older files to incremental auto_vacuum (see run_maintenance_step).
+        conn = sqlite3.connect(db_path, timeout=10.0, isolation_level=None)
+        try:
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("VACUUM")
+        finally:
             conn.close()
+        print(f"✅ VACUUM done: {before} -> {os.path.getsize(db_path)} bytes")
+        return True
+    except Exception as e:
+        print(f"Error running VACUUM: {e}")
+        return False
+
+# ============= Maintenance =============
+# Run by the background scheduler in async_db (run_maintenance_step) and by
+# manage.py maintenance. Every step is cheap when there is nothing to do.
+
+# WAL size that triggers a PASSIVE checkpoint (copies pages back without waiting for readers)
+WAL_CHECKPOINT_BYTES = int(os.getenv("WAL_CHECKPOINT_BYTES", str(16 * 1024 * 1024)))
+
+# WAL size that triggers a TRUNCATE checkpoint (also shrinks the -wal file to zero)
+WAL_TRUNCATE_BYTES = int(os.getenv("WAL_TRUNCATE_BYTES", str(64 * 1024 * 1024)))
+
+# Free pages (e.g. left by deletes) that trigger an incremental vacuum
+VACUUM_FREE_PAGES = int(os.getenv("VACUUM_FREE_PAGES", "1000"))
+
+# Pages released per incremental vacuum step (bounds how long the writer is held)
+VACUUM_STEP_PAGES = 2000
+
+# Seconds between PRAGMA optimize runs (refreshes planner statistics that went stale)
+OPTIMIZE_INTERVAL = float(os.getenv("OPTIMIZE_INTERVAL", "3600"))
+
+AUTO_VACUUM_MODES = {0: "none", 1: "full", 2: "incremental"}
+
+_last_optimize: Optional[float] = None
+
+def get_storage_metrics() -> Dict[str, Any]:
+    """Database file, WAL file and free-page sizes"""
+    db_path = get_pool(DB_PATH).db_path
+    wal_path = f"{db_path}-wal"
+    try:
+        with read_connection() as conn:
+            page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+            page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+            freelist_count = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            auto_vacuum = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+            analyzed = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone() is not None
+        return {
+            "db_path": db_path,
+            "db_size_bytes": os.path.getsize(db_path) if os.path.exists(db_path) else 0,
+            "wal_size_bytes": os.path.getsize(wal_path) if os.path.exists(wal_path) else 0,
+            "page_size": page_size,
+            "page_count": page_count,
+            "free_pages": freelist_count,
+            "free_bytes": freelist_count * page_size,
+            "auto_vacuum": AUTO_VACUUM_MODES.get(auto_vacuum, auto_vacuum),
+            "analyzed": analyzed,
+        }
+    except Exception as e:
+        print(f"Error getting storage metrics: {e}")
+        return {"db_path": db_path}
+
+def checkpoint_wal(mode: str = "PASSIVE") -> Optional[Dict[str, int]]:
+    """Checkpoint the WAL (PASSIVE, FULL, RESTART or TRUNCATE); None on error"""
+    if mode not in ("PASSIVE", "FULL", "RESTART", "TRUNCATE"):
+        raise ValueError(f"Invalid checkpoint mode: {mode}")
+    try:
+        with get_pool(DB_PATH).maintenance() as conn:
+            busy, wal_pages, checkpointed = conn.execute(f"PRAGMA wal_checkpoint({mode})").fetchone()
+        return {"busy": busy, "wal_pages": wal_pages, "checkpointed": checkpointed}
+    except Exception as e:
+        print(f"Error checkpointing WAL ({mode}): {e}")
+        return None
+
+def incremental_vacuum(max_pages: int = VACUUM_STEP_PAGES) -> int:
+    """Return up to max_pages free pages to the filesystem; returns pages released (0 unless auto_vacuum=incremental)"""
+    try:
+        with get_pool(DB_PATH).maintenance() as conn:
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                return 0
+            before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            # execute() steps the pragma only once (one page); executescript runs it to completion
+            conn.executescript(f"PRAGMA incremental_vacuum({int(max_pages)})")
+            return before - conn.execute("PRAGMA freelist_count").fetchone()[0]
+    except Exception as e:
+        print(f"Error running incremental vacuum: {e}")
+        return 0
+
+def optimize_database(full: bool = False) -> bool:
+    """Refresh query planner statistics: ANALYZE when there are none yet (or full=True), else PRAGMA optimize"""
+    global _last_optimize
+    try:
+        with get_pool(DB_PATH).maintenance() as conn:
+            analyzed = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone()
+            conn.execute("ANALYZE" if full or not analyzed else "PRAGMA optimize")
+            if conn.in_transaction:
+                conn.commit()
+        _last_optimize = time.monotonic()
+        return True
+    except Exception as e:
+        print(f"Error optimizing database: {e}")
+        return False
+
+def run_maintenance_step(force: bool = False) -> Dict[str, Any]:
+    """
+    One round of maintenance: release free pages, refresh statistics when due and
+    checkpoint the WAL past its thresholds (last, so it also covers the pages the
+    other two wrote). force runs every task regardless (vacuum all free pages,
+    ANALYZE, TRUNCATE checkpoint). Returns the actions taken.
+    """
+    actions = {}
+    metrics = get_storage_metrics()
+    free_pages = metrics.get("free_pages", 0)
+    if metrics.get("auto_vacuum") == "incremental" and free_pages and (force or free_pages >= VACUUM_FREE_PAGES):
+        released = 0
+        while True:
+            step = incremental_vacuum(VACUUM_STEP_PAGES)
+            released += step
+            if not force or step < VACUUM_STEP_PAGES:
+                break
+        actions["vacuumed_pages"] = released
+    
+    if force or _last_optimize is None or time.monotonic() - _last_optimize >= OPTIMIZE_INTERVAL:
+        actions["optimized"] = optimize_database(full=force)
+    
+    wal_path = f"{get_pool(DB_PATH).db_path}-wal"
+    wal_size = os.path.getsize(wal_path) if os.path.exists(wal_path) else 0
+    if force or wal_size >= WAL_TRUNCATE_BYTES:
+        actions["checkpoint"] = {"mode": "TRUNCATE", **(checkpoint_wal("TRUNCATE") or {})}
+    elif wal_size >= WAL_CHECKPOINT_BYTES:
+        actions["checkpoint"] = {"mode": "PASSIVE", **(checkpoint_wal("PASSIVE") or {})}
+    return actions
 
 # Settings Management
+
+# Seconds a cached settings snapshot is trusted before settings_version is re-checked
+# (writes in this process invalidate it once they commit; this bounds staleness across workers)
+SETTINGS_CHECK_INTERVAL = 2.0
+
+_settings_lock = threading.Lock()
+_settings_cache: Optional[Dict[str, str]] = None
+_settings_cache_version: Optional[int] = None
+_settings_checked_at = 0.0
+
+def _invalidate_settings_cache():
+    """Force the next settings read to reload from the database"""
+    global _settings_cache, _settings_checked_at
+    with _settings_lock:
+        _settings_cache = None
+        _settings_checked_at = 0.0
+
+def _bump_settings_version(cursor):
+    cursor.execute("UPDATE settings_version SET version = version + 1 WHERE id = 1")
+
+def load_settings_cache() -> Dict[str, str]:
+    """
+    Current settings (key -> value), served from memory
+
+    The snapshot is reused for SETTINGS_CHECK_INTERVAL seconds; after that one
+    single-row read of settings_version decides whether it has to be reloaded.
+    """
+    global _settings_cache, _settings_cache_version, _settings_checked_at
+    now = time.monotonic()
+    with _settings_lock:
+        if _settings_cache is not None and now - _settings_checked_at < SETTINGS_CHECK_INTERVAL:
+            return _settings_cache
+        cached, cached_version = _settings_cache, _settings_cache_version
+
+    try:
+        with read_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT version FROM settings_version WHERE id = 1")
+            row = cursor.fetchone()
+            version = row[0] if row else 0
+            if cached is not None and version == cached_version:
+                settings = cached
+            else:
+                cursor.execute("SELECT key, value FROM settings")
+                settings = {key: value for key, value in cursor.fetchall() if value}
+    except sqlite3.OperationalError:
+        # Tables not created yet (read before init_db) - environment variables only
+        return cached or {}
+
+    with _settings_lock:
+        _settings_cache, _settings_cache_version, _settings_checked_at = settings, version, now
+    return settings
+
 def get_setting(key: str, default: Optional[str] = None) -> Optional[str]:
     """Get a setting value from database, fallback to environment variable"""
-    conn = None
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT value FROM settings WHERE key = ?", (key,))
-        row = cursor.fetchone()
-        if row and row[0]:
-            return row[0]
+        value = load_settings_cache().get(key)
+        if value:
+            return value
         # Fallback to environment variable
         return os.getenv(key, default)
     except Exception as e:
         print(f"Error getting setting {key}: {e}")
         # Fallback to environment variable
         return os.getenv(key, default)
-    finally:
-        if conn:
-            conn.close()
 
 
+@retry_on_lock
 def set_setting(key: str, value: str, description: Optional[str] = None) -> bool:
     """Set a setting value in database"""
-    conn = None
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO settings (key, value, description, updated_at)
-            VALUES (?, ?, ?, CURRENT_TIMESTAMP)
-            ON CONFLICT(key) DO UPDATE SET
-                value = excluded.value,
-                description = COALESCE(excluded.description, description),
-                updated_at = CURRENT_TIMESTAMP
-        """, (key, value, description))
-        conn.commit()
+        with write_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO settings (key, value, description, updated_at)
+                VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(key) DO UPDATE SET
+                    value = excluded.value,
+                    description = COALESCE(excluded.description, description),
+                    updated_at = CURRENT_TIMESTAMP
+            """, (key, value, description))
+            _bump_settings_version(cursor)
+            after_commit(_invalidate_settings_cache)
         return True
+    except sqlite3.OperationalError as e:
+        if is_locked_error(e):
+            raise
+        print(f"Error setting {key}: {e}")
+        return False
     except Exception as e:
         print(f"Error setting {key}: {e}")
         return False
-    finally:
-        if conn:
-            conn.close()
 
 
 def get_all_settings() -> Dict[str, Any]:
     """Get all settings as a dictionary"""
-    conn = None
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT key, value, description FROM settings")
-        rows = cursor.fetchall()
+        with read_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT key, value, description FROM settings")
+            rows = cursor.fetchall()
         
         settings = {}
         for row in rows:
@@ -887,59 +3431,78 @@ def get_all_settings() -> Dict[str, Any]:
     except Exception as e:
         print(f"Error getting all settings: {e}")
         return {}
-    finally:
-        if conn:
-            conn.close()
 
 
+@retry_on_lock
 def delete_setting(key: str) -> bool:
     """Delete a setting from database"""
-    conn = None
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM settings WHERE key = ?", (key,))
-        conn.commit()
-        return cursor.rowcount > 0
+        with write_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM settings WHERE key = ?", (key,))
+            deleted = cursor.rowcount > 0
+            if deleted:
+                _bump_settings_version(cursor)
+                after_commit(_invalidate_settings_cache)
+        return deleted
+    except sqlite3.OperationalError as e:
+        if is_locked_error(e):
+            raise
+        print(f"Error deleting setting {key}: {e}")
+        return False
     except Exception as e:
         print(f"Error deleting setting {key}: {e}")
         return False
-    finally:
-        if conn:
-            conn.close()
 
+@retry_on_lock
 def delete_event(event_id: str) -> bool:
     """Delete all versions for an event"""
-    conn = None
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM evaluation_versions WHERE event_id = ?", (event_id,))
-        conn.commit()
-        return cursor.rowcount > 0
+        with write_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM event_summary WHERE event_id = ?", (event_id,))
+            cursor.execute("""
+                DELETE FROM search_index
+                WHERE rowid IN (SELECT id FROM evaluation_versions WHERE event_id = ?)
+            """, (event_id,))
+            cursor.execute("DELETE FROM evaluation_versions WHERE event_id = ?", (event_id,))
+            deleted = cursor.rowcount
+            # Archive copies are removed by prune_archives
+            cursor.execute("DELETE FROM archive_index WHERE kind = 'event' AND key = ?", (event_id,))
+        return deleted + cursor.rowcount > 0
+    except sqlite3.OperationalError as e:
+        if is_locked_error(e):
+            raise
+        print(f"Error deleting event {event_id}: {e}")
+        return False
     except Exception as e:
         print(f"Error deleting event {event_id}: {e}")
         return False
-    finally:
-        if conn:
-            conn.close()
 
+@retry_on_lock
 def delete_chain(trace_id: str) -> bool:
     """Delete all versions for a chain"""
-    conn = None
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM chain_versions WHERE trace_id = ?", (trace_id,))
-        conn.commit()
-        return cursor.rowcount > 0
+        with write_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM chain_summary WHERE trace_id = ?", (trace_id,))
+            cursor.execute("""
+                DELETE FROM search_index
+                WHERE rowid IN (SELECT -id FROM chain_steps WHERE trace_id = ?)
+            """, (trace_id,))
+            cursor.execute("DELETE FROM chain_steps WHERE trace_id = ?", (trace_id,))
+            cursor.execute("DELETE FROM chain_versions WHERE trace_id = ?", (trace_id,))
+            deleted = cursor.rowcount
+            cursor.execute("DELETE FROM archive_index WHERE kind = 'chain' AND key = ?", (trace_id,))
+        return deleted + cursor.rowcount > 0
+    except sqlite3.OperationalError as e:
+        if is_locked_error(e):
+            raise
+        print(f"Error deleting chain {trace_id}: {e}")
+        return False
     except Exception as e:
         print(f"Error deleting chain {trace_id}: {e}")
         return False
-    finally:
-        if conn:
-            conn.close()
-
 
-# Database initialization is called from app/main.py on startup
 
+# Database initialization and pool lifecycle are handled by app/main.py (startup/shutdown)
@@ -0,0 +1,241 @@
+"""SQLite connection pool - per-thread reader connections plus a single writer"""
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional, Callable
+
+# Pragmas applied once when a connection is created (not on every checkout)
+CONNECTION_PRAGMAS = [
+    # Must come before journal_mode: it only takes effect on a database without tables
+    # (existing files are converted by manage.py vacuum)
+    "PRAGMA auto_vacuum=INCREMENTAL",
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=10000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-20000",
+]
+
+# Readers never write, so guard against an accidental implicit transaction
+READER_PRAGMAS = [
+    "PRAGMA query_only=ON",
+]
+
+FALLBACK_DB_PATH = "evaluation_history.db"
+
+
+class ConnectionPool:
+    """
+    Long-lived SQLite connections shared across requests
+
+    - Readers: one connection per thread (threads are bounded by the server/executor)
+    - Writer: a single connection serialized by a lock, committed on success
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._write_lock = threading.RLock()
+        self._write_depth = 0
+        self._after_commit: List[Callable[[], None]] = []
+        self._readers: List[sqlite3.Connection] = []
+        self._writer: Optional[sqlite3.Connection] = None
+        self._generation = 0
+        self._stats = {
+            "reader_hits": 0,
+            "reader_misses": 0,
+            "writer_hits": 0,
+            "writer_misses": 0,
+        }
+
+    def _ensure_directory(self):
+        """Create the database directory once, before the first connection"""
+        db_dir = os.path.dirname(os.path.abspath(self.db_path))
+        if db_dir and db_dir != '.' and not os.path.exists(db_dir):
+            try:
+                os.makedirs(db_dir, exist_ok=True)
+                print(f"Created database directory: {db_dir}")
+            except (OSError, PermissionError) as e:
+                print(f"Warning: Could not create directory {db_dir}: {e}")
+
+    def _open(self, reader: bool) -> sqlite3.Connection:
+        """Open a new connection and apply pragmas once"""
+        if not self._readers and self._writer is None:
+            self._ensure_directory()
+
+        try:
+            conn = sqlite3.connect(self.db_path, timeout=10.0, check_same_thread=False)
+        except Exception as e:
+            print(f"Error connecting to database at {self.db_path}: {e}")
+            # Last resort: try current directory (and keep using it for the rest of the pool)
+            print(f"Falling back to: {FALLBACK_DB_PATH}")
+            self.db_path = FALLBACK_DB_PATH
+            conn = sqlite3.connect(self.db_path, timeout=10.0, check_same_thread=False)
+
+        conn.row_factory = sqlite3.Row
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        if reader:
+            for pragma in READER_PRAGMAS:
+                conn.execute(pragma)
+        return conn
+
+    @contextmanager
+    def reader(self):
+        """Check out this thread's reader connection"""
+        cached = getattr(self._local, "conn", None)
+        if cached is not None and cached[0] == self._generation:
+            conn = cached[1]
+            with self._lock:
+                self._stats["reader_hits"] += 1
+        else:
+            conn = self._open(reader=True)
+            with self._lock:
+                self._readers.append(conn)
+                self._stats["reader_misses"] += 1
+            self._local.conn = (self._generation, conn)
+        yield conn
+
+    @contextmanager
+    def writer(self):
+        """
+        Check out the writer connection
+
+        The outermost block opens a transaction and commits it when it exits cleanly
+        (rolls back on error). Nested writer() blocks in the same thread run inside a
+        SAVEPOINT, so a failing inner block only undoes its own changes - this is what
+        lets the write queue group many independent writes into one commit.
+        """
+        with self._write_lock:
+            if self._writer is None:
+                self._writer = self._open(reader=False)
+                with self._lock:
+                    self._stats["writer_misses"] += 1
+            else:
+                with self._lock:
+                    self._stats["writer_hits"] += 1
+
+            conn = self._writer
+            if self._write_depth == 0 and not conn.in_transaction:
+                conn.execute("BEGIN IMMEDIATE")
+            self._write_depth += 1
+            savepoint = f"sp_{self._write_depth}" if self._write_depth > 1 else None
+            pending = len(self._after_commit)
+            try:
+                if savepoint:
+                    conn.execute(f"SAVEPOINT {savepoint}")
+                yield conn
+                if savepoint:
+                    conn.execute(f"RELEASE {savepoint}")
+                else:
+                    conn.commit()
+            except BaseException:
+                # Callbacks registered by the rolled back writes are dropped with them
+                del self._after_commit[pending:]
+                if savepoint:
+                    conn.execute(f"ROLLBACK TO {savepoint}")
+                    conn.execute(f"RELEASE {savepoint}")
+                else:
+                    conn.rollback()
+                raise
+            finally:
+                self._write_depth -= 1
+            if not savepoint:
+                callbacks, self._after_commit = self._after_commit, []
+                for callback in callbacks:
+                    try:
+                        callback()
+                    except Exception as e:
+                        print(f"Error in after-commit callback: {e}")
+
+    def after_commit(self, callback: Callable[[], None]):
+        """
+        Run callback once the outermost write transaction commits
+
+        Inside a nested writer() block (e.g. a write queue batch) the changes are not
+        visible to readers until then. Called outside a transaction, it runs right away.
+        """
+        with self._write_lock:
+            if self._write_depth:
+                self._after_commit.append(callback)
+                return
+        callback()
+
+    @contextmanager
+    def maintenance(self):
+        """
+        Check out the writer connection outside of any transaction
+
+        For statements that cannot run inside one (checkpoints, incremental vacuum,
+        ANALYZE). Holds the write lock like writer(), so it never interleaves with writes.
+        """
+        with self._write_lock:
+            if self._write_depth:
+                raise RuntimeError("maintenance() cannot be used inside a write transaction")
+            if self._writer is None:
+                self._writer = self._open(reader=False)
+                with self._lock:
+                    self._stats["writer_misses"] += 1
+            yield self._writer
+
+    def close(self):
+        """Close every connection opened by this pool"""
+        with self._write_lock:
+            with self._lock:
+                readers, self._readers = self._readers, []
+                writer, self._writer = self._writer, None
+                # Invalidate thread-local references held by other threads
+                self._generation += 1
+            for conn in readers + ([writer] if writer else []):
+                try:
+                    conn.close()
+                except Exception as e:
+                    print(f"Error closing database connection: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Pool hit/miss counters and open connection counts"""
+        with self._lock:
+            return {
+                **self._stats,
+                "readers_open": len(self._readers),
+                "writer_open": self._writer is not None,
+                "db_path": self.db_path,
+            }
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def init_pool(db_path: str) -> ConnectionPool:
+    """Create the application pool (called on startup; safe to call twice)"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool(db_path)
+            print(f"🔌 Database connection pool created for {db_path}")
+        return _pool
+
+
+def get_pool(db_path: str) -> ConnectionPool:
+    """Get the application pool, creating it lazily if startup has not run yet"""
+    if _pool is not None:
+        return _pool
+    return init_pool(db_path)
+
+
+def close_pool():
+    """Close all pooled connections (called on shutdown)"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            print("🔌 Database connection pool closed")
+            _pool = None
+
+
+def get_pool_stats() -> Dict[str, Any]:
+    """Get pool counters, or an empty dict if the pool was never created"""
+    return _pool.stats() if _pool is not None else {}
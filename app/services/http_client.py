@@ -0,0 +1,107 @@
+"""Shared HTTP client for PostHog - pooled keep-alive connections (HTTP/2 when h2 is installed)"""
+import os
+from typing import Dict, Any, Optional
+
+import httpx
+
+try:
+    import h2  # noqa: F401 - needed by httpx for HTTP/2
+    HTTP2_AVAILABLE = True
+except ImportError:  # optional dependency (httpx[http2]) - HTTP/1.1 keep-alive without it
+    HTTP2_AVAILABLE = False
+
+# Set HTTP2=off to stay on HTTP/1.1 even when h2 is installed
+HTTP2_ENABLED = HTTP2_AVAILABLE and os.getenv("HTTP2", "on").lower() != "off"
+
+# Pool limits: connections kept open between requests, and the overall cap
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "20"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "10"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+
+# Default timeouts (seconds); calls can pass their own read timeout
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "10"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "60"))
+HTTP_POOL_TIMEOUT = float(os.getenv("HTTP_POOL_TIMEOUT", "10"))
+
+_client: Optional[httpx.AsyncClient] = None
+_stats = {
+    "requests": 0,
+    "errors": 0,
+    "new_connections": 0,
+    "tls_handshakes": 0,
+    "http_versions": {},
+}
+
+
+def _timeout(read: Optional[float] = None) -> httpx.Timeout:
+    read = read if read is not None else HTTP_READ_TIMEOUT
+    return httpx.Timeout(read, connect=HTTP_CONNECT_TIMEOUT, pool=HTTP_POOL_TIMEOUT)
+
+
+def init_client() -> httpx.AsyncClient:
+    """Create the shared client (called on startup; safe to call twice)"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            http2=HTTP2_ENABLED,
+            timeout=_timeout(),
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+            ),
+        )
+        print(f"🌐 HTTP client created (HTTP/2: {'on' if HTTP2_ENABLED else 'off'}, "
+              f"max connections: {HTTP_MAX_CONNECTIONS})")
+    return _client
+
+
+async def close_client():
+    """Close the shared client and its connections (called on shutdown)"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+        print("🌐 HTTP client closed")
+
+
+async def _trace(event_name: str, info: Dict[str, Any]):
+    # httpcore trace events; a request on a pooled connection emits neither of these
+    if event_name == "connection.connect_tcp.complete":
+        _stats["new_connections"] += 1
+    elif event_name == "connection.start_tls.complete":
+        _stats["tls_handshakes"] += 1
+
+
+async def request(method: str, url: str, timeout: Optional[float] = None, **kwargs) -> httpx.Response:
+    """Send a request on the shared client (timeout: read timeout in seconds)"""
+    client = init_client()
+    _stats["requests"] += 1
+    try:
+        response = await client.request(method, url, timeout=_timeout(timeout),
+                                        extensions={"trace": _trace}, **kwargs)
+    except httpx.HTTPError:
+        _stats["errors"] += 1
+        raise
+    versions = _stats["http_versions"]
+    versions[response.http_version] = versions.get(response.http_version, 0) + 1
+    return response
+
+
+def get_stats() -> Dict[str, Any]:
+    """Request/connection counters and the current pool size"""
+    stats = {
+        **_stats,
+        "http_versions": dict(_stats["http_versions"]),
+        "reused_connections": max(_stats["requests"] - _stats["errors"] - _stats["new_connections"], 0),
+        "http2": HTTP2_ENABLED,
+        "max_connections": HTTP_MAX_CONNECTIONS,
+        "max_keepalive_connections": HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        "open_connections": 0,
+    }
+    # The transport's connection pool is not public API; report 0 if it moves
+    pool = getattr(getattr(_client, "_transport", None), "_pool", None)
+    connections = getattr(pool, "connections", None)
+    if connections is not None:
+        stats["open_connections"] = len(connections)
+    return stats
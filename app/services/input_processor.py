@@ -1,4 +1,5 @@
 """Service for processing various input types (JSON, Event ID, Trace ID)"""
+import asyncio
 import json
 import logging
 import traceback
@@ -8,12 +9,12 @@ from typing import Dict, Any, Optional, List
 from fastapi import HTTPException
 from fastapi.responses import JSONResponse
 
-from app.utils.validators import is_valid_json, is_event_id, is_trace_id
-from app.services.posthog import fetch_event, fetch_prompt_chain, extract_conversation_data, process_chain_data
-from app.services.database import (
-    event_exists_in_db, get_initial_version_by_event,
-    trace_exists_in_db, get_initial_chain_by_trace, save_chain_version
+from app.utils.validators import parse_json, NOT_JSON, is_event_id, is_trace_id
+from app.services.posthog import (
+    fetch_event, fetch_events, fetch_prompt_chain, extract_conversation_data, process_chain_data,
+    build_initial_version, save_initial_version, POSTHOG_BATCH_SIZE
 )
+from app.services import async_db
 
 logger = logging.getLogger(__name__)
 
@@ -372,8 +373,111 @@ def process_json_as_chain(data: Any, trace_id: str) -> Dict[str, Any]:
     raise ValueError("Unable to process JSON as chain - invalid structure")
 
 
-async def process_input(input_text: str) -> Dict[str, Any]:
-    """Auto-detect and process input (JSON or Event ID or Trace ID)"""
+def formatted_from_initial_version(initial_version: Dict[str, Any], event_id: str) -> Dict[str, Any]:
+    """Rebuild extract_conversation_data output from a stored initial version"""
+    formatted_data = {
+        "user_prompt": initial_version.get("user_prompt", ""),
+        "user_images": initial_version.get("image_urls", []),
+        "assistant_response": initial_version.get("assistant_response", {}),
+        "metadata": initial_version.get("metadata", {}),
+        "raw_properties": {}  # Not stored in DB, but not critical
+    }
+    
+    # Ensure metadata has required fields
+    if not formatted_data["metadata"].get("event_id"):
+        formatted_data["metadata"]["event_id"] = event_id
+    
+    return formatted_data
+
+
+async def process_event_ids(event_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Load many events at once: stored ones from the database, the rest from PostHog in
+    a few batched HogQL queries (fetch_events)
+
+    New initial versions are saved in one transaction. Returns {event_id: {"data": ...}
+    or {"error": ...}} for every requested ID; a failed PostHog query only fails its own batch.
+    """
+    event_ids = list(dict.fromkeys(event_id.strip().lower() for event_id in event_ids))
+    results = {}
+    
+    stored = await async_db.get_initial_versions_by_events(event_ids)
+    for event_id, initial_version in stored.items():
+        results[event_id.lower()] = {"data": formatted_from_initial_version(initial_version, event_id)}
+    missing = [event_id for event_id in event_ids if event_id not in results]
+    logger.info(f"Batch of {len(event_ids)} events: {len(results)} from database, {len(missing)} from PostHog")
+    if not missing:
+        return results
+    
+    batches = [missing[i:i + POSTHOG_BATCH_SIZE] for i in range(0, len(missing), POSTHOG_BATCH_SIZE)]
+    outcomes = await asyncio.gather(*(fetch_events(batch) for batch in batches), return_exceptions=True)
+    fetched = {}
+    for batch, outcome in zip(batches, outcomes):
+        if isinstance(outcome, HTTPException):
+            logger.error(f"PostHog batch of {len(batch)} events failed: {outcome.detail}")
+            results.update({event_id: {"error": outcome.detail} for event_id in batch})
+        elif isinstance(outcome, Exception):
+            logger.error(f"PostHog batch of {len(batch)} events failed: {str(outcome)}")
+            results.update({event_id: {"error": f"Error fetching event: {str(outcome)}"} for event_id in batch})
+        elif isinstance(outcome, BaseException):
+            raise outcome
+        else:
+            fetched.update(outcome)
+    
+    initial_versions = []
+    for event_id in missing:
+        if event_id in results:
+            continue
+        event_data = fetched.get(event_id)
+        if event_data is None:
+            results[event_id] = {"error": "Event not found in PostHog"}
+            continue
+        try:
+            formatted_data = extract_conversation_data(event_data)
+        except Exception as e:
+            logger.error(f"Error extracting event {event_id}: {str(e)}")
+            results[event_id] = {"error": f"Error processing event: {str(e)}"}
+            continue
+        results[event_id] = {"data": formatted_data}
+        initial_version = build_initial_version(event_data, formatted_data)
+        if initial_version is not None:
+            initial_versions.append(initial_version)
+    
+    if initial_versions:
+        saved = await async_db.save_versions(initial_versions)
+        logger.info(f"Auto-saved {saved} of {len(initial_versions)} initial versions")
+    return results
+
+
+async def process_inputs(inputs: List[str]) -> List[Dict[str, Any]]:
+    """
+    Process several inputs; event IDs are looked up together (process_event_ids),
+    anything else goes through process_input one by one
+
+    Returns one {"input", "data"} or {"input", "error"} entry per input, in order.
+    """
+    event_ids = [text.strip() for text in inputs if is_event_id(text)]
+    events = await process_event_ids(event_ids) if event_ids else {}
+    
+    results = []
+    for text in inputs:
+        if is_event_id(text):
+            result = events[text.strip().lower()]
+        else:
+            try:
+                result = {"data": await process_input(text)}
+            except HTTPException as e:
+                result = {"error": e.detail}
+        results.append({"input": text, **result})
+    return results
+
+
+async def process_input(input_text: str, force_refresh: bool = False) -> Dict[str, Any]:
+    """
+    Auto-detect and process input (JSON or Event ID or Trace ID)
+
+    force_refresh: fetch event/trace IDs from PostHog even when they are stored or cached
+    """
     logger.info("="*60)
     logger.info("Processing input request")
     logger.info("="*60)
@@ -387,12 +491,11 @@ async def process_input(input_text: str) -> Dict[str, Any]:
             logger.warning("Empty input received")
             raise HTTPException(status_code=400, detail="Input is empty")
         
-        # Check if it's valid JSON
-        if is_valid_json(input_text):
+        # Check if it's valid JSON (parsed once, here)
+        parsed_data = parse_json(input_text)
+        if parsed_data is not NOT_JSON:
             logger.info("Input detected as JSON")
             try:
-                logger.debug(f"Parsing JSON (first 200 chars): {input_text[:200]}")
-                parsed_data = json.loads(input_text)
                 logger.info("JSON parsed successfully")
                 logger.debug(f"Parsed data keys: {list(parsed_data.keys()) if isinstance(parsed_data, dict) else 'Not a dict'}")
                 
@@ -421,7 +524,8 @@ async def process_input(input_text: str) -> Dict[str, Any]:
                         total_output = chain_data["metadata"]["total_tokens"]["output"]
                         total_cost = chain_data["metadata"]["total_cost"]
                         
-                        save_chain_version(
+                        status = await async_db.save_version_once(
+                            "chain",
                             version_id=version_id,
                             trace_id=trace_id,
                             chain_name=chain_data["chain_name"],
@@ -431,7 +535,7 @@ async def process_input(input_text: str) -> Dict[str, Any]:
                             total_cost=total_cost,
                             metadata=chain_data["metadata"]
                         )
-                        logger.info("Initial chain version saved to database")
+                        logger.info(f"Initial chain version {version_id}: {status}")
                     except Exception as e:
                         logger.warning(f"Failed to save initial chain version: {str(e)}")
                     
@@ -440,15 +544,12 @@ async def process_input(input_text: str) -> Dict[str, Any]:
                     logger.info("JSON detected as single event data")
                     # Process as single event
                     formatted_data = extract_conversation_data(parsed_data)
+                    await save_initial_version(parsed_data, formatted_data)
                     logger.info("Data extraction completed successfully")
                     logger.info(f"Extracted - User images: {len(formatted_data.get('user_images', []))}, "
                               f"Has response: {bool(formatted_data.get('assistant_response'))}")
                     
                     return formatted_data
-            except json.JSONDecodeError as e:
-                logger.error(f"JSON decode error: {str(e)}")
-                logger.error(f"Error at position: {e.pos if hasattr(e, 'pos') else 'unknown'}")
-                raise HTTPException(status_code=400, detail=f"Invalid JSON format: {str(e)}")
             except Exception as e:
                 logger.error(f"Error parsing JSON data: {str(e)}")
                 logger.error(f"Exception type: {type(e).__name__}")
@@ -462,23 +563,14 @@ async def process_input(input_text: str) -> Dict[str, Any]:
             
             # First, check if event exists in database
             logger.info(f"Checking if event {event_id} exists in database...")
-            if event_exists_in_db(event_id):
+            if force_refresh:
+                logger.info(f"Force refresh: fetching event {event_id} from PostHog")
+            elif await async_db.event_exists_in_db(event_id):
                 logger.info(f"Event {event_id} found in database, loading from DB")
                 try:
-                    initial_version = get_initial_version_by_event(event_id)
+                    initial_version = await async_db.get_initial_version_by_event(event_id)
                     if initial_version:
-                        # Reconstruct formatted_data from database version
-                        formatted_data = {
-                            "user_prompt": initial_version.get("user_prompt", ""),
-                            "user_images": initial_version.get("image_urls", []),
-                            "assistant_response": initial_version.get("assistant_response", {}),
-                            "metadata": initial_version.get("metadata", {}),
-                            "raw_properties": {}  # Not stored in DB, but not critical
-                        }
-                        
-                        # Ensure metadata has required fields
-                        if not formatted_data["metadata"].get("event_id"):
-                            formatted_data["metadata"]["event_id"] = event_id
+                        formatted_data = formatted_from_initial_version(initial_version, event_id)
                         
                         logger.info("Data loaded from database successfully")
                         logger.info(f"Loaded - User images: {len(formatted_data.get('user_images', []))}, "
@@ -496,11 +588,12 @@ async def process_input(input_text: str) -> Dict[str, Any]:
             
             # Event not in DB or DB load failed, fetch from PostHog
             try:
-                event_data = await fetch_event(event_id)
+                event_data = await fetch_event(event_id, force_refresh=force_refresh)
                 logger.info("Event data fetched successfully from PostHog")
                 logger.debug(f"Event data keys: {list(event_data.keys()) if isinstance(event_data, dict) else 'Not a dict'}")
                 
                 formatted_data = extract_conversation_data(event_data)
+                await save_initial_version(event_data, formatted_data)
                 logger.info("Data extraction completed successfully")
                 logger.info(f"Extracted - User images: {len(formatted_data.get('user_images', []))}, "
                           f"Has response: {bool(formatted_data.get('assistant_response'))}")
@@ -520,43 +613,15 @@ async def process_input(input_text: str) -> Dict[str, Any]:
             trace_id = input_text
             
             # Check if chain exists in database
-            if trace_exists_in_db(trace_id):
+            if force_refresh:
+                logger.info(f"Force refresh: fetching chain {trace_id} from PostHog")
+            elif await async_db.trace_exists_in_db(trace_id):
                 logger.info(f"Chain {trace_id} found in database, loading from DB")
                 try:
-                    chain_data = get_initial_chain_by_trace(trace_id)
+                    chain_data = await async_db.get_initial_chain_by_trace(trace_id)
                     if chain_data:
-                        # Reconstruct enhanced metadata from events
-                        events = chain_data["chain_events"]
-                        total_latency = 0.0
-                        providers = set()
-                        models = set()
-                        
-                        for event in events:
-                            # Collect providers and models
-                            if event.get("model"):
-                                models.add(event["model"])
-                                
-                                # Determine provider from model
-                                model = event["model"].lower()
-                                if "gpt" in model:
-                                    providers.add("openai")
-                                elif "claude" in model:
-                                    providers.add("anthropic")
-                                elif "gemini" in model:
-                                    providers.add("gemini")
-                            
-                            # Sum latency
-                            metrics = event.get("metrics", {})
-                            if metrics.get("latency"):
-                                try:
-                                    latency_val = metrics["latency"]
-                                    if isinstance(latency_val, str):
-                                        latency_float = float(latency_val.replace('s', ''))
-                                    else:
-                                        latency_float = float(latency_val)
-                                    total_latency += latency_float
-                                except (ValueError, TypeError):
-                                    pass
+                        # Latency, providers and models are computed when the version is saved
+                        total_latency = chain_data["total_latency"]
                         
                         # Use stored metadata if available, otherwise create enhanced metadata
                         stored_metadata = chain_data.get("metadata", {})
@@ -586,9 +651,9 @@ async def process_input(input_text: str) -> Dict[str, Any]:
                                 "total_cost_usd": chain_data["total_cost"],
                                 "latency": f"{total_latency:.2f}s" if total_latency > 0 else "N/A",
                                 "total_latency": total_latency,
-                                "providers": list(providers),
-                                "models": list(models),
-                                "event_count": len(events),
+                                "providers": chain_data["providers"],
+                                "models": chain_data["models"],
+                                "event_count": chain_data["event_count"],
                                 "timestamp": chain_data["created_at"],
                                 "is_chain": True
                             }
@@ -605,7 +670,7 @@ async def process_input(input_text: str) -> Dict[str, Any]:
             
             # Chain not in DB or DB load failed, fetch from PostHog
             try:
-                chain_data = await fetch_prompt_chain(trace_id)
+                chain_data = await fetch_prompt_chain(trace_id, force_refresh=force_refresh)
                 logger.info("Chain data fetched successfully from PostHog")
                 
                 # Auto-save initial chain version
@@ -615,7 +680,8 @@ async def process_input(input_text: str) -> Dict[str, Any]:
                     total_output = chain_data["metadata"]["total_tokens"]["output"]
                     total_cost = chain_data["metadata"]["total_cost"]
                     
-                    save_chain_version(
+                    status = await async_db.save_version_once(
+                        "chain",
                         version_id=version_id,
                         trace_id=trace_id,
                         chain_name=chain_data["chain_name"],
@@ -625,7 +691,7 @@ async def process_input(input_text: str) -> Dict[str, Any]:
                         total_cost=total_cost,
                         metadata=chain_data["metadata"]
                     )
-                    logger.info("Initial chain version saved to database")
+                    logger.info(f"Initial chain version {version_id}: {status}")
                 except Exception as e:
                     logger.warning(f"Failed to save initial chain version: {str(e)}")
                 
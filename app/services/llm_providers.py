@@ -319,6 +319,11 @@ async def generate_response(
 ) -> Dict[str, Any]:
     """Generate response from any provider"""
     try:
+        # Stored images are blob references - providers need the actual image data
+        if image_urls:
+            from app.services import async_db
+            image_urls = await async_db.rehydrate_image_urls(image_urls)
+        
         if provider == "openai":
             return await call_openai(model, prompt, image_urls, response_format)
         elif provider == "anthropic":
@@ -334,32 +339,19 @@ def get_available_models() -> Dict[str, List[str]]:
     """Get all available models grouped by provider (only if API key is set)"""
     available = {}
     
-    # Get API keys from database or environment
+    # Get API keys from the settings cache or environment
     openai_key = get_api_key("OPENAI_API_KEY", "")
     anthropic_key = get_api_key("ANTHROPIC_API_KEY", "")
     gemini_key = get_api_key("GEMINI_API_KEY", "")
     
-    print(f"\n{'='*60}")
-    print("Checking API keys for available providers:")
-    print(f"OpenAI key present: {bool(openai_key)}")
-    print(f"Anthropic key present: {bool(anthropic_key)}")
-    print(f"Gemini key present: {bool(gemini_key)}")
-    print(f"{'='*60}\n")
-    
     if openai_key:
         available["openai"] = MODELS["openai"]
-        print(f"Added OpenAI models: {len(MODELS['openai'])} models")
     
     if anthropic_key:
         available["anthropic"] = MODELS["anthropic"]
-        print(f"Added Anthropic models: {len(MODELS['anthropic'])} models")
     
     if gemini_key:
         available["gemini"] = MODELS["gemini"]
-        print(f"Added Gemini models: {len(MODELS['gemini'])} models")
-    
-    print(f"Total providers available: {len(available)}")
-    print(f"Providers: {list(available.keys())}\n")
     
     return available
 
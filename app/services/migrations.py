@@ -0,0 +1,136 @@
+"""Versioned schema migrations and resumable, batched backfills"""
+import json
+from typing import Dict, Any, List, Optional, Callable
+
+# A migration is (version, name, apply). apply(cursor) runs inside init_db's transaction,
+# must be idempotent (databases created before schema_version existed replay every
+# migration) and should only do fast DDL - bulk data changes are scheduled as backfills.
+#
+# A backfill batch is batch(cursor, state, batch_size) -> (state, processed, done), where
+# state is a JSON-serializable dict. Each batch commits together with its progress row,
+# so a backfill resumes where it stopped after a restart.
+
+
+def ensure_tables(cursor):
+    """Create the bookkeeping tables"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS backfills (
+            name TEXT PRIMARY KEY,
+            status TEXT NOT NULL DEFAULT 'pending',
+            state TEXT,
+            processed INTEGER NOT NULL DEFAULT 0,
+            total INTEGER,
+            error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def current_version(cursor) -> int:
+    """Highest applied migration version (0 = none)"""
+    cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+    return cursor.fetchone()[0]
+
+
+def apply_migrations(cursor, migrations: List[tuple]) -> List[int]:
+    """Apply every migration newer than the current version, in order; returns the versions applied"""
+    ensure_tables(cursor)
+    version = current_version(cursor)
+    applied = []
+    for migration_version, name, apply in sorted(migrations, key=lambda m: m[0]):
+        if migration_version <= version:
+            continue
+        apply(cursor)
+        cursor.execute("INSERT INTO schema_version (version, name) VALUES (?, ?)", (migration_version, name))
+        applied.append(migration_version)
+        print(f"Applied migration {migration_version}: {name}")
+    return applied
+
+
+def schedule_backfill(cursor, name: str, state: Optional[Dict[str, Any]] = None, total: Optional[int] = None):
+    """Queue a backfill (restarts it if it already ran)"""
+    cursor.execute("""
+        INSERT INTO backfills (name, status, state, processed, total)
+        VALUES (?, 'pending', ?, 0, ?)
+        ON CONFLICT(name) DO UPDATE SET
+            status = 'pending',
+            state = excluded.state,
+            processed = 0,
+            total = excluded.total,
+            error = NULL,
+            updated_at = CURRENT_TIMESTAMP
+    """, (name, json.dumps(state or {}), total))
+
+
+def next_backfill(cursor) -> Optional[str]:
+    """Oldest backfill that is not finished (failed ones wait for retry_failed_backfills)"""
+    cursor.execute("""
+        SELECT name FROM backfills
+        WHERE status IN ('pending', 'running')
+        ORDER BY created_at, rowid
+        LIMIT 1
+    """)
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def run_backfill_batch(cursor, name: str, batch: Callable, batch_size: int) -> Dict[str, Any]:
+    """Run one batch of a backfill and record its progress (in the caller's transaction)"""
+    cursor.execute("SELECT state, processed FROM backfills WHERE name = ?", (name,))
+    state_json, processed = cursor.fetchone()
+    state, count, done = batch(cursor, json.loads(state_json or "{}"), batch_size)
+    cursor.execute("""
+        UPDATE backfills
+        SET status = ?, state = ?, processed = ?, updated_at = CURRENT_TIMESTAMP
+        WHERE name = ?
+    """, ("done" if done else "running", json.dumps(state), processed + count, name))
+    return {"name": name, "processed": processed + count, "done": done}
+
+
+def mark_backfill_failed(cursor, name: str, error: str):
+    cursor.execute("""
+        UPDATE backfills SET status = 'failed', error = ?, updated_at = CURRENT_TIMESTAMP
+        WHERE name = ?
+    """, (error, name))
+
+
+def retry_failed_backfills(cursor) -> int:
+    """Put failed backfills back in the queue (they resume from their last committed batch)"""
+    cursor.execute("""
+        UPDATE backfills SET status = 'pending', error = NULL, updated_at = CURRENT_TIMESTAMP
+        WHERE status = 'failed'
+    """)
+    return cursor.rowcount
+
+
+def get_status(cursor) -> Dict[str, Any]:
+    """Applied migrations and backfill progress"""
+    cursor.execute("SELECT version, name, applied_at FROM schema_version ORDER BY version")
+    migrations = [{"version": row[0], "name": row[1], "applied_at": row[2]} for row in cursor.fetchall()]
+    cursor.execute("""
+        SELECT name, status, processed, total, error, created_at, updated_at
+        FROM backfills ORDER BY created_at, rowid
+    """)
+    backfills = [{
+        "name": row[0],
+        "status": row[1],
+        "processed": row[2],
+        "total": row[3],
+        "error": row[4],
+        "created_at": row[5],
+        "updated_at": row[6]
+    } for row in cursor.fetchall()]
+    return {
+        "schema_version": migrations[-1]["version"] if migrations else 0,
+        "migrations": migrations,
+        "backfills": backfills
+    }
@@ -1,12 +1,18 @@
 """PostHog integration service for fetching and processing events and chains"""
 import os
 import json
-import httpx
+import asyncio
 import logging
 import traceback
-from typing import Dict, Any
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Callable, Awaitable
 from fastapi import HTTPException
 
+from app.services import async_db
+from app.services import http_client
+from app.services.response_cache import get_response_cache
+from app.utils.validators import trace_timestamp
+
 logger = logging.getLogger(__name__)
 
 
@@ -25,9 +31,77 @@ def get_posthog_config():
 # Get PostHog credentials from database or environment variables
 POSTHOG_PROJECT_ID, POSTHOG_API_TOKEN = get_posthog_config()
 
+# Bump when a query changes what gets cached, so older cached responses are ignored
+EVENT_CACHE_VERSION = 2
+CHAIN_CACHE_VERSION = 3
+
+# Event IDs per HogQL query in fetch_events
+POSTHOG_BATCH_SIZE = int(os.getenv("POSTHOG_BATCH_SIZE", "100"))
+
+# Rows per HogQL page when fetching a chain, and pages requested at once
+CHAIN_PAGE_SIZE = int(os.getenv("POSTHOG_CHAIN_PAGE_SIZE", "500"))
+CHAIN_FETCH_CONCURRENCY = int(os.getenv("POSTHOG_CHAIN_CONCURRENCY", "4"))
+
+# Chain queries start this long before the timestamp in the trace ID (events may be logged a little early)
+TRACE_WINDOW_SKEW_HOURS = float(os.getenv("POSTHOG_TRACE_WINDOW_SKEW_HOURS", "1"))
+
+
+def _event_cache_key(event_id: str) -> str:
+    """Key of an event as returned by the REST /events/{id}/ endpoint (fetch_event)"""
+    return f"event:{event_id.lower()}:v{EVENT_CACHE_VERSION}"
+
+
+def _event_row_cache_key(event_id: str) -> str:
+    """Key of an event as read by HogQL (fetch_events) - fewer fields than the REST response"""
+    return f"event_row:{event_id.lower()}:v{EVENT_CACHE_VERSION}"
+
+
+def _chain_cache_key(trace_id: str) -> str:
+    return f"chain:{trace_id}:v{CHAIN_CACHE_VERSION}"
+
+
+async def _cache_get_many(keys: List[str]) -> Dict[str, Any]:
+    """Cached responses for the keys that have one (a broken cache only costs misses)"""
+    cache = get_response_cache()
+    if cache is None or not keys:
+        return {}
+    try:
+        found = await async_db.run_in_db_executor(lambda: {key: cache.get(key) for key in keys})
+        return {key: value for key, value in found.items() if value is not None}
+    except Exception as e:
+        logger.warning(f"PostHog cache read failed: {e}")
+        return {}
+
+
+async def _cache_put_many(items: Dict[str, Any]):
+    cache = get_response_cache()
+    if cache is None or not items:
+        return
+    try:
+        await async_db.run_in_db_executor(lambda: [cache.put(key, value) for key, value in items.items()])
+    except Exception as e:
+        logger.warning(f"PostHog cache write failed: {e}")
+
+
+async def _cached(key: str, fetch: Callable[[], Awaitable[Any]], force_refresh: bool = False,
+                  keep: Callable[[Any], bool] = bool) -> Any:
+    """
+    fetch() through the response cache; force_refresh skips the lookup but still
+    stores the fresh response (only responses that pass keep() are stored)
+    """
+    if not force_refresh:
+        cached = await _cache_get_many([key])
+        if key in cached:
+            logger.info(f"PostHog response served from cache: {key}")
+            return cached[key]
+    result = await fetch()
+    if keep(result):
+        await _cache_put_many({key: result})
+    return result
 
-async def fetch_event(event_id: str) -> Dict[str, Any]:
-    """Fetch a single event from PostHog"""
+
+async def fetch_event(event_id: str, force_refresh: bool = False) -> Dict[str, Any]:
+    """Fetch a single event from PostHog (cached; force_refresh bypasses the cache)"""
     project_id, api_token = get_posthog_config()
     
     if not api_token:
@@ -36,73 +110,238 @@ async def fetch_event(event_id: str) -> Dict[str, Any]:
     url = f"https://us.posthog.com/api/projects/{project_id}/events/{event_id}/"
     headers = {"Authorization": f"Bearer {api_token}"}
     
-    logger.info(f"Fetching event from PostHog: {url}")
+    async def fetch() -> Dict[str, Any]:
+        logger.info(f"Fetching event from PostHog: {url}")
+        
+        response = await http_client.request("GET", url, timeout=30.0, headers=headers)
+        
+        if response.status_code != 200:
+            logger.error(f"PostHog API error: {response.status_code}")
+            raise HTTPException(status_code=response.status_code, detail="Failed to fetch event from PostHog")
+        
+        return response.json()
+    
+    return await _cached(_event_cache_key(event_id), fetch, force_refresh)
+
+
+async def _run_hogql(query: str, error_detail: str, timeout: float = 60.0) -> Dict[str, Any]:
+    """Run a HogQL query on the shared client; raises HTTPException(error_detail) on failure"""
+    project_id, api_token = get_posthog_config()
+    
+    url = f"https://us.posthog.com/api/projects/{project_id}/query/"
+    headers = {
+        "Authorization": f"Bearer {api_token}",
+        "Content-Type": "application/json",
+        "Accept": "application/json"
+    }
+    body = {"query": {"kind": "HogQLQuery", "query": query}}
     
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        response = await client.get(url, headers=headers)
+    response = await http_client.request("POST", url, timeout=timeout, headers=headers, json=body)
     
     if response.status_code != 200:
-        logger.error(f"PostHog API error: {response.status_code}")
-        raise HTTPException(status_code=response.status_code, detail="Failed to fetch event from PostHog")
+        logger.error(f"PostHog query error: {response.status_code}")
+        logger.error(f"Response: {response.text[:500]}")
+        raise HTTPException(status_code=response.status_code, detail=error_detail)
     
     return response.json()
 
 
-async def fetch_prompt_chain(trace_id: str) -> Dict[str, Any]:
-    """Fetch prompt chain from PostHog using HogQL query"""
+async def _query_events(event_ids: List[str]) -> List[Dict[str, Any]]:
+    """One HogQL query for a batch of event IDs, rows shaped like the /events/{id}/ response"""
+    uuids = ", ".join("'" + event_id.replace("'", "''") + "'" for event_id in event_ids)
+    result = await _run_hogql(f"""
+        SELECT uuid, event, timestamp, distinct_id, properties
+        FROM events
+        WHERE uuid IN ({uuids})
+        LIMIT {len(event_ids)}
+    """, "Failed to fetch events from PostHog")
+    
+    events = []
+    for row in result.get("results", []):
+        properties = row[4]
+        if isinstance(properties, str):
+            try:
+                properties = json.loads(properties)
+            except json.JSONDecodeError:
+                properties = {}
+        events.append({
+            "id": str(row[0]),
+            "uuid": str(row[0]),
+            "event": row[1],
+            "timestamp": row[2],
+            "distinct_id": row[3],
+            "properties": properties
+        })
+    return events
+
+
+async def fetch_events(event_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Fetch many events with a few HogQL queries (POSTHOG_BATCH_SIZE IDs each) instead
+    of one REST call per event; returns the events found, keyed by event ID
+    """
     project_id, api_token = get_posthog_config()
     
     if not api_token:
         raise HTTPException(status_code=400, detail="POSTHOG_API_TOKEN not set in settings or environment variables")
     
-    url = f"https://us.posthog.com/api/projects/{project_id}/query/"
-    headers = {
-        "Authorization": f"Bearer {api_token}",
-        "Content-Type": "application/json",
-        "Accept": "application/json"
-    }
+    event_ids = list(dict.fromkeys(event_id.lower() for event_id in event_ids))
+    cached = await _cache_get_many([_event_row_cache_key(event_id) for event_id in event_ids])
+    events = {event_id: cached[_event_row_cache_key(event_id)]
+              for event_id in event_ids if _event_row_cache_key(event_id) in cached}
+    missing = [event_id for event_id in event_ids if event_id not in events]
+    if not missing:
+        return events
     
-    # Escape trace_id for SQL query
-    escaped_trace_id = trace_id.replace("'", "''")
+    batches = [missing[i:i + POSTHOG_BATCH_SIZE] for i in range(0, len(missing), POSTHOG_BATCH_SIZE)]
+    logger.info(f"Fetching {len(missing)} events from PostHog in {len(batches)} queries "
+                f"({len(events)} cached)")
     
-    query = {
-        "query": {
-            "kind": "HogQLQuery",
-            "query": f"""
-                SELECT 
-                    uuid, 
-                    event, 
-                    timestamp, 
-                    properties.$ai_model, 
-                    properties.$ai_input, 
-                    properties.$ai_output_choices, 
-                    properties.$ai_input_tokens, 
-                    properties.$ai_output_tokens, 
-                    properties.$ai_total_cost_usd, 
-                    properties.$ai_latency, 
-                    properties.$ai_span_name, 
-                    properties.chain_name, 
-                    properties.promptSchema 
-                FROM events 
-                WHERE properties.$ai_trace_id = '{escaped_trace_id}' 
-                   OR properties.$ai_parent_trace_id = '{escaped_trace_id}' 
-                ORDER BY timestamp ASC
-            """
-        }
-    }
+    results = await asyncio.gather(*(_query_events(batch) for batch in batches))
+    fetched = {event["id"].lower(): event for batch_events in results for event in batch_events}
+    await _cache_put_many({_event_row_cache_key(event_id): event for event_id, event in fetched.items()})
+    return {**events, **fetched}
+
+
+# Columns of a chain row, in the order process_chain_data reads them
+CHAIN_COLUMNS = """
+    uuid, 
+    event, 
+    timestamp, 
+    properties.$ai_model, 
+    properties.$ai_input, 
+    properties.$ai_output_choices, 
+    properties.$ai_input_tokens, 
+    properties.$ai_output_tokens, 
+    properties.$ai_total_cost_usd, 
+    properties.$ai_latency, 
+    properties.$ai_span_name, 
+    properties.chain_name, 
+    properties.promptSchema 
+"""
+
+
+def _time_filter(since: Optional[datetime]) -> str:
+    if since is None:
+        return ""
+    # Explicitly UTC: a bare datetime string is read in the project's timezone
+    return f" AND timestamp >= toDateTime('{since:%Y-%m-%d %H:%M:%S}', 'UTC')"
+
+
+def trace_search_starts(trace_id: str) -> List[Optional[datetime]]:
+    """
+    Lower time bounds to search for a trace's events: shortly before the timestamp in
+    the trace ID, then None (all of history); only None when the trace ID has no timestamp
+
+    There is no upper bound, so a trace that keeps running past any fixed window is
+    never cut off.
+    """
+    started = trace_timestamp(trace_id)
+    if started is None:
+        return [None]
+    return [started - timedelta(hours=TRACE_WINDOW_SKEW_HOURS), None]
+
+
+async def _fetch_chain_page(where: str, offset: int, limit: int) -> Dict[str, Any]:
+    """One page of chain rows; uuid breaks timestamp ties so pages never overlap"""
+    return await _run_hogql(f"""
+        SELECT {CHAIN_COLUMNS}
+        FROM events 
+        WHERE {where}
+        ORDER BY timestamp ASC, uuid ASC
+        LIMIT {limit} OFFSET {offset}
+    """, "Failed to fetch chain from PostHog")
+
+
+async def _count_chain_rows(where: str) -> int:
+    result = await _run_hogql(f"""
+        SELECT count() FROM events WHERE {where}
+    """, "Failed to fetch chain from PostHog")
+    rows = result.get("results") or [[0]]
+    return int(rows[0][0] or 0)
+
+
+async def _fetch_chain_pages(where: str, semaphore: asyncio.Semaphore) -> tuple:
+    """
+    Every row matching a WHERE clause, as (first page result, list of pages)
+
+    Pages of CHAIN_PAGE_SIZE rows are requested with LIMIT/OFFSET, so traces longer
+    than HogQL's default row limit arrive complete. A match that fits in the first
+    page costs one query; for longer ones the remaining pages are counted and fetched
+    concurrently, bounded by the semaphore.
+    """
+    async def fetch_page(offset: int) -> Dict[str, Any]:
+        async with semaphore:
+            return await _fetch_chain_page(where, offset, CHAIN_PAGE_SIZE)
     
-    logger.info(f"Fetching chain from PostHog with trace_id: {trace_id}")
+    first = await fetch_page(0)
+    pages = [first.get("results") or []]
     
-    async with httpx.AsyncClient(timeout=60.0) as client:
-        response = await client.post(url, headers=headers, json=query)
+    if len(pages[0]) == CHAIN_PAGE_SIZE:
+        async with semaphore:
+            total = await _count_chain_rows(where)
+        logger.info(f"Chain query has {total} rows, fetching {CHAIN_PAGE_SIZE} per page")
+        results = await asyncio.gather(*(fetch_page(offset)
+                                         for offset in range(CHAIN_PAGE_SIZE, total, CHAIN_PAGE_SIZE)))
+        pages += [result.get("results") or [] for result in results]
+        # Rows added while paging: keep going until a page comes back short
+        offset = max(total, CHAIN_PAGE_SIZE)
+        while len(pages[-1]) == CHAIN_PAGE_SIZE:
+            pages.append((await fetch_page(offset)).get("results") or [])
+            offset += CHAIN_PAGE_SIZE
+    return first, pages
+
+
+async def fetch_chain_rows(trace_id: str) -> Dict[str, Any]:
+    """
+    All rows of a chain in timestamp order, as a HogQL result ({"columns", "results"})
+
+    The trace and parent-trace matches run as two concurrent queries instead of one OR
+    over all properties, starting shortly before the timestamp in the trace ID. All of
+    history (see trace_search_starts) is only searched when nothing is found.
+    """
+    escaped_trace_id = trace_id.replace("'", "''")
+    semaphore = asyncio.Semaphore(CHAIN_FETCH_CONCURRENCY)
+    first = {}
+    for since in trace_search_starts(trace_id):
+        time_filter = _time_filter(since)
+        matches = await asyncio.gather(*(
+            _fetch_chain_pages(f"properties.{prop} = '{escaped_trace_id}'{time_filter}", semaphore)
+            for prop in ("$ai_trace_id", "$ai_parent_trace_id")
+        ))
+
+        # An event can match both queries (and move between pages while paging): keep it once
+        seen = set()
+        rows = []
+        for _, pages in matches:
+            for page in pages:
+                for row in page:
+                    if row[0] not in seen:
+                        seen.add(row[0])
+                        rows.append(row)
+        first = matches[0][0]
+        label = f"since {since:%Y-%m-%d %H:%M}" if since else "all history"
+        if rows:
+            rows.sort(key=lambda row: str(row[2] or ""))
+            logger.info(f"Found {len(rows)} chain rows ({label})")
+            return {**first, "results": rows}
+        logger.info(f"No chain rows for {trace_id} ({label})")
+    return {**first, "results": []}
+
+
+async def fetch_prompt_chain(trace_id: str, force_refresh: bool = False) -> Dict[str, Any]:
+    """Fetch prompt chain from PostHog using paginated HogQL queries (cached; force_refresh bypasses the cache)"""
+    project_id, api_token = get_posthog_config()
     
-    if response.status_code != 200:
-        logger.error(f"PostHog query error: {response.status_code}")
-        logger.error(f"Response: {response.text[:500]}")
-        raise HTTPException(status_code=response.status_code, detail="Failed to fetch chain from PostHog")
+    if not api_token:
+        raise HTTPException(status_code=400, detail="POSTHOG_API_TOKEN not set in settings or environment variables")
     
-    result = response.json()
-    logger.info(f"PostHog query successful, processing results...")
+    logger.info(f"Fetching chain from PostHog with trace_id: {trace_id}")
+    
+    # Traces with no rows yet are not cached, so they are looked up again next time
+    result = await _cached(_chain_cache_key(trace_id), lambda: fetch_chain_rows(trace_id), force_refresh,
+                           keep=lambda result: bool(result.get("results")))
+    logger.info(f"PostHog query successful ({len(result['results'])} rows), processing results...")
     
     # Process the chain data
     return process_chain_data(result, trace_id)
@@ -257,46 +496,6 @@ def extract_conversation_data(data: Dict[str, Any]) -> Dict[str, Any]:
             "raw_properties": properties
         }
         
-        # Auto-save initial version
-        event_id = data.get("id", "N/A")
-        if event_id != "N/A":
-            try:
-                from app.services.database import save_version
-                version_id = f"{event_id}_initial"
-                model = properties.get("$ai_model", "unknown")
-                
-                # Determine provider from model name
-                provider = "unknown"
-                if "gpt" in model.lower():
-                    provider = "openai"
-                elif "claude" in model.lower():
-                    provider = "anthropic"
-                elif "gemini" in model.lower():
-                    provider = "gemini"
-                
-                logger.info(f"Auto-saving initial version: {version_id} (provider: {provider}, model: {model})")
-                
-                # Include provider in metadata
-                enhanced_metadata = {
-                    **metadata,
-                    "provider": provider
-                }
-                
-                save_version(
-                    version_id=version_id,
-                    event_id=event_id,
-                    model_provider=provider,
-                    model_name=model,
-                    user_prompt=user_prompt.strip(),
-                    image_urls=user_images,
-                    assistant_response=assistant_response,
-                    metadata=enhanced_metadata
-                )
-                logger.info("Initial version saved successfully")
-            except Exception as e:
-                logger.error(f"Failed to auto-save initial version: {str(e)}")
-                logger.debug(f"Traceback:\n{traceback.format_exc()}")
-        
         return response_data
     except Exception as e:
         logger.error(f"Error extracting conversation data: {str(e)}")
@@ -305,6 +504,58 @@ def extract_conversation_data(data: Dict[str, Any]) -> Dict[str, Any]:
         raise Exception(f"Error extracting conversation data: {str(e)}")
 
 
+def build_initial_version(data: Dict[str, Any], conversation: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Build save_version() arguments for the auto-saved initial version of an event"""
+    event_id = data.get("id", "N/A")
+    if event_id == "N/A":
+        return None
+    
+    properties = data.get("properties", {})
+    if not isinstance(properties, dict):
+        properties = {}
+    model = properties.get("$ai_model", "unknown")
+    
+    # Determine provider from model name
+    provider = "unknown"
+    if "gpt" in model.lower():
+        provider = "openai"
+    elif "claude" in model.lower():
+        provider = "anthropic"
+    elif "gemini" in model.lower():
+        provider = "gemini"
+    
+    return {
+        "version_id": f"{event_id}_initial",
+        "event_id": event_id,
+        "model_provider": provider,
+        "model_name": model,
+        "user_prompt": conversation["user_prompt"],
+        "image_urls": conversation["user_images"],
+        "assistant_response": conversation["assistant_response"],
+        # Include provider in metadata
+        "metadata": {**conversation["metadata"], "provider": provider}
+    }
+
+
+async def save_initial_version(data: Dict[str, Any], conversation: Dict[str, Any]) -> None:
+    """Auto-save the initial version of an event extracted by extract_conversation_data"""
+    try:
+        initial_version = build_initial_version(data, conversation)
+        if initial_version is None:
+            return
+        status = await async_db.save_version_once("event", **initial_version)
+        if status == "exists":
+            logger.info(f"Initial version {initial_version['version_id']} already saved")
+        elif status == "saved":
+            logger.info(f"Auto-saved initial version: {initial_version['version_id']} "
+                        f"(provider: {initial_version['model_provider']}, model: {initial_version['model_name']})")
+        else:
+            logger.error(f"Failed to auto-save initial version {initial_version['version_id']}")
+    except Exception as e:
+        logger.error(f"Failed to auto-save initial version: {str(e)}")
+        logger.debug(f"Traceback:\n{traceback.format_exc()}")
+
+
 def process_chain_data(query_result: Dict[str, Any], trace_id: str) -> Dict[str, Any]:
     """Process PostHog query result into chain format"""
     try:
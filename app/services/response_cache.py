@@ -0,0 +1,220 @@
+"""Disk cache of raw PostHog responses (SQLite file next to the database, TTL + size-bounded LRU)"""
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Any, Optional
+
+from app.services import compression
+from app.services import serializer
+
+# Set POSTHOG_CACHE=off to always query PostHog
+CACHE_ENABLED = os.getenv("POSTHOG_CACHE", "on").lower() != "off"
+
+# Entries older than this are refetched (seconds, default 7 days)
+CACHE_TTL = float(os.getenv("POSTHOG_CACHE_TTL", str(7 * 24 * 3600)))
+
+# Least recently used entries are evicted once the cached responses pass this size
+CACHE_MAX_BYTES = int(os.getenv("POSTHOG_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# Hits record their access time in memory; it is written out (one batch, one commit)
+# before evicting, or once this many are pending / the oldest is this many seconds old
+TOUCH_BATCH_SIZE = 100
+TOUCH_FLUSH_INTERVAL = 30.0
+
+
+class ResponseCache:
+    """
+    Cached responses keyed by "<kind>:<id>:v<query version>"
+
+    One connection shared by the database executor threads (serialized by a lock).
+    A hit is a primary key read; the total size is kept in memory (summed once on
+    open), so a put only scans for eviction once the cache is over max_bytes.
+    """
+
+    def __init__(self, path: str, ttl: float = CACHE_TTL, max_bytes: int = CACHE_MAX_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._total_bytes = 0
+        self._touched: Dict[str, float] = {}
+        self._touched_since = 0.0
+        self._stats = {"hits": 0, "misses": 0, "expired": 0, "writes": 0, "evictions": 0}
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=10.0, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    value BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses(accessed_at)")
+            conn.commit()
+            self._total_bytes = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            self._conn = conn
+        return self._conn
+
+    def _delete(self, conn: sqlite3.Connection, key: str):
+        """Delete one entry and take its size off the total (caller holds the lock and commits)"""
+        row = conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._total_bytes -= row[0]
+        self._touched.pop(key, None)
+
+    def _flush_touches(self, conn: sqlite3.Connection):
+        """Write pending access times (caller holds the lock and commits)"""
+        if self._touched:
+            conn.executemany("UPDATE responses SET accessed_at = ? WHERE key = ?",
+                             [(accessed_at, key) for key, accessed_at in self._touched.items()])
+            self._touched = {}
+
+    def get(self, key: str) -> Optional[Any]:
+        """Cached response, or None when missing or older than the TTL"""
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute("SELECT value, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self._stats["misses"] += 1
+                return None
+            if now - row[1] > self.ttl:
+                self._delete(conn, key)
+                conn.commit()
+                self._stats["expired"] += 1
+                self._stats["misses"] += 1
+                return None
+            if not self._touched:
+                self._touched_since = now
+            self._touched[key] = now
+            if len(self._touched) >= TOUCH_BATCH_SIZE or now - self._touched_since > TOUCH_FLUSH_INTERVAL:
+                self._flush_touches(conn)
+                conn.commit()
+        try:
+            value = serializer.loads(compression.decode_text(row[0]))
+        except Exception as e:
+            # e.g. written with a compression dictionary by an older version: drop it and refetch
+            print(f"Dropping unreadable cached response {key}: {e}")
+            self.delete(key)
+            with self._lock:
+                self._stats["misses"] += 1
+            return None
+        with self._lock:
+            self._stats["hits"] += 1
+        return value
+
+    def put(self, key: str, value: Any):
+        """Store a response, then evict least recently used entries beyond max_bytes"""
+        # No trained dictionary: the cache file is separate from the database that stores them
+        data = compression.encode_text(serializer.dumps(value), use_dict=False)
+        size = len(data)
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            self._delete(conn, key)
+            conn.execute("""
+                INSERT INTO responses (key, value, size, created_at, accessed_at)
+                VALUES (?, ?, ?, ?, ?)
+            """, (key, data, size, now, now))
+            self._total_bytes += size
+            self._stats["writes"] += 1
+            if self._total_bytes > self.max_bytes:
+                # Eviction order has to see the access times held in memory
+                self._flush_touches(conn)
+                evicted = 0
+                for old_key, old_size in conn.execute(
+                    "SELECT key, size FROM responses WHERE key != ? ORDER BY accessed_at", (key,)
+                ).fetchall():
+                    if self._total_bytes <= self.max_bytes:
+                        break
+                    conn.execute("DELETE FROM responses WHERE key = ?", (old_key,))
+                    self._total_bytes -= old_size
+                    evicted += 1
+                self._stats["evictions"] += evicted
+            conn.commit()
+
+    def delete(self, key: str):
+        with self._lock:
+            conn = self._connection()
+            self._delete(conn, key)
+            conn.commit()
+
+    def clear(self) -> int:
+        """Drop every cached response; returns how many there were"""
+        with self._lock:
+            conn = self._connection()
+            count = conn.execute("DELETE FROM responses").rowcount
+            conn.commit()
+            self._total_bytes = 0
+            self._touched = {}
+            conn.execute("VACUUM")
+        return count
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                try:
+                    self._flush_touches(self._conn)
+                    self._conn.commit()
+                except sqlite3.Error as e:
+                    print(f"Error saving cache access times: {e}")
+                self._conn.close()
+                self._conn = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._connection().execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            size = self._total_bytes
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        return {
+            **stats,
+            "hit_rate": round(stats["hits"] / lookups, 3) if lookups else None,
+            "entries": entries,
+            "size_bytes": size,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl,
+            "path": self.path,
+        }
+
+
+_cache: Optional[ResponseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """The PostHog response cache (POSTHOG_CACHE_PATH, default: posthog_cache.db next to the database), or None if disabled"""
+    global _cache
+    if not CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            from app.services.database import DB_PATH
+            path = os.getenv("POSTHOG_CACHE_PATH") or os.path.join(
+                os.path.dirname(os.path.abspath(DB_PATH)), "posthog_cache.db"
+            )
+            _cache = ResponseCache(path)
+        return _cache
+
+
+def close_response_cache():
+    """Close the cache connection (called on shutdown)"""
+    global _cache
+    with _cache_lock:
+        if _cache is not None:
+            _cache.close()
+            _cache = None
+
+
+def get_cache_stats() -> Dict[str, Any]:
+    cache = get_response_cache()
+    return cache.stats() if cache is not None else {"enabled": False}
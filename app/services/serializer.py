@@ -0,0 +1,93 @@
+"""JSON encoding/decoding for storage and HTTP responses (orjson when installed, stdlib json otherwise)"""
+import json
+import os
+import time
+from typing import Dict, Any, List, Union
+
+try:
+    import orjson
+except ImportError:  # optional dependency - the stdlib json module is used without it
+    orjson = None
+
+# Set JSON_BACKEND=stdlib to use the json module even when orjson is installed
+BACKEND = "orjson" if orjson is not None and os.getenv("JSON_BACKEND", "orjson").lower() != "stdlib" else "stdlib"
+
+# Raised by loads() for invalid input with either backend (orjson's error subclasses it)
+JSONDecodeError = json.JSONDecodeError
+
+# Dict keys that are not strings (ints, floats, ...) are converted like json.dumps does
+_ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS if orjson is not None else 0
+
+
+def _stdlib_dumps(value: Any) -> str:
+    # Same output shape as orjson (compact, UTF-8 rather than \u escapes)
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+def _orjson_dumps_bytes(value: Any) -> bytes:
+    try:
+        return orjson.dumps(value, option=_ORJSON_OPTIONS)
+    except TypeError:
+        # Integers beyond 64 bits and other values orjson rejects
+        return _stdlib_dumps(value).encode("utf-8")
+
+
+def dumps(value: Any) -> str:
+    """Serialize a value to a JSON string"""
+    if BACKEND == "orjson":
+        return _orjson_dumps_bytes(value).decode("utf-8")
+    return _stdlib_dumps(value)
+
+
+def dumps_bytes(value: Any) -> bytes:
+    """Serialize a value to UTF-8 JSON bytes (what HTTP responses send)"""
+    if BACKEND == "orjson":
+        return _orjson_dumps_bytes(value)
+    return _stdlib_dumps(value).encode("utf-8")
+
+
+def loads(data: Union[str, bytes, bytearray, memoryview]) -> Any:
+    """Parse JSON text or bytes; raises JSONDecodeError for invalid input"""
+    if BACKEND == "orjson":
+        return orjson.loads(data)
+    if isinstance(data, memoryview):
+        data = bytes(data)
+    return json.loads(data)
+
+
+def _as_bytes(data: Union[str, bytes]) -> bytes:
+    return data.encode("utf-8") if isinstance(data, str) else data
+
+
+def benchmark(payloads: List[Any], rounds: int = 20) -> Dict[str, Dict[str, float]]:
+    """
+    Time encoding and decoding of the given payloads with each available backend
+
+    Returns {backend: {"dumps_ms": ..., "loads_ms": ..., "bytes": ...}} with the
+    average time of one pass over all payloads.
+    """
+    encoded = [_stdlib_dumps(payload) for payload in payloads]
+    backends = {"stdlib": (_stdlib_dumps, json.loads)}
+    if orjson is not None:
+        backends["orjson"] = (_orjson_dumps_bytes, orjson.loads)
+
+    results = {}
+    for name, (encode, decode) in backends.items():
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for payload in payloads:
+                encode(payload)
+        dumps_time = (time.perf_counter() - start) / rounds
+
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for text in encoded:
+                decode(text)
+        loads_time = (time.perf_counter() - start) / rounds
+
+        results[name] = {
+            "dumps_ms": round(dumps_time * 1000, 3),
+            "loads_ms": round(loads_time * 1000, 3),
+            "bytes": sum(len(_as_bytes(encode(payload))) for payload in payloads),
+        }
+    return results
@@ -0,0 +1,127 @@
+"""Streaming readers/writers for version dumps: JSONL and the {"versions": [...]} envelope (local.json/prod.json)"""
+import json
+import re
+from typing import Dict, Any, Iterable, Iterator, Optional, TextIO
+
+from app.services import serializer
+
+FORMATS = ("jsonl", "json")
+
+# Envelope key used by local.json / prod.json
+ENVELOPE_KEY = "versions"
+
+# Characters read per chunk when parsing an envelope (grows while a single record does not fit)
+READ_CHUNK_SIZE = 1 << 20
+
+_WHITESPACE = re.compile(r"\s*")
+
+
+def record_kind(record: Dict[str, Any]) -> Optional[str]:
+    """"chain" for chain versions (trace_id), "event" for event versions (event_id), None otherwise"""
+    if not isinstance(record, dict):
+        return None
+    if record.get("trace_id"):
+        return "chain"
+    if record.get("event_id"):
+        return "event"
+    return None
+
+
+def format_for_path(path: str) -> str:
+    """Dump format implied by a file name (.jsonl = one record per line, anything else = envelope)"""
+    return "jsonl" if path.endswith((".jsonl", ".ndjson")) else "json"
+
+
+def encode_jsonl(records: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    for record in records:
+        yield serializer.dumps(record) + "\n"
+
+
+def encode_envelope(records: Iterable[Dict[str, Any]], key: str = ENVELOPE_KEY) -> Iterator[str]:
+    """{"versions": [...]} written one record at a time"""
+    yield json.dumps(key).join(("{", ": ["))
+    separator = "\n"
+    for record in records:
+        yield separator + serializer.dumps(record)
+        separator = ",\n"
+    yield "\n]}\n"
+
+
+def encode(records: Iterable[Dict[str, Any]], fmt: str) -> Iterator[str]:
+    if fmt not in FORMATS:
+        raise ValueError(f"Invalid dump format: {fmt}")
+    return encode_jsonl(records) if fmt == "jsonl" else encode_envelope(records)
+
+
+def iter_jsonl(stream: TextIO) -> Iterator[Dict[str, Any]]:
+    for line_number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            yield serializer.loads(line)
+        except serializer.JSONDecodeError as e:
+            raise ValueError(f"Invalid JSON on line {line_number}: {e}")
+
+
+def iter_envelope(stream: TextIO, key: str = ENVELOPE_KEY,
+                  chunk_size: int = READ_CHUNK_SIZE) -> Iterator[Dict[str, Any]]:
+    """
+    Records of a {"versions": [...]} document, decoded one at a time
+
+    Only the record being decoded (plus one read chunk) is held in memory. When a record
+    does not fit in the buffer, the next read is as large as the buffer, so huge records
+    (inline images) are still decoded in linear time. This uses the stdlib decoder, as
+    orjson cannot decode a single value at an offset (raw_decode).
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+
+    def read(size: int) -> bool:
+        nonlocal buffer, pos
+        chunk = stream.read(size)
+        if not chunk:
+            return False
+        buffer = buffer[pos:] + chunk
+        pos = 0
+        return True
+
+    start = re.compile(r'\{\s*(?:.*?,\s*)?' + re.escape(json.dumps(key)) + r'\s*:\s*\[', re.DOTALL)
+    while True:
+        match = start.match(buffer)
+        if match:
+            pos = match.end()
+            break
+        if not read(chunk_size):
+            raise ValueError(f'Not a {{"{key}": [...]}} document')
+
+    need_comma = False
+    while True:
+        pos = _WHITESPACE.match(buffer, pos).end()
+        if pos == len(buffer):
+            if not read(chunk_size):
+                raise ValueError("Unexpected end of document")
+            continue
+        if buffer[pos] == "]":
+            return
+        if need_comma:
+            if buffer[pos] != ",":
+                raise ValueError(f"Expected ',' between records, got {buffer[pos]!r}")
+            pos += 1
+            need_comma = False
+            continue
+        try:
+            record, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError as e:
+            if not read(max(chunk_size, len(buffer) - pos)):
+                raise ValueError(f"Invalid record: {e}")
+            continue
+        pos = end
+        need_comma = True
+        yield record
+
+
+def iter_records(stream: TextIO, fmt: str) -> Iterator[Dict[str, Any]]:
+    if fmt not in FORMATS:
+        raise ValueError(f"Invalid dump format: {fmt}")
+    return iter_jsonl(stream) if fmt == "jsonl" else iter_envelope(stream)
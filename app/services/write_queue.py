@@ -0,0 +1,129 @@
+"""Single-writer queue - batches pending writes into one SQLite transaction (group commit)"""
+import asyncio
+import os
+import sqlite3
+import time
+from typing import Dict, Any, List, Optional, Callable
+
+from app.services import database
+
+# Maximum number of writes committed in one transaction
+WRITE_QUEUE_MAX_BATCH = int(os.getenv("WRITE_QUEUE_MAX_BATCH", "100"))
+
+# Retries for a whole batch when another process holds the database lock
+WRITE_QUEUE_LOCK_RETRIES = 5
+
+
+class WriteQueue:
+    """
+    One background task owns all writes issued from request handlers
+
+    Callers get a future per write. The writer takes everything that is queued
+    (up to WRITE_QUEUE_MAX_BATCH), runs it on the database executor inside a single
+    transaction and resolves each future with that write's own result.
+    """
+
+    def __init__(self, run_in_executor: Callable):
+        self._run_in_executor = run_in_executor
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stats = {
+            "writes": 0,
+            "batches": 0,
+            "max_batch_size": 0,
+            "lock_retries": 0,
+            "last_commit_ms": 0.0,
+            "max_commit_ms": 0.0,
+            "total_commit_ms": 0.0,
+        }
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """Start the writer task on the running event loop"""
+        if self.running:
+            return
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run(), name="sqlite-writer")
+
+    async def stop(self):
+        """Commit everything still queued, then stop the writer task"""
+        if not self.running:
+            return
+        await self._queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def submit(self, func: Callable, *args, **kwargs) -> asyncio.Future:
+        """Queue a single-attempt write function; the future resolves to its return value"""
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((func, args, kwargs, future))
+        return future
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < WRITE_QUEUE_MAX_BATCH and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            try:
+                await self._commit(batch)
+            except Exception as e:
+                for item in batch:
+                    if not item[3].done():
+                        item[3].set_exception(e)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _commit(self, batch: List[tuple]):
+        calls = [(func, args, kwargs) for func, args, kwargs, _ in batch]
+
+        for attempt in range(WRITE_QUEUE_LOCK_RETRIES):
+            start = time.perf_counter()
+            try:
+                results = await self._run_in_executor(database.run_write_batch, calls)
+                break
+            except sqlite3.OperationalError as e:
+                if not database.is_locked_error(e) or attempt == WRITE_QUEUE_LOCK_RETRIES - 1:
+                    raise
+                self._stats["lock_retries"] += 1
+                print(f"Database locked, retrying write batch ({attempt + 1}/{WRITE_QUEUE_LOCK_RETRIES})...")
+                await asyncio.sleep(database.lock_retry_delay(attempt))
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self._stats["writes"] += len(batch)
+        self._stats["batches"] += 1
+        self._stats["max_batch_size"] = max(self._stats["max_batch_size"], len(batch))
+        self._stats["last_commit_ms"] = round(elapsed_ms, 2)
+        self._stats["max_commit_ms"] = max(self._stats["max_commit_ms"], round(elapsed_ms, 2))
+        self._stats["total_commit_ms"] += elapsed_ms
+
+        for (_, _, _, future), (ok, value) in zip(batch, results):
+            if future.done():
+                continue
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth, batch sizes and commit latency"""
+        batches = self._stats["batches"]
+        return {
+            "running": self.running,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "writes": self._stats["writes"],
+            "batches": batches,
+            "avg_batch_size": round(self._stats["writes"] / batches, 2) if batches else 0,
+            "max_batch_size": self._stats["max_batch_size"],
+            "lock_retries": self._stats["lock_retries"],
+            "last_commit_ms": self._stats["last_commit_ms"],
+            "avg_commit_ms": round(self._stats["total_commit_ms"] / batches, 2) if batches else 0,
+            "max_commit_ms": self._stats["max_commit_ms"],
+        }
@@ -84,22 +84,24 @@ const API = {
         return await response.json();
     },
 
-    async getEvents() {
-        const response = await fetch('/api/events');
+    async getEvents(params = {}) {
+        const query = new URLSearchParams(params).toString();
+        const response = await fetch(`/api/events${query ? `?${query}` : ''}`);
         if (!response.ok) {
             throw new Error('Failed to load events');
         }
         const data = await response.json();
-        return data.events || [];
+        return { events: data.events || [], nextCursor: data.next_cursor || null };
     },
 
-    async getChains() {
-        const response = await fetch('/api/chains');
+    async getChains(params = {}) {
+        const query = new URLSearchParams(params).toString();
+        const response = await fetch(`/api/chains${query ? `?${query}` : ''}`);
         if (!response.ok) {
             throw new Error('Failed to load chains');
         }
         const data = await response.json();
-        return data.chains || [];
+        return { chains: data.chains || [], nextCursor: data.next_cursor || null };
     },
 
     async getVersions(eventId) {
@@ -111,8 +113,28 @@ const API = {
         return data.versions || [];
     },
 
-    async getChainVersions(traceId) {
-        const response = await fetch(`/api/chain-versions/${traceId}`);
+    async getVersionSummaries(eventId) {
+        const response = await fetch(`/api/versions/${eventId}/summary`);
+        if (!response.ok) {
+            throw new Error('Failed to load versions');
+        }
+        const data = await response.json();
+        return data.versions || [];
+    },
+
+    async getVersion(versionId) {
+        const response = await fetch(`/api/version/${encodeURIComponent(versionId)}`);
+        if (!response.ok) {
+            throw new Error('Failed to load version');
+        }
+        return await response.json();
+    },
+
+    async getChainVersions(traceId, versionIds = null) {
+        const query = versionIds && versionIds.length
+            ? `?version_ids=${encodeURIComponent(versionIds.join(','))}`
+            : '';
+        const response = await fetch(`/api/chain-versions/${traceId}${query}`);
         if (!response.ok) {
             throw new Error('Failed to load chain versions');
         }
@@ -120,6 +142,23 @@ const API = {
         return data.versions || [];
     },
 
+    async getChainVersionSummaries(traceId) {
+        const response = await fetch(`/api/chain-versions/${traceId}/summary`);
+        if (!response.ok) {
+            throw new Error('Failed to load chain versions');
+        }
+        const data = await response.json();
+        return data.versions || [];
+    },
+
+    async getChainVersion(versionId) {
+        const response = await fetch(`/api/chain-version/${encodeURIComponent(versionId)}`);
+        if (!response.ok) {
+            throw new Error('Failed to load chain version');
+        }
+        return await response.json();
+    },
+
     async updateRating(versionId, rating) {
         const response = await fetch('/api/update-rating', {
             method: 'POST',
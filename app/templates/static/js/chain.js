@@ -1963,7 +1963,9 @@ async function loadChainVersions(traceId, preserveSelection = false) {
         }
 
     try {
-        const versions = await API.getChainVersions(traceId);
+        // Summaries only - full step payloads are fetched when a version is opened
+        const versions = await API.getChainVersionSummaries(traceId);
+        window.chainVersionCache = {};
 
         const versionsDropdown = document.getElementById('versions-dropdown');
         if (!versionsDropdown) return;
@@ -1999,14 +2001,14 @@ async function loadChainVersions(traceId, preserveSelection = false) {
             
             // Count rated steps for display
             let ratingText = '';
-            if (version.chain_events && Array.isArray(version.chain_events)) {
+            if (version.step_ratings && Array.isArray(version.step_ratings)) {
                                 let ratedSteps = 0;
                                 let totalOverallRating = 0;
                                 
-                                    version.chain_events.forEach(event => {
-                                        if (event.rating) {
+                                    version.step_ratings.forEach(step => {
+                                        if (step.rating) {
                                             ratedSteps++;
-                                            const rating = typeof event.rating === 'object' ? event.rating : {overall: event.rating};
+                                            const rating = typeof step.rating === 'object' ? step.rating : {overall: step.rating};
                                             if (rating.overall) {
                                                 totalOverallRating += rating.overall;
                                             }
@@ -2285,8 +2287,7 @@ document.addEventListener('click', (e) => {
 async function loadChainVersion(versionId) {
     if (!window.allChainVersions) return;
     
-    const version = window.allChainVersions.find(v => v.version_id === versionId);
-    if (!version) return;
+    if (!window.allChainVersions.some(v => v.version_id === versionId)) return;
     
     // Show full-page processing state
     const versionsSection = document.getElementById('versions-section');
@@ -2322,6 +2323,22 @@ async function loadChainVersion(versionId) {
     `;
     document.body.appendChild(processingOverlay);
     
+    // Fetch the full version (all steps) on first open
+    window.chainVersionCache = window.chainVersionCache || {};
+    let version = window.chainVersionCache[versionId];
+    if (!version) {
+        try {
+            version = await API.getChainVersion(versionId);
+            window.chainVersionCache[versionId] = version;
+        } catch (error) {
+            if (processingOverlay.parentNode) {
+                processingOverlay.parentNode.removeChild(processingOverlay);
+            }
+            showError('Failed to load chain version: ' + error.message);
+            return;
+        }
+    }
+    
     currentData = {
         is_chain: true,
         trace_id: version.trace_id,
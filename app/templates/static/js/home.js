@@ -70,19 +70,34 @@ async function processInput(inputValue) {
     }
 }
 
-async function loadEventsList() {
+// Keyset pagination cursors for the "Load more" buttons (null = no more pages)
+let eventsCursor = null;
+let chainsCursor = null;
+
+function updateLoadMoreButton(id, cursor) {
+    const container = document.getElementById(id);
+    if (container) {
+        container.style.display = cursor ? 'block' : 'none';
+    }
+}
+
+async function loadEventsList(append = false) {
     try {
-        const events = await API.getEvents();
+        const { events, nextCursor } = await API.getEvents(append && eventsCursor ? { cursor: eventsCursor } : {});
         const eventsTbody = document.getElementById('events-tbody');
         const eventsSection = document.getElementById('events-list-section');
+        eventsCursor = nextCursor;
+        updateLoadMoreButton('events-load-more', nextCursor);
 
-        if (events.length === 0) {
+        if (events.length === 0 && !append) {
             eventsTbody.innerHTML = '<tr><td colspan="5" style="text-align: center; padding: 3rem; color: var(--text-secondary);"><p style="font-size: 1.1rem; margin-bottom: 0.5rem;">No saved events yet</p><p>Load an event by pasting JSON or Event ID above to get started.</p></td></tr>';
             eventsSection.classList.add('active');
             return;
         }
 
-        eventsTbody.innerHTML = '';
+        if (!append) {
+            eventsTbody.innerHTML = '';
+        }
         events.forEach(event => {
             const row = document.createElement('tr');
             row.style.cssText = 'transition: background-color 0.2s;';
@@ -126,9 +141,9 @@ async function loadEventById(eventId) {
     }
 }
 
-async function loadChainsList() {
+async function loadChainsList(append = false) {
     try {
-        const chains = await API.getChains();
+        const { chains, nextCursor } = await API.getChains(append && chainsCursor ? { cursor: chainsCursor } : {});
         const chainsTbody = document.getElementById('chains-tbody');
         const chainsSection = document.getElementById('chains-list-section');
 
@@ -136,70 +151,42 @@ async function loadChainsList() {
             console.error('Chains tbody or section element not found');
             return;
         }
+        chainsCursor = nextCursor;
+        updateLoadMoreButton('chains-load-more', nextCursor);
 
-        if (chains.length === 0) {
+        if (chains.length === 0 && !append) {
             chainsTbody.innerHTML = '<tr><td colspan="7" style="text-align: center; padding: 3rem; color: var(--text-secondary);"><p style="font-size: 1.1rem; margin-bottom: 0.5rem;">No saved chains yet</p><p>Load a chain by pasting a Trace ID above to get started.</p></td></tr>';
             chainsSection.classList.add('active');
             return;
         }
 
-        chainsTbody.innerHTML = '';
+        if (!append) {
+            chainsTbody.innerHTML = '';
+        }
         
-        // Fetch detailed version info for each chain
+        // Rows carry their counts and best rating, so the page renders without per-chain requests
         for (const chain of chains) {
-            try {
-                const versions = await API.getChainVersions(chain.trace_id);
-                
-                const row = document.createElement('tr');
-                row.style.cssText = 'transition: background-color 0.2s;';
-                row.onmouseenter = () => row.style.backgroundColor = 'var(--bg-tertiary)';
-                row.onmouseleave = () => row.style.backgroundColor = '';
-
-                const date = new Date(chain.last_updated).toLocaleString();
-                
-                // Get step count from first version
-                const stepCount = versions.length > 0 && versions[0].chain_events ? versions[0].chain_events.length : 0;
-                
-                // Build ratings display
-                const ratingsHTML = buildChainRatingsDisplay(versions);
-
-                row.innerHTML = `
-                    <td style="padding: 1rem; color: var(--text-primary); font-weight: 500; cursor: pointer;" onclick="loadChainById('${escapeHtml(chain.trace_id)}')">${escapeHtml(chain.chain_name || 'Unnamed Chain')}</td>
-                    <td style="padding: 1rem; color: var(--text-secondary); font-family: monospace; font-size: 0.85rem; max-width: 200px; overflow: hidden; text-overflow: ellipsis; white-space: nowrap; cursor: pointer;" title="${escapeHtml(chain.trace_id)}" onclick="loadChainById('${escapeHtml(chain.trace_id)}')">${escapeHtml(chain.trace_id)}</td>
-                    <td style="padding: 1rem; color: var(--text-secondary); cursor: pointer;" onclick="loadChainById('${escapeHtml(chain.trace_id)}')">${stepCount} step${stepCount !== 1 ? 's' : ''}</td>
-                    <td style="padding: 1rem; color: var(--text-secondary); cursor: pointer;" onclick="loadChainById('${escapeHtml(chain.trace_id)}')">${chain.version_count || 0} version${(chain.version_count || 0) !== 1 ? 's' : ''}</td>
-                    <td style="padding: 1rem; cursor: pointer;" onclick="loadChainById('${escapeHtml(chain.trace_id)}')">${ratingsHTML}</td>
-                    <td style="padding: 1rem; color: var(--text-secondary); cursor: pointer;" onclick="loadChainById('${escapeHtml(chain.trace_id)}')">${escapeHtml(date)}</td>
-                    <td style="padding: 1rem; text-align: center;">
-                        <button onclick="event.stopPropagation(); openDeleteModal('chain', '${escapeHtml(chain.trace_id)}', '${escapeHtml(chain.chain_name || 'Unnamed Chain')}')" style="background: #dc2626; color: white; border: none; padding: 0.4rem 0.8rem; border-radius: 4px; cursor: pointer; font-size: 0.85rem; transition: background 0.2s;" onmouseenter="this.style.background='#b91c1c'" onmouseleave="this.style.background='#dc2626'">Delete</button>
-                    </td>
-                `;
-
-                chainsTbody.appendChild(row);
-            } catch (error) {
-                console.error(`Error loading details for chain ${chain.trace_id}:`, error);
-                // Still show the chain row with basic info
-                const row = document.createElement('tr');
-                row.style.cssText = 'transition: background-color 0.2s;';
-                row.onmouseenter = () => row.style.backgroundColor = 'var(--bg-tertiary)';
-                row.onmouseleave = () => row.style.backgroundColor = '';
-
-                const date = new Date(chain.last_updated).toLocaleString();
-
-                row.innerHTML = `
-                    <td style="padding: 1rem; color: var(--text-primary); font-weight: 500; cursor: pointer;" onclick="loadChainById('${escapeHtml(chain.trace_id)}')">${escapeHtml(chain.chain_name || 'Unnamed Chain')}</td>
-                    <td style="padding: 1rem; color: var(--text-secondary); font-family: monospace; font-size: 0.85rem; max-width: 200px; overflow: hidden; text-overflow: ellipsis; white-space: nowrap; cursor: pointer;" title="${escapeHtml(chain.trace_id)}" onclick="loadChainById('${escapeHtml(chain.trace_id)}')">${escapeHtml(chain.trace_id)}</td>
-                    <td style="padding: 1rem; color: var(--text-secondary); cursor: pointer;" onclick="loadChainById('${escapeHtml(chain.trace_id)}')">—</td>
-                    <td style="padding: 1rem; color: var(--text-secondary); cursor: pointer;" onclick="loadChainById('${escapeHtml(chain.trace_id)}')">${chain.version_count || 0} version${(chain.version_count || 0) !== 1 ? 's' : ''}</td>
-                    <td style="padding: 1rem; color: var(--text-secondary); cursor: pointer;" onclick="loadChainById('${escapeHtml(chain.trace_id)}')">—</td>
-                    <td style="padding: 1rem; color: var(--text-secondary); cursor: pointer;" onclick="loadChainById('${escapeHtml(chain.trace_id)}')">${escapeHtml(date)}</td>
-                    <td style="padding: 1rem; text-align: center;">
-                        <button onclick="event.stopPropagation(); openDeleteModal('chain', '${escapeHtml(chain.trace_id)}', '${escapeHtml(chain.chain_name || 'Unnamed Chain')}')" style="background: #dc2626; color: white; border: none; padding: 0.4rem 0.8rem; border-radius: 4px; cursor: pointer; font-size: 0.85rem; transition: background 0.2s;" onmouseenter="this.style.background='#b91c1c'" onmouseleave="this.style.background='#dc2626'">Delete</button>
-                    </td>
-                `;
-
-                chainsTbody.appendChild(row);
-            }
+            const row = document.createElement('tr');
+            row.style.cssText = 'transition: background-color 0.2s;';
+            row.onmouseenter = () => row.style.backgroundColor = 'var(--bg-tertiary)';
+            row.onmouseleave = () => row.style.backgroundColor = '';
+
+            const date = new Date(chain.last_updated).toLocaleString();
+            const stepCount = chain.step_count;
+
+            row.innerHTML = `
+                <td style="padding: 1rem; color: var(--text-primary); font-weight: 500; cursor: pointer;" onclick="loadChainById('${escapeHtml(chain.trace_id)}')">${escapeHtml(chain.chain_name || 'Unnamed Chain')}</td>
+                <td style="padding: 1rem; color: var(--text-secondary); font-family: monospace; font-size: 0.85rem; max-width: 200px; overflow: hidden; text-overflow: ellipsis; white-space: nowrap; cursor: pointer;" title="${escapeHtml(chain.trace_id)}" onclick="loadChainById('${escapeHtml(chain.trace_id)}')">${escapeHtml(chain.trace_id)}</td>
+                <td style="padding: 1rem; color: var(--text-secondary); cursor: pointer;" onclick="loadChainById('${escapeHtml(chain.trace_id)}')">${stepCount != null ? `${stepCount} step${stepCount !== 1 ? 's' : ''}` : '—'}</td>
+                <td style="padding: 1rem; color: var(--text-secondary); cursor: pointer;" onclick="loadChainById('${escapeHtml(chain.trace_id)}')">${chain.version_count || 0} version${(chain.version_count || 0) !== 1 ? 's' : ''}</td>
+                <td style="padding: 1rem; cursor: pointer;" onclick="loadChainById('${escapeHtml(chain.trace_id)}')">${buildChainRatingsDisplay(chain)}</td>
+                <td style="padding: 1rem; color: var(--text-secondary); cursor: pointer;" onclick="loadChainById('${escapeHtml(chain.trace_id)}')">${escapeHtml(date)}</td>
+                <td style="padding: 1rem; text-align: center;">
+                    <button onclick="event.stopPropagation(); openDeleteModal('chain', '${escapeHtml(chain.trace_id)}', '${escapeHtml(chain.chain_name || 'Unnamed Chain')}')" style="background: #dc2626; color: white; border: none; padding: 0.4rem 0.8rem; border-radius: 4px; cursor: pointer; font-size: 0.85rem; transition: background 0.2s;" onmouseenter="this.style.background='#b91c1c'" onmouseleave="this.style.background='#dc2626'">Delete</button>
+                </td>
+            `;
+
+            chainsTbody.appendChild(row);
         }
 
         chainsSection.classList.add('active');
@@ -214,99 +201,32 @@ async function loadChainsList() {
     }
 }
 
-function buildChainRatingsDisplay(versions) {
-    if (!versions || versions.length === 0) {
-        return '<span style="color: var(--text-secondary);">—</span>';
-    }
-    
-    // Collect all ratings from all versions
-    const allRatings = [];
-    
-    versions.forEach((version, versionIdx) => {
-        if (!version.chain_events || !Array.isArray(version.chain_events)) return;
-        
-        version.chain_events.forEach((event, stepIdx) => {
-            if (event.rating) {
-                const rating = typeof event.rating === 'object' ? event.rating : {overall: event.rating};
-                
-                allRatings.push({
-                    versionIdx: versionIdx,
-                    versionId: version.version_id,
-                    stepIdx: stepIdx,
-                    rating: rating
-                });
-            }
-        });
-    });
-    
-    if (allRatings.length === 0) {
+function buildChainRatingsDisplay(chain) {
+    // Chain-level rating plus the best step rating (steps are what usually gets rated)
+    if (!chain.max_rating && !chain.rated_steps) {
         return '<span style="color: var(--text-secondary);">No ratings yet</span>';
     }
-    
-    // Group by step index
-    const ratingsByStep = {};
-    allRatings.forEach(item => {
-        if (!ratingsByStep[item.stepIdx]) {
-            ratingsByStep[item.stepIdx] = [];
-        }
-        ratingsByStep[item.stepIdx].push(item);
-    });
-    
-    // Build display
-    const stepsHTML = Object.keys(ratingsByStep).sort((a, b) => parseInt(a) - parseInt(b)).map(stepIdx => {
-        const stepRatings = ratingsByStep[stepIdx];
-        const stepNum = parseInt(stepIdx) + 1;
-        
-        // Find max overall rating for this step
-        let maxOverall = null;
-        stepRatings.forEach(item => {
-            const overall = item.rating.overall;
-            if (overall && (maxOverall === null || overall > maxOverall)) {
-                maxOverall = overall;
-            }
-        });
-        
-        // Count how many versions have ratings for this step
-        const ratingCount = stepRatings.length;
-        
-        // Build parameter ratings summary
-        const parameterRatings = {};
-        stepRatings.forEach(item => {
-            if (item.rating.parameters) {
-                Object.keys(item.rating.parameters).forEach(paramName => {
-                    if (!parameterRatings[paramName]) {
-                        parameterRatings[paramName] = [];
-                    }
-                    parameterRatings[paramName].push(item.rating.parameters[paramName]);
-                });
-            }
-        });
-        
-        let detailsHTML = '';
-        if (Object.keys(parameterRatings).length > 0) {
-            const paramsList = Object.keys(parameterRatings).map(paramName => {
-                const ratings = parameterRatings[paramName];
-                const maxRating = Math.max(...ratings);
-                return `${escapeHtml(paramName)}: ${maxRating}/10`;
-            }).join(', ');
-            detailsHTML = `<div style="font-size: 0.75rem; color: var(--text-secondary); margin-top: 2px;">${paramsList}</div>`;
-        }
-        
-        const overallDisplay = maxOverall !== null ? `${maxOverall}/10` : '—';
-        
-        return `
-            <div style="margin-bottom: 0.5rem;">
-                <div style="display: flex; align-items: center; gap: 0.5rem;">
-                    <span style="color: var(--text-primary); font-weight: 500; font-size: 0.85rem;">Step ${stepNum}:</span>
-                    <span style="color: var(--accent-color); font-weight: 600;">${overallDisplay}</span>
-                    <span style="color: var(--text-secondary); font-size: 0.8rem;">(${ratingCount} ver${ratingCount > 1 ? 's' : ''})</span>
-                </div>
-                ${detailsHTML}
+
+    const lines = [];
+    if (chain.max_rating) {
+        lines.push(`
+            <div style="display: flex; align-items: center; gap: 0.5rem;">
+                <span style="color: var(--text-primary); font-weight: 500; font-size: 0.85rem;">Chain:</span>
+                <span style="color: var(--accent-color); font-weight: 600;">${chain.max_rating}/10</span>
             </div>
-        `;
-    }).join('');
-    
-    return `<div style="font-size: 0.9rem;">${stepsHTML}</div>`;
+        `);
+    }
+    if (chain.rated_steps) {
+        lines.push(`
+            <div style="display: flex; align-items: center; gap: 0.5rem;">
+                <span style="color: var(--text-primary); font-weight: 500; font-size: 0.85rem;">Best step:</span>
+                <span style="color: var(--accent-color); font-weight: 600;">${chain.max_step_rating}/10</span>
+                <span style="color: var(--text-secondary); font-size: 0.8rem;">(${chain.rated_steps} rated step${chain.rated_steps !== 1 ? 's' : ''})</span>
+            </div>
+        `);
+    }
+
+    return `<div style="font-size: 0.9rem;">${lines.join('')}</div>`;
 }
 
 async function loadChainById(traceId) {
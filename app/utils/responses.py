@@ -0,0 +1,13 @@
+"""Response classes"""
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+from app.services import serializer
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered by the serializer module (orjson when installed)"""
+
+    def render(self, content: Any) -> bytes:
+        return serializer.dumps_bytes(content)
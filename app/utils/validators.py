@@ -1,18 +1,38 @@
 """Input validation utilities"""
-import json
 import re
+from datetime import datetime, timezone
+from typing import Any, Optional
 
+from app.services import serializer
 
-def is_valid_json(text: str) -> bool:
-    """Check if text is valid JSON"""
+# Returned by parse_json for text that is not JSON (None is a valid JSON value)
+NOT_JSON = object()
+
+
+def parse_json(text: str) -> Any:
+    """Parse text as JSON, or return NOT_JSON - lets callers validate and parse in one pass"""
     text = text.strip()
     if not text:
-        return False
+        return NOT_JSON
     try:
-        json.loads(text)
-        return True
-    except:
-        return False
+        return serializer.loads(text)
+    except serializer.JSONDecodeError:
+        return NOT_JSON
+
+
+def is_valid_json(text: str) -> bool:
+    """Check if text is valid JSON"""
+    return parse_json(text) is not NOT_JSON
+
+
+def chain_events_error(chain_events: Any) -> Optional[str]:
+    """Why chain_events is not a list of event objects, or None - checks the top level only"""
+    if not isinstance(chain_events, list):
+        return "chain_events must be a list"
+    for index, event in enumerate(chain_events):
+        if not isinstance(event, dict):
+            return f"chain_events[{index}] must be an object"
+    return None
 
 
 def is_event_id(text: str) -> bool:
@@ -41,3 +61,15 @@ def is_trace_id(text: str) -> bool:
     
     return bool(re.match(pattern1, text, re.IGNORECASE) or re.match(pattern2, text, re.IGNORECASE))
 
+
+def trace_timestamp(text: str) -> Optional[datetime]:
+    """UTC timestamp embedded in a trace ID (see is_trace_id), or None"""
+    if not is_trace_id(text):
+        return None
+    stamp = text.strip().split("_")[1]
+    try:
+        if stamp.isdigit():
+            return datetime.fromtimestamp(int(stamp) / 1000, tz=timezone.utc)
+        return datetime.strptime(stamp, "%Y-%m-%dT%H:%M:%S.%fZ").replace(tzinfo=timezone.utc)
+    except (ValueError, OverflowError, OSError):
+        return None
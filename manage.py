@@ -0,0 +1,304 @@
+"""Maintenance commands for the evaluation database
+
+Usage:
+    python manage.py migrate              Apply schema migrations and run pending backfills to completion
+    python manage.py migrate-status       Show the schema version and backfill progress
+    python manage.py migrate-blobs        Move inline base64 images into the blob store
+    python manage.py gc-blobs             Delete blobs no longer referenced by any version
+    python manage.py migrate-chain-steps  Move legacy chain_events JSON into the chain_steps table
+    python manage.py rebuild-summaries    Recompute the home page event/chain summary tables
+    python manage.py rebuild-search       Rebuild the full-text search index
+    python manage.py archive              Move cold events/chains into the monthly archive files
+    python manage.py archive-status       Show archived versions per month and the archive files
+    python manage.py export FILE          Write every version to a dump (.jsonl or {"versions": [...]} .json)
+    python manage.py import FILE          Load a dump (local.json/prod.json format or .jsonl)
+    python manage.py maintenance          Checkpoint (TRUNCATE) the WAL, release free pages and ANALYZE
+    python manage.py storage-stats        Show database, WAL and free-page sizes
+    python manage.py vacuum               Rebuild the file (switches older databases to incremental auto-vacuum)
+    python manage.py train-dict           Train a zstd dictionary on stored prompts/responses
+    python manage.py compress             Compress existing rows with the active dictionary
+    python manage.py compression-stats    Show compressed vs plain storage per column
+    python manage.py bench-json           Compare the orjson and stdlib JSON backends on real chain payloads
+    python manage.py cache-stats          Show the PostHog response cache size and settings
+    python manage.py cache-clear          Drop every cached PostHog response
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+
+from app.services import database
+from app.services import transfer
+from app.services import serializer
+from app.services.response_cache import get_response_cache, get_cache_stats
+
+
+def migrate(args):
+    """Apply migrations (init_db) and finish all backfills in the foreground"""
+    database.init_db()
+    batches = database.run_backfills(batch_size=args.batch_size, retry_failed=args.retry_failed)
+    print(f"✅ Schema up to date ({batches} backfill batches run)")
+
+
+def migrate_status(args):
+    """Print applied migrations and backfill progress"""
+    database.init_db()
+    print(json.dumps(database.get_migration_status(), indent=2))
+
+
+def migrate_blobs(args):
+    """Dedupe inline data URL images of existing rows into the blobs table"""
+    database.init_db()
+    counts = database.migrate_inline_images(batch_size=args.batch_size)
+    print(f"✅ Migrated images: {counts}")
+
+
+def gc_blobs(args):
+    """Delete orphaned blobs"""
+    database.init_db()
+    database.delete_orphan_blobs()
+
+
+def migrate_chain_steps(args):
+    """Move legacy chain versions into chain_steps"""
+    database.init_db()
+    migrated = database.migrate_chain_steps(batch_size=args.batch_size)
+    print(f"✅ Migrated {migrated} chain versions")
+
+
+def rebuild_summaries(args):
+    """Recompute event_summary and chain_summary"""
+    database.init_db()
+    database.rebuild_summaries()
+
+
+def rebuild_search(args):
+    """Re-index every version and chain step for /api/search"""
+    database.init_db()
+    database.rebuild_search_index()
+
+
+def archive(args):
+    """Move cold history out of the hot tables"""
+    database.init_db()
+    counts = database.archive_old_versions(
+        older_than_days=args.days, initial_older_than_days=args.initial_days, batch_size=args.batch_size
+    )
+    print(f"✅ Archived: {counts}")
+
+
+def archive_status(args):
+    """Print archived versions per month"""
+    database.init_db()
+    print(json.dumps(database.get_archive_stats(), indent=2))
+
+
+def export(args):
+    """Stream versions into a dump file"""
+    database.init_db()
+    fmt = args.format or transfer.format_for_path(args.file)
+    records = database.iter_export_versions(kind=args.kind, include_archived=not args.hot_only)
+    count = 0
+
+    def counted():
+        nonlocal count
+        for record in records:
+            count += 1
+            yield record
+
+    with open(args.file, "w", encoding="utf-8") as out:
+        for chunk in transfer.encode(counted(), fmt):
+            out.write(chunk)
+    print(f"✅ Exported {count} versions to {args.file}")
+
+
+def import_dump(args):
+    """Load a dump file (or stdin with -)"""
+    database.init_db()
+    fmt = args.format or transfer.format_for_path(args.file)
+    source = sys.stdin if args.file == "-" else open(args.file, encoding="utf-8")
+    try:
+        counts = database.import_versions(
+            transfer.iter_records(source, fmt), mode=args.mode, batch_size=args.batch_size,
+            progress=lambda counts: print(f"Imported: {counts}")
+        )
+    finally:
+        if source is not sys.stdin:
+            source.close()
+    print(f"✅ Import finished: {counts}")
+
+
+def maintenance(args):
+    """Run every maintenance task now"""
+    database.init_db()
+    print(f"✅ Maintenance done: {database.run_maintenance_step(force=True)}")
+    print(json.dumps(database.get_storage_metrics(), indent=2))
+
+
+def vacuum(args):
+    """Full VACUUM (needs the server stopped or idle)"""
+    database.init_db()
+    database.vacuum_database()
+
+
+def storage_stats(args):
+    """Print database, WAL and free-page sizes"""
+    database.init_db()
+    print(json.dumps(database.get_storage_metrics(), indent=2))
+
+
+def train_dict(args):
+    """Train a new compression dictionary (new writes use it after a restart)"""
+    database.init_db()
+    dict_id = database.train_compression_dict(sample_limit=args.samples)
+    if dict_id is not None:
+        print("Restart the server so new writes use the new dictionary, then run `compress --recompress`")
+
+
+def compress(args):
+    """Re-encode existing rows with the current codec settings"""
+    database.init_db()
+    counts = database.backfill_compression(
+        batch_size=args.batch_size, recompress=args.recompress, decompress=args.decompress
+    )
+    print(f"✅ Re-encoded values: {counts}")
+    if args.vacuum:
+        database.vacuum_database()
+
+
+def compression_stats(args):
+    """Print compressed vs plain storage per column"""
+    database.init_db()
+    print(json.dumps(database.get_compression_stats(), indent=2))
+
+
+def bench_json(args):
+    """Time both JSON backends on chain versions from dump files and the database"""
+    payloads = []
+    for path in args.files:
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                payloads.extend(transfer.iter_records(f, transfer.format_for_path(path)))
+    if args.db_limit:
+        database.init_db()
+        payloads.extend(itertools.islice(
+            database.iter_export_versions(kind="chain", inline_images=False), args.db_limit
+        ))
+    if not payloads:
+        print("No payloads found")
+        return
+    print(f"{len(payloads)} payloads, {args.rounds} rounds, active backend: {serializer.BACKEND}")
+    print(json.dumps(serializer.benchmark(payloads, rounds=args.rounds), indent=2))
+
+
+def cache_stats(args):
+    """Print the PostHog response cache size and settings"""
+    print(json.dumps(get_cache_stats(), indent=2))
+
+
+def cache_clear(args):
+    """Drop every cached PostHog response"""
+    cache = get_response_cache()
+    if cache is None:
+        print("PostHog response cache is disabled (POSTHOG_CACHE=off)")
+        return
+    print(f"Removed {cache.clear()} cached responses")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shram Eval Tool maintenance commands")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    schema_parser = subparsers.add_parser("migrate", help="Apply schema migrations and run pending backfills to completion")
+    schema_parser.add_argument("--batch-size", type=int, default=database.BACKFILL_BATCH_SIZE, help="Rows per backfill batch")
+    schema_parser.add_argument("--retry-failed", action="store_true", help="Resume backfills that failed earlier")
+    schema_parser.set_defaults(func=migrate)
+
+    status_parser = subparsers.add_parser("migrate-status", help="Show the schema version and backfill progress")
+    status_parser.set_defaults(func=migrate_status)
+
+    migrate_parser = subparsers.add_parser("migrate-blobs", help="Move inline base64 images into the blob store")
+    migrate_parser.add_argument("--batch-size", type=int, default=200, help="Rows per transaction")
+    migrate_parser.set_defaults(func=migrate_blobs)
+
+    gc_parser = subparsers.add_parser("gc-blobs", help="Delete blobs no longer referenced by any version")
+    gc_parser.set_defaults(func=gc_blobs)
+
+    steps_parser = subparsers.add_parser("migrate-chain-steps", help="Move legacy chain_events JSON into the chain_steps table")
+    steps_parser.add_argument("--batch-size", type=int, default=100, help="Chain versions per transaction")
+    steps_parser.set_defaults(func=migrate_chain_steps)
+
+    summaries_parser = subparsers.add_parser("rebuild-summaries", help="Recompute the home page event/chain summary tables")
+    summaries_parser.set_defaults(func=rebuild_summaries)
+
+    search_parser = subparsers.add_parser("rebuild-search", help="Rebuild the full-text search index")
+    search_parser.set_defaults(func=rebuild_search)
+
+    archive_parser = subparsers.add_parser("archive", help="Move cold events/chains into the monthly archive files")
+    archive_parser.add_argument("--days", type=int, default=database.ARCHIVE_AFTER_DAYS,
+                                help="Archive events/chains with nothing saved for this many days")
+    archive_parser.add_argument("--initial-days", type=int, default=database.ARCHIVE_INITIAL_AFTER_DAYS,
+                                help="Archive sooner when only the unrated auto-saved initial version exists")
+    archive_parser.add_argument("--batch-size", type=int, default=50, help="Events/chains per transaction")
+    archive_parser.set_defaults(func=archive)
+
+    archive_status_parser = subparsers.add_parser("archive-status", help="Show archived versions per month and the archive files")
+    archive_status_parser.set_defaults(func=archive_status)
+
+    export_parser = subparsers.add_parser("export", help="Write every version to a dump (.jsonl or {\"versions\": [...]} .json)")
+    export_parser.add_argument("file", help="Output file")
+    export_parser.add_argument("--format", choices=transfer.FORMATS, help="Default: from the file extension")
+    export_parser.add_argument("--kind", choices=("event", "chain"), help="Only event or chain versions")
+    export_parser.add_argument("--hot-only", action="store_true", help="Skip versions in the archive files")
+    export_parser.set_defaults(func=export)
+
+    import_parser = subparsers.add_parser("import", help="Load a dump (local.json/prod.json format or .jsonl)")
+    import_parser.add_argument("file", help="Input file (- for stdin)")
+    import_parser.add_argument("--format", choices=transfer.FORMATS, help="Default: from the file extension")
+    import_parser.add_argument("--mode", choices=database.IMPORT_MODES, default="skip",
+                               help="skip: keep existing versions, upsert: replace them")
+    import_parser.add_argument("--batch-size", type=int, default=database.IMPORT_BATCH_SIZE, help="Records per transaction")
+    import_parser.set_defaults(func=import_dump)
+
+    maintenance_parser = subparsers.add_parser("maintenance", help="Checkpoint (TRUNCATE) the WAL, release free pages and ANALYZE")
+    maintenance_parser.set_defaults(func=maintenance)
+
+    storage_parser = subparsers.add_parser("storage-stats", help="Show database, WAL and free-page sizes")
+    storage_parser.set_defaults(func=storage_stats)
+
+    vacuum_parser = subparsers.add_parser("vacuum", help="Rebuild the file (switches older databases to incremental auto-vacuum)")
+    vacuum_parser.set_defaults(func=vacuum)
+
+    train_parser = subparsers.add_parser("train-dict", help="Train a zstd dictionary on stored prompts/responses")
+    train_parser.add_argument("--samples", type=int, default=2000, help="Most recent values sampled per column")
+    train_parser.set_defaults(func=train_dict)
+
+    compress_parser = subparsers.add_parser("compress", help="Compress existing rows with the active dictionary")
+    compress_parser.add_argument("--batch-size", type=int, default=200, help="Rows per transaction")
+    compress_parser.add_argument("--recompress", action="store_true", help="Also re-encode values compressed with an older dictionary")
+    compress_parser.add_argument("--decompress", action="store_true", help="Turn all values back into plain text")
+    compress_parser.add_argument("--vacuum", action="store_true", help="VACUUM afterwards to shrink the database file")
+    compress_parser.set_defaults(func=compress)
+
+    stats_parser = subparsers.add_parser("compression-stats", help="Show compressed vs plain storage per column")
+    stats_parser.set_defaults(func=compression_stats)
+
+    bench_parser = subparsers.add_parser("bench-json", help="Compare the orjson and stdlib JSON backends on real chain payloads")
+    bench_parser.add_argument("files", nargs="*", default=["local.json", "prod.json"], help="Dump files with payloads")
+    bench_parser.add_argument("--db-limit", type=int, default=200, help="Also use up to this many stored chain versions (0 = none)")
+    bench_parser.add_argument("--rounds", type=int, default=20, help="Passes over the payloads per measurement")
+    bench_parser.set_defaults(func=bench_json)
+
+    cache_stats_parser = subparsers.add_parser("cache-stats", help="Show the PostHog response cache size and settings")
+    cache_stats_parser.set_defaults(func=cache_stats)
+
+    cache_clear_parser = subparsers.add_parser("cache-clear", help="Drop every cached PostHog response")
+    cache_clear_parser.set_defaults(func=cache_clear)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()